@@ -0,0 +1,28 @@
+import { applyAtmDelta } from "@/lib/atm-sync"
+import type { ATM } from "@/types"
+
+const atm = (id: string, monthly_volume = 1000) => ({ id, monthly_volume }) as ATM
+
+describe("applyAtmDelta", () => {
+  const current = [atm("A"), atm("B"), atm("C")]
+
+  it("replaces the list on a full snapshot", () => {
+    const next = applyAtmDelta(current, { version: 2, full_snapshot: true, upserts: [atm("Z")], removed: [] })
+    expect(next.map((a) => a.id)).toEqual(["Z"])
+  })
+
+  it("updates in place, appends new ids and drops removed ones", () => {
+    const next = applyAtmDelta(current, {
+      version: 2,
+      full_snapshot: false,
+      upserts: [atm("D"), atm("B", 5000)],
+      removed: ["A"],
+    })
+    expect(next.map((a) => a.id)).toEqual(["B", "C", "D"])
+    expect(next[0].monthly_volume).toBe(5000)
+  })
+
+  it("keeps the same array when nothing changed", () => {
+    expect(applyAtmDelta(current, { version: 2, full_snapshot: false, upserts: [], removed: [] })).toBe(current)
+  })
+})
@@ -21,3 +21,29 @@ describe("GET /api/atms", () => {
     expect(typeof payload.metadata.generated_at).toBe("string")
   })
 })
+
+describe("GET /api/atms with a backend", () => {
+  const realFetch = global.fetch
+
+  afterEach(() => {
+    global.fetch = realFetch
+    delete process.env.BACKEND_API_URL
+  })
+
+  it("passes a backend 4xx through instead of serving the local dataset", async () => {
+    process.env.BACKEND_API_URL = "http://backend.test"
+    const body = JSON.stringify({ detail: "'since' cannot be combined with city" })
+    global.fetch = jest.fn().mockResolvedValue(
+      new Response(body, { status: 400, headers: { "Content-Type": "application/json" } }),
+    ) as unknown as typeof fetch
+
+    const response = await GET(new Request("http://localhost/api/atms?since=3&city=Rabat"))
+
+    expect(global.fetch).toHaveBeenCalledWith(
+      "http://backend.test/atms?since=3&city=Rabat",
+      expect.objectContaining({ cache: "no-store" }),
+    )
+    expect(response.status).toBe(400)
+    expect(await response.json()).toEqual({ detail: "'since' cannot be combined with city" })
+  })
+})
@@ -1,18 +1,27 @@
 import asyncio
+import functools
 import json
 import logging
 import threading
 from http import HTTPStatus
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
 
+from backend.bundle import load_bundle
 from backend.config import settings
+from backend.serialization import dumps
+from backend.timing import collect as collect_timing, current as current_timing, stage
 from backend.services import atm_service
 
 logger = logging.getLogger("serverless")
 
+T = TypeVar("T")
+
 _service_ready = False
 _service_lock = threading.Lock()
 
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
 _raw_origins = [origin.strip() for origin in settings.ALLOWED_ORIGINS.split(",") if origin.strip()]
 _allow_all = "*" in _raw_origins or not _raw_origins
 _allowed_origins = {origin for origin in _raw_origins if origin != "*"}
@@ -30,16 +39,61 @@ def ensure_service() -> None:
         if _service_ready:
             return
 
-        logger.info("Initializing ATM service for serverless execution")
-        asyncio.run(atm_service.initialize())
+        bundle = load_bundle()
+        if bundle is not None:
+            logger.info("Attaching ATM service to build-time bundle %s", bundle.path)
+            atm_service.attach_bundle(bundle)
+        else:
+            logger.info("Initializing ATM service for serverless execution")
+            submit(atm_service.initialize())
         _service_ready = True
 
 
-def run_async(coro):
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop running in a daemon thread for the lifetime of the (warm)
+    function instance, so invocations do not create and tear down a loop and
+    loop-bound state (the service writer lock, aiofiles executors) stays valid.
+    """
+    global _loop
+    if _loop is not None:
+        return _loop
+
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="serverless-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def submit(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Runs a coroutine on the background loop and blocks the calling handler
+    thread until it completes, re-raising its exception if it fails.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result(timeout)
+
+
+def run_async(coro: Awaitable[T]) -> T:
     """
     Execute an async coroutine from our sync serverless handler.
     """
-    return asyncio.run(coro)
+    return submit(coro)
+
+
+def server_timed(method: Callable) -> Callable:
+    """
+    Times the stages of a handler method; `respond_json` then reports them
+    in the `Server-Timing` header.
+    """
+
+    @functools.wraps(method)
+    def wrapper(handler, *args, **kwargs):
+        with collect_timing():
+            return method(handler, *args, **kwargs)
+
+    return wrapper
 
 
 def _resolve_allowed_origin(request_origin: Optional[str]) -> str:
@@ -50,8 +104,16 @@ def _resolve_allowed_origin(request_origin: Optional[str]) -> str:
     return next(iter(_allowed_origins), "*")
 
 
-def respond_json(handler, status: int, payload: Dict[str, Any]) -> None:
-    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+def respond_json(handler, status: int, payload: Any) -> None:
+    """
+    Sends `payload` (plain data, Pydantic models, or an already encoded
+    body) encoded with the shared serializer.
+    """
+    if isinstance(payload, bytes):
+        body = payload
+    else:
+        with stage("serialize"):
+            body = dumps(payload)
     handler.send_response(status)
     handler.send_header("Content-Type", "application/json; charset=utf-8")
     handler.send_header("Access-Control-Allow-Origin", _resolve_allowed_origin(handler.headers.get("Origin")))
@@ -59,6 +121,9 @@ def respond_json(handler, status: int, payload: Dict[str, Any]) -> None:
     handler.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
     handler.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Requested-With")
     handler.send_header("Content-Length", str(len(body)))
+    timing = current_timing()
+    if timing is not None:
+        handler.send_header("Server-Timing", timing.header())
     handler.end_headers()
     handler.wfile.write(body)
 
@@ -13,32 +13,7 @@ class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         ensure_service()
 
-        atms = atm_service.existing_atms
-        total_atms = len(atms)
-        total_volume = sum(atm.monthly_volume or 0 for atm in atms)
-        avg_volume = total_volume / total_atms if total_atms else 0
-
-        regional = {}
-        for atm in atms:
-            region = atm.region or "Unknown"
-            group = regional.setdefault(
-                region,
-                {"count": 0, "volume": 0, "cities": set()},
-            )
-            group["count"] += 1
-            group["volume"] += atm.monthly_volume or 0
-            if atm.city:
-                group["cities"].add(atm.city)
-
-        regional_analysis = {
-            region: {
-                "count": stats["count"],
-                "volume": stats["volume"],
-                "cities": sorted(stats["cities"]),
-                "avg_volume": stats["volume"] / stats["count"] if stats["count"] else 0,
-            }
-            for region, stats in regional.items()
-        }
+        aggregates = atm_service.snapshot.aggregates
 
         performance_trend = [
             {"month": "Jan", "volume": 45000, "roi": 12.5, "new_atms": 2},
@@ -102,15 +77,15 @@ class handler(BaseHTTPRequestHandler):
 
         payload = {
             "summary": {
-                "total_atms": total_atms,
-                "total_monthly_volume": total_volume,
-                "average_volume_per_atm": round(avg_volume, 0),
+                "total_atms": aggregates["total_atms"],
+                "total_monthly_volume": aggregates["total_monthly_volume"],
+                "average_volume_per_atm": aggregates["average_volume_per_atm"],
                 "network_roi": 14.2,
                 "coverage_rate": 78.5,
-                "cities_covered": len({atm.city for atm in atms if atm.city}),
-                "regions_covered": len(regional_analysis),
+                "cities_covered": aggregates["cities_covered"],
+                "regions_covered": aggregates["regions_covered"],
             },
-            "regional_analysis": regional_analysis,
+            "regional_analysis": aggregates["regional_analysis"],
             "performance_trend": performance_trend,
             "opportunity_zones": opportunity_zones,
             "last_updated": datetime.utcnow().isoformat() + "Z",
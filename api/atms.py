@@ -1,5 +1,6 @@
 from http.server import BaseHTTPRequestHandler
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
 
 from pydantic import ValidationError
 
@@ -15,11 +16,35 @@ class handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         ensure_service()
-        payload = {
-            "atms": [atm.dict() for atm in atm_service.existing_atms],
-            "total_count": len(atm_service.existing_atms),
-        }
-        respond_json(self, 200, payload)
+        params = parse_qs(urlparse(self.path).query)
+
+        def text(name: str) -> Optional[str]:
+            values = params.get(name)
+            return values[0] if values else None
+
+        try:
+            filters = dict(
+                region=text("region"),
+                city=text("city"),
+                bank_name=text("bank_name"),
+                status=text("status"),
+                installation_type=text("installation_type"),
+                bbox=text("bbox"),
+                min_volume=float(text("min_volume")) if text("min_volume") else None,
+                max_volume=float(text("max_volume")) if text("max_volume") else None,
+                sort=text("sort"),
+                limit=int(text("limit")) if text("limit") else None,
+                cursor=text("cursor"),
+            )
+            if text("since"):
+                respond_json(self, 200, atm_service.atms_since(int(text("since")), **filters))
+                return
+            result = atm_service.query_atms_payload(**filters)
+        except ValueError as exc:
+            respond_error(self, 400, str(exc))
+            return
+
+        respond_json(self, 200, result)
 
     def do_POST(self):
         ensure_service()
@@ -44,7 +69,7 @@ class handler(BaseHTTPRequestHandler):
             respond_error(self, 500, "Failed to store ATM", [str(exc)])
             return
 
-        respond_json(self, 201, persisted.dict())
+        respond_json(self, 201, persisted)
 
     def log_message(self, format, *args):
         return
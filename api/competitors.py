@@ -1,17 +1,18 @@
 from http.server import BaseHTTPRequestHandler
 
-from backend.services import get_competitors
+from backend.services import encoded_layer
 
-from ._utils import handle_options, respond_error, respond_json
+from ._utils import handle_options, respond_error, respond_json, server_timed
 
 
 class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         handle_options(self)
 
+    @server_timed
     def do_GET(self):
         try:
-            competitors = get_competitors()
+            body = encoded_layer("competitors")
         except FileNotFoundError as exc:
             respond_error(self, 404, str(exc))
             return
@@ -22,7 +23,7 @@ class handler(BaseHTTPRequestHandler):
             respond_error(self, 500, "Unable to load competitors", [str(exc)])
             return
 
-        respond_json(self, 200, competitors.dict())
+        respond_json(self, 200, body)
 
     def log_message(self, format, *args):
         return
@@ -12,10 +12,13 @@ class handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         ensure_service()
+        artifacts = atm_service.artifacts()
         payload = {
-            "status": "healthy" if atm_service.predictor.is_trained else "degraded",
+            # Sans modèles ni bundle sur disque, le prédicteur servi n'est pas entraîné
+            "status": "healthy" if artifacts["model_artifacts"] or artifacts["bundle"] else "degraded",
             "timestamp": datetime.utcnow().isoformat() + "Z",
-            "models_loaded": atm_service.predictor.is_trained,
+            "models_loaded": atm_service.models_loaded,
+            **artifacts,
             "atms_count": len(atm_service.existing_atms),
         }
         respond_json(self, 200, payload)
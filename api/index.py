@@ -18,12 +18,13 @@ class handler(BaseHTTPRequestHandler):
             "status": "active",
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "metrics": {
-                "models_loaded": atm_service.predictor.is_trained,
+                "models_loaded": atm_service.models_loaded,
                 "atms_cached": len(atm_service.existing_atms),
             },
             "endpoints": {
                 "predict": "/api/predict",
                 "existing_atms": "/api/atms",
+                "nearest": "/api/nearest",
                 "health": "/api/health",
                 "dashboard": "/api/analytics/dashboard",
                 "competitors": "/api/competitors",
@@ -0,0 +1,71 @@
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict
+from urllib.parse import parse_qs, urlparse
+
+from pydantic import ValidationError
+
+from backend.schemas import GeoPoint, NearestBatchRequest, NearestBatchResponse
+from backend.services import atm_service
+
+from ._utils import ensure_service, handle_options, read_json_body, respond_error, respond_json
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_OPTIONS(self):
+        handle_options(self)
+
+    def do_GET(self):
+        ensure_service()
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        try:
+            point = GeoPoint(latitude=params.get("lat"), longitude=params.get("lon"))
+            request = NearestBatchRequest(
+                points=[point],
+                k=params.get("k", 5),
+                layer=params.get("layer", "all"),
+            )
+        except ValidationError as exc:
+            respond_error(self, 400, "Invalid query parameters", exc.errors())
+            return
+
+        self._respond(request, batch=False)
+
+    def do_POST(self):
+        ensure_service()
+        try:
+            body: Dict[str, Any] = read_json_body(self)
+        except ValueError as exc:
+            respond_error(self, 400, str(exc))
+            return
+
+        try:
+            request = NearestBatchRequest(**body)
+        except ValidationError as exc:
+            respond_error(self, 400, "Invalid payload", exc.errors())
+            return
+
+        self._respond(request, batch=True)
+
+    def _respond(self, request: NearestBatchRequest, batch: bool):
+        try:
+            results = atm_service.nearest(
+                [(p.latitude, p.longitude) for p in request.points], k=request.k, layer=request.layer
+            )
+        except FileNotFoundError as exc:
+            respond_error(self, 404, str(exc))
+            return
+        except (KeyError, ValueError) as exc:
+            respond_error(self, 400, str(exc))
+            return
+        except Exception as exc:
+            respond_error(self, 500, "Failed to compute nearest ATMs", [str(exc)])
+            return
+
+        if batch:
+            respond_json(self, 200, NearestBatchResponse(results=results))
+        else:
+            respond_json(self, 200, results[0])
+
+    def log_message(self, format, *args):
+        return
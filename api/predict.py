@@ -4,15 +4,18 @@ from typing import Any, Dict
 from pydantic import ValidationError
 
 from backend.schemas import LocationData
-from backend.services import atm_service
+from backend.services import atm_service, nearest_commune, point_density
 
-from ._utils import ensure_service, handle_options, read_json_body, respond_error, respond_json
+from backend.timing import stage
+
+from ._utils import ensure_service, handle_options, read_json_body, respond_error, respond_json, server_timed
 
 
 class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         handle_options(self)
 
+    @server_timed
     def do_POST(self):
         ensure_service()
         try:
@@ -22,15 +25,18 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            location = LocationData(**payload)
+            with stage("validate"):
+                location = LocationData(**payload)
         except ValidationError as exc:
             respond_error(self, 400, "Invalid payload", exc.errors())
             return
 
         try:
             prediction = atm_service.predictor.predict_location(location)
-            canibalization = atm_service.canibalization_analyzer.calculate_canibalization(location)
+            canibalization = atm_service.snapshot.analyzer.calculate_canibalization(location)
             adjusted_score = prediction["global_score"] * (1 - canibalization["canibalization_risk"] / 200)
+            commune = nearest_commune(location.latitude, location.longitude)
+            density = point_density(location.latitude, location.longitude)
         except Exception as exc:
             respond_error(self, 500, "Failed to generate prediction", [str(exc)])
             return
@@ -43,6 +49,8 @@ class handler(BaseHTTPRequestHandler):
             "reason_codes": prediction["reason_codes"],
             "recommendation": prediction["recommendation"],
             "canibalization_analysis": canibalization,
+            "commune": commune,
+            "density": density,
         }
         respond_json(self, 200, response)
 
@@ -204,24 +204,34 @@ const buildLocalDataset = async () => {
   }
 }
 
-export async function GET() {
+export async function GET(request?: Request) {
   const backendUrl = process.env.BACKEND_API_URL
+  // Forward filters / pagination / `since` (delta sync) to the backend as-is.
+  const search = request ? new URL(request.url).search : ""
 
   if (backendUrl && backendStatus !== "unreachable") {
     try {
-      const response = await fetch(`${backendUrl}/atms`, { cache: "no-store" })
+      const response = await fetch(`${backendUrl}/atms${search}`, { cache: "no-store" })
       if (response.ok) {
         const data = await response.json()
         backendStatus = "available"
         return NextResponse.json(data)
       }
 
+      if (response.status < 500) {
+        // 4xx: the request itself is wrong (bad filter, stale `since`/cursor);
+        // the local dataset would silently ignore it, so pass the error through.
+        backendStatus = "available"
+        return new NextResponse(await response.text(), {
+          status: response.status,
+          headers: { "Content-Type": response.headers.get("Content-Type") ?? "application/json" },
+        })
+      }
+
       console.warn(
         `[api/atms] Backend responded with status ${response.status}. Falling back to local dataset.`,
       )
-      if (response.status >= 500) {
-        backendStatus = "unreachable"
-      }
+      backendStatus = "unreachable"
     } catch (error) {
       backendStatus = "unreachable"
       const message =
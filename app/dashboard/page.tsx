@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useCallback, useEffect } from "react"
+import { useState, useCallback } from "react"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
 import { Button } from "@/components/ui/button"
@@ -9,6 +9,7 @@ import Dashboard from "@/components/dashboard"
 import LeafletMap from "@/components/mapbox-map"
 import EnhancedLayerControls from "@/components/enhanced-layer-controls"
 import { ATM } from "@/types"
+import { useAtmSync } from "@/hooks/use-atm-sync"
 
 import { FeatureList } from "@/components/feature-list"
 import { TabsExample } from "@/components/ui/tabs-example"
@@ -22,31 +23,13 @@ export default function DashboardPage() {
     coverage: false,
   })
   const [simulationMode, setSimulationMode] = useState(false)
-  const [atms, setAtms] = useState<ATM[]>([])
-  const [isLoading, setIsLoading] = useState(true)
+  const { atms, isLoading } = useAtmSync()
 
   const handleATMSelect = useCallback((atm: ATM) => {
     console.log("[v0] ATM selected:", atm)
     setSelectedATM(atm)
   }, [])
 
-  useEffect(() => {
-    const fetchATMs = async () => {
-      setIsLoading(true)
-      try {
-        const response = await fetch("/api/atms")
-        if (!response.ok) throw new Error("Failed to fetch")
-        const data = await response.json()
-        setAtms(data.atms)
-      } catch (error) {
-        console.error("Error fetching ATMs:", error)
-      } finally {
-        setIsLoading(false)
-      }
-    }
-    fetchATMs()
-  }, [])
-
   const handleLayerConfigChange = useCallback((layer: string, config: any) => {
     console.log(`[v0] Layer ${layer} config updated:`, config)
   }, [])
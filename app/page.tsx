@@ -13,6 +13,7 @@ import ScoringDashboard from "@/components/scoring-dashboard"
 import EnhancedLayerControls from "@/components/enhanced-layer-controls"
 import LocationAnalyzer from "@/components/location-analyzer"
 import ScenarioSimulator from "@/components/scenario-simulator"
+import { useAtmSync } from "@/hooks/use-atm-sync"
 import { ATM } from "@/types"
 
 export default function HomePage() {
@@ -31,8 +32,7 @@ export default function HomePage() {
   const [activeTab, setActiveTab] = useState("map")
   const [selectedATM, setSelectedATM] = useState<ATM | null>(null)
   const [refreshKey, forceRefresh] = useReducer((v) => v + 1, 0)
-  const [atms, setAtms] = useState<ATM[]>([])
-  const [isLoading, setIsLoading] = useState(true)
+  const { atms, isLoading } = useAtmSync(refreshKey)
 
   const handleCardKeyDown = (event: KeyboardEvent<HTMLDivElement>, tab: string) => {
     if (event.key === "Enter" || event.key === " ") {
@@ -41,25 +41,6 @@ export default function HomePage() {
     }
   }
 
-  useEffect(() => {
-    const fetchATMs = async () => {
-      setIsLoading(true)
-      try {
-        const response = await fetch("/api/atms")
-        if (!response.ok) throw new Error("Failed to fetch")
-        const data = await response.json()
-        setAtms(data.atms)
-      } catch (error) {
-        console.error("Error fetching ATMs:", error)
-        setAtms([]) // Clear data on error
-      } finally {
-        setIsLoading(false)
-      }
-    }
-
-    fetchATMs()
-  }, [refreshKey])
-
   useEffect(() => {
     const handleAddressSearchResult = (event: CustomEvent) => {
       console.log("[v0] Address search result received:", event.detail)
@@ -0,0 +1,216 @@
+"""
+Admission control for the expensive endpoints.
+
+Requests to a registered route go through an `AdmissionController`:
+
+- at most `capacity` controlled requests run at once per process, at most
+  `limit` of them for a given route, and a lane never holds more than
+  `max_share` of the capacity (so batch work always leaves room for the map);
+- requests over those limits wait in their lane's FIFO queue. When a slot
+  frees up, lanes are served in proportion to their weight (stride
+  scheduling), so a queue of analyses cannot starve interactive requests;
+- a request whose route already has `max_queue` waiters is rejected at once
+  with 429, and one that waited longer than its route's `budget_ms` is
+  rejected with 503. Both carry a `Retry-After` estimated from the route's
+  recent service times.
+
+Unregistered routes (health, metrics, event streams, ATM listings) are never
+queued. Everything runs on the event loop thread, so no locking is needed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import counter, gauge, histogram
+
+ADMISSION_QUEUE_DEPTH = gauge("admission_queue_depth", "Requests waiting for admission.", ("lane",))
+ADMISSION_ACTIVE = gauge("admission_active", "Admitted requests currently running.", ("lane",))
+ADMISSION_WAIT = histogram("admission_wait_seconds", "Time spent queued before admission.", ("lane",))
+ADMISSION_REJECTED = counter("admission_rejected_total", "Requests rejected by admission control.", ("route", "reason"))
+
+
+class Rejected(Exception):
+    """Admission refused: `status` is 429 (queue full) or 503 (queue-time budget exceeded)."""
+
+    def __init__(self, status: int, reason: str, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+@dataclass
+class Lane:
+    name: str
+    weight: float = 1.0
+    max_share: float = 1.0
+    active: int = 0
+    pass_value: float = 0.0
+    waiters: Deque["_Waiter"] = field(default_factory=deque)
+
+
+@dataclass
+class RoutePolicy:
+    lane: str
+    limit: int
+    max_queue: int
+    budget_ms: float
+    active: int = 0
+    queued: int = 0
+    # Moyenne glissante du temps de service (s), pour estimer Retry-After
+    service_ewma: float = 0.1
+
+
+@dataclass
+class _Waiter:
+    route: RoutePolicy
+    future: asyncio.Future
+
+
+class AdmissionController:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self.lanes: Dict[str, Lane] = {}
+        self.routes: Dict[Tuple[str, str], RoutePolicy] = {}
+
+    def lane(self, name: str, weight: float = 1.0, max_share: float = 1.0) -> None:
+        self.lanes[name] = Lane(name, weight, max_share)
+        ADMISSION_QUEUE_DEPTH.set(0, name)
+        ADMISSION_ACTIVE.set(0, name)
+
+    def route(self, method: str, path: str, lane: str, limit: int, max_queue: int = 32, budget_ms: float = 2000.0) -> None:
+        if lane not in self.lanes:
+            raise KeyError(f"Unknown lane {lane!r}")
+        self.routes[(method.upper(), path)] = RoutePolicy(lane, limit, max_queue, budget_ms)
+
+    def policy(self, method: str, path: str) -> Optional[RoutePolicy]:
+        return self.routes.get((method, path))
+
+    # ---------- Slots ----------
+
+    def _lane_cap(self, lane: Lane) -> int:
+        return max(1, math.floor(self.capacity * lane.max_share))
+
+    def _can_run(self, route: RoutePolicy) -> bool:
+        lane = self.lanes[route.lane]
+        return self.active < self.capacity and lane.active < self._lane_cap(lane) and route.active < route.limit
+
+    def _start(self, route: RoutePolicy) -> None:
+        lane = self.lanes[route.lane]
+        self.active += 1
+        lane.active += 1
+        route.active += 1
+        ADMISSION_ACTIVE.set(lane.active, lane.name)
+
+    def _release(self, route: RoutePolicy, elapsed: float) -> None:
+        lane = self.lanes[route.lane]
+        self.active -= 1
+        lane.active -= 1
+        route.active -= 1
+        route.service_ewma = 0.8 * route.service_ewma + 0.2 * elapsed
+        ADMISSION_ACTIVE.set(lane.active, lane.name)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hands free slots to waiters, lanes in proportion to their weight."""
+        while self.active < self.capacity:
+            candidates = []
+            for lane in self.lanes.values():
+                waiter = next((w for w in lane.waiters if not w.future.done() and self._can_run(w.route)), None)
+                if waiter is not None:
+                    candidates.append((lane.pass_value, lane.name, lane, waiter))
+            if not candidates:
+                return
+            _, _, lane, waiter = min(candidates)
+            # Stride scheduling: a lane advances by 1/weight each time it is served
+            lane.pass_value += 1.0 / lane.weight
+            self._dequeue(lane, waiter)
+            self._start(waiter.route)
+            waiter.future.set_result(None)
+
+    def _dequeue(self, lane: Lane, waiter: _Waiter) -> None:
+        lane.waiters.remove(waiter)
+        waiter.route.queued -= 1
+        ADMISSION_QUEUE_DEPTH.set(len(lane.waiters), lane.name)
+
+    def _retry_after(self, route: RoutePolicy) -> int:
+        backlog = (route.queued + route.active) / max(route.limit, 1)
+        return max(1, math.ceil(backlog * route.service_ewma))
+
+    # ---------- Entry point ----------
+
+    async def admit(self, route: RoutePolicy, label: str) -> float:
+        """Waits for a slot; returns the time spent queued (s). Raises `Rejected`."""
+        lane = self.lanes[route.lane]
+        if not lane.waiters and self._can_run(route):
+            self._start(route)
+            ADMISSION_WAIT.observe(0.0, lane.name)
+            return 0.0
+
+        if route.queued >= route.max_queue:
+            ADMISSION_REJECTED.inc(label, "queue_full")
+            raise Rejected(429, "queue_full", self._retry_after(route), "Trop de requêtes en attente pour cette route")
+
+        busy = [other.pass_value for other in self.lanes.values() if other.waiters]
+        if not lane.waiters and busy:
+            # Une file qui redevient active repart au niveau des autres, sans crédit accumulé
+            lane.pass_value = max(lane.pass_value, min(busy))
+        waiter = _Waiter(route, asyncio.get_running_loop().create_future())
+        lane.waiters.append(waiter)
+        route.queued += 1
+        ADMISSION_QUEUE_DEPTH.set(len(lane.waiters), lane.name)
+        self._dispatch()  # il peut passer devant une tête de file bloquée par sa propre limite
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({waiter.future}, timeout=route.budget_ms / 1000)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(route, route.service_ewma)  # slot accordé, mais le client est parti
+            raise
+        finally:
+            if not waiter.future.done():
+                # Budget dépassé, ou client parti: on libère la place dans la file
+                waiter.future.cancel()
+                self._dequeue(lane, waiter)
+        waited = time.perf_counter() - start
+        ADMISSION_WAIT.observe(waited, lane.name)
+        if waiter.future.cancelled():
+            ADMISSION_REJECTED.inc(label, "timeout")
+            raise Rejected(503, "timeout", self._retry_after(route), "Serveur saturé, réessayez plus tard")
+        return waited
+
+    def run(self, route: RoutePolicy) -> "_Slot":
+        """Context manager releasing the slot obtained by `admit`."""
+        return _Slot(self, route)
+
+    def status(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "lanes": {
+                name: {"weight": lane.weight, "active": lane.active, "queued": len(lane.waiters),
+                       "max_active": self._lane_cap(lane)}
+                for name, lane in self.lanes.items()
+            },
+        }
+
+
+class _Slot:
+    def __init__(self, controller: AdmissionController, route: RoutePolicy):
+        self.controller = controller
+        self.route = route
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.controller._release(self.route, time.perf_counter() - self.start)
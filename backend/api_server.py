@@ -4,48 +4,72 @@ FastAPI backend for the geomarketing solution
 """
 
 import asyncio
+from dataclasses import asdict
 from datetime import datetime
 import logging
+import os
+from pathlib import Path
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 import uuid
 
 from fastapi import HTTPException, Depends
 from .services import get_competitors # ajoute 
 
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .services import clear_data_caches 
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from .services import _competitor_spatial_index, _load_poi_df, _load_population_df, encoded_layer, load_competitor_layer
+from .services import anearest_commune, apoint_density, commune_features, density_features, density_raster
+from .admission import AdmissionController, Rejected
+from .density import encode_png
+from .jobs import JobManager, JobUnavailable
+from .profiling import MODES as PROFILING_MODES, ProfilerBusy, ProfileStore, authorized as profiling_authorized, profile
+from .startup import StartupOrchestrator
+from .timing import collect as server_timing, current as current_timing, stage
 
 # Import the service layer which manages state and business logic
 from .config import settings
-from .logging_config import setup_logging
-from .schemas import (ATMData, ATMListResponse, DashboardResponse,
+from .logging_config import request_id_var, setup_logging
+from .metrics import (CANIBALIZATION_QUERY, CONTENT_TYPE as METRICS_CONTENT_TYPE, MODEL_INFERENCE,
+                      REGISTRY, REQUEST_LATENCY, REQUESTS_IN_FLIGHT)
+from .serialization import dumps
+from .shared_segments import process_memory, segment_versions
+from .schemas import (ATMData, ATMDeltaResponse, ATMListResponse, DashboardResponse,
                      DashboardSummary, LocationData, OpportunityZone,
                      PerformanceTrend, PredictionResponse, RegionalAnalysis)
 from .services import ATMService, atm_service
 
-<<<<<<< HEAD
 from .schemas import (CompetitorData, CompetitorListResponse) #ajoute
 from .services import get_population    #ajoute
 from .schemas import PopulationListResponse   #ajoute
-=======
-from schemas import (CompetitorData, CompetitorListResponse) #ajoute
-from services import get_population    #ajoute
-from schemas import PopulationListResponse   #ajoute
-from schemas import POIListResponse  #ajoutee
-from services import get_pois #ajoutte 
->>>>>>> cc602676c326901616ad1a6a127f59c8016cd484
+from .schemas import POIListResponse  #ajoutee
+from .services import get_pois #ajoutte
+from .schemas import NearestBatchRequest, NearestBatchResponse, NearestResponse
+from .schemas import JobRequest, JobStatus
+from .schemas import MarketShareCandidateRequest, MarketShareCandidateResponse, MarketShareResponse
+from .schemas import CommuneFeatures, CommuneFeaturesBatchRequest, CommuneFeaturesBatchResponse
 
 # Setup structured logging
-setup_logging()
+setup_logging(sample_rate=settings.LOG_SAMPLE_RATE)
 logger = logging.getLogger(__name__)
 
 
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON encodée par `serialization.dumps` (orjson si disponible); accepte aussi des bytes déjà encodés."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        with stage("serialize"):
+            return dumps(content)
+
+
 app = FastAPI(
     title="Saham Bank Geomarketing AI",
     description="API pour l'optimisation d'implantation d'automates bancaires",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 # --- Configuration ---
@@ -60,43 +84,178 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Contrôle d'admission (routes coûteuses) ---
+# Le trafic interactif (carte, dashboard, prédiction ou analyse d'un point) est
+# servi 8 fois plus souvent que le lot (scans, exports, endpoints /batch), qui
+# n'occupe jamais plus de ADMISSION_BATCH_SHARE des places.
+admission = AdmissionController(capacity=settings.ADMISSION_CAPACITY)
+admission.lane("interactive", weight=8)
+admission.lane("batch", weight=1, max_share=settings.ADMISSION_BATCH_SHARE)
+admission.route("GET", "/competitors", "interactive", limit=8, budget_ms=5000)
+admission.route("GET", "/population", "interactive", limit=8, budget_ms=5000)
+admission.route("GET", "/pois", "interactive", limit=8, budget_ms=5000)
+admission.route("GET", "/analytics/dashboard", "interactive", limit=8, budget_ms=2000)
+admission.route("GET", "/nearest", "interactive", limit=8, budget_ms=1000)
+admission.route("POST", "/atms", "interactive", limit=4, budget_ms=2000)
+admission.route("POST", "/predict", "interactive", limit=4, max_queue=32, budget_ms=3000)
+admission.route("POST", "/nearest/batch", "batch", limit=2, max_queue=16, budget_ms=5000)
+admission.route("POST", "/jobs", "batch", limit=4, max_queue=32, budget_ms=2000)
+admission.route("GET", "/analytics/market-share", "interactive", limit=4, budget_ms=5000)
+admission.route("POST", "/analytics/market-share/candidate", "interactive", limit=4, max_queue=32, budget_ms=3000)
+
+
+if settings.ADMISSION_ENABLED:
+    @app.middleware("http")
+    async def admission_control(request: Request, call_next):
+        """File d'attente par route; 429/503 avec Retry-After au-delà des limites."""
+        policy = admission.policy(request.method, request.url.path)
+        if policy is None:
+            return await call_next(request)
+        try:
+            waited = await admission.admit(policy, request.url.path)
+        except Rejected as e:
+            return JSONResponse(
+                status_code=e.status, content={"detail": e.detail}, headers={"Retry-After": str(e.retry_after)}
+            )
+        timing = current_timing()
+        if timing is not None:
+            timing.add("queue", waited * 1000)
+        with admission.run(policy):
+            return await call_next(request)
+
+
 # --- Logging Middleware ---
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Middleware to log HTTP requests and add a unique request ID."""
-    request_id = str(uuid.uuid4())
-    
-    # Create a logger adapter to inject the request_id into all log messages
-    adapter = logging.LoggerAdapter(logger, {'request_id': request_id})
-    
-    start_time = time.time()
-    adapter.info(f"Request started: {request.method} {request.url.path}")
+    # Propagé à tous les logs de la requête via la contextvar (voir logging_config)
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
 
-    response = await call_next(request)
+    start_time = time.perf_counter()
+    logger.debug("Request started: %s %s", request.method, request.url.path)
 
-    process_time = (time.time() - start_time) * 1000
-    formatted_process_time = f'{process_time:.2f}ms'
-    adapter.info(f"Request finished: {response.status_code} in {formatted_process_time}")
+    status_code = 500
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        with server_timing() as timing:
+            response = await call_next(request)
+        status_code = response.status_code
+        response.headers["Server-Timing"] = timing.header()
+        response.headers["X-Request-ID"] = request_id
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - start_time
+        # Gabarit de route (ex. /jobs/{id}) pour borner la cardinalité des labels
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            elapsed, request.method, getattr(route, "path", "<unmatched>"), str(status_code)
+        )
+
+        # Succès rapides échantillonnés (LOG_SAMPLE_RATE); erreurs et requêtes lentes toujours loggées
+        elapsed_ms = elapsed * 1000
+        slow = elapsed_ms >= settings.LOG_SLOW_REQUEST_MS
+        level = logging.ERROR if status_code >= 500 else logging.WARNING if slow else logging.INFO
+        logger.log(
+            level,
+            "Request finished: %s %s %s in %.2fms",
+            request.method,
+            request.url.path,
+            status_code,
+            elapsed_ms,
+            extra={"sampleable": status_code < 400 and not slow},
+        )
+        request_id_var.reset(token)
 
     return response
 
 
+# --- Profilage à la demande (absent si PROFILING_ENABLED=false) ---
+if settings.PROFILING_ENABLED:
+    if not settings.PROFILING_TOKEN:
+        logger.warning("PROFILING_ENABLED sans PROFILING_TOKEN: aucune requête ne sera profilée")
+    profile_store = ProfileStore(Path(settings.PROFILE_DIR), settings.PROFILE_MAX_FILES)
+
+    def require_profiling_token(x_profile: Optional[str] = Header(None)) -> None:
+        if not profiling_authorized(x_profile, settings.PROFILING_TOKEN):
+            raise HTTPException(status_code=403, detail="Jeton de profilage invalide")
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Profile une requête marquée `X-Profile: <token>` et stocke le résultat."""
+        if request.url.path.startswith("/admin/profiles") or not profiling_authorized(
+            request.headers.get("X-Profile"), settings.PROFILING_TOKEN
+        ):
+            return await call_next(request)
+        mode = request.headers.get("X-Profile-Mode", "sample")
+        if mode not in PROFILING_MODES:
+            return JSONResponse(status_code=400, content={"detail": f"X-Profile-Mode doit être l'un de {PROFILING_MODES}"})
+
+        try:
+            with profile(mode, settings.PROFILE_SAMPLE_INTERVAL_MS) as result:
+                response = await call_next(request)
+        except ProfilerBusy as e:
+            return JSONResponse(status_code=409, content={"detail": str(e)})
+        name = profile_store.save(
+            result, request.method, request.url.path, request.url.query, response.status_code
+        )
+        response.headers["X-Profile-Id"] = name
+        return response
+
+    @app.get("/admin/profiles", tags=["Monitoring"], dependencies=[Depends(require_profiling_token)])
+    async def list_profiles():
+        """Liste des profils stockés, du plus récent au plus ancien"""
+        return {"profiles": profile_store.list()}
+
+    @app.get("/admin/profiles/{name}", tags=["Monitoring"], dependencies=[Depends(require_profiling_token)])
+    async def download_profile(name: str):
+        """Télécharge un profil (.folded: piles agrégées, .pstats: cProfile)"""
+        try:
+            return FileResponse(profile_store.path_of(name), media_type="application/octet-stream", filename=name)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+
 # --- Dependency Injection ---
 def get_atm_service() -> ATMService:
     """Dependency to get the singleton ATM service instance."""
     return atm_service
 
 
+# --- Startup ---
+startup = StartupOrchestrator()
+startup.stage("atm_store", atm_service.load_atm_store)
+startup.stage("models", atm_service.load_models)
+startup.stage("competitors", load_competitor_layer, required=False)
+startup.stage("population", _load_population_df.aget, required=False)
+startup.stage("poi", _load_poi_df.aget, required=False)
+
+jobs = JobManager(
+    Path(settings.JOBS_DIR),
+    workers=settings.JOB_WORKERS,
+    ttl=settings.JOB_RESULT_TTL_S,
+    stale_after=settings.JOB_STALE_S,
+)
+startup.stage("jobs", jobs.start, required=False)
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialisation au démarrage"""
+    """Initialisation au démarrage: chargements en parallèle, puis tâches de fond"""
     logger.info("Starting Saham Bank Geomarketing API")
-    await atm_service.initialize()
+    await startup.run()
 
-    # Lancement de la tâche de fond pour la mise à jour des données
+    # Lancement des tâches de fond (mise à jour périodique, synchro inter-workers)
     asyncio.create_task(periodic_update_task())
+    asyncio.create_task(atm_service.follow_change_feed())
+
+    logger.info("API ready!" if startup.ready else "API started but NOT ready, see startup report")
 
-    logger.info("API ready!")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Arrêt du pool de jobs; les jobs en cours seront repris par un autre worker"""
+    jobs.shutdown()
 
 
 async def periodic_update_task():
@@ -115,8 +274,15 @@ async def root():
         "endpoints": {
             "predict": "/predict",
             "existing_atms": "/atms",
+            "nearest": "/nearest",
+            "events": "/events",
+            "jobs": "/jobs",
             "health": "/health",
-            "dashboard": "/analytics/dashboard"
+            "metrics": "/metrics",
+            "dashboard": "/analytics/dashboard",
+            "market_share": "/analytics/market-share",
+            "density": "/layers/density/{layer}/{resolution}",
+            "communes": "/communes/features"
         }
     }
 
@@ -128,14 +294,22 @@ async def predict_location(
     """Prédit le potentiel d'un emplacement ATM"""
     try:
         # Prédiction ML
-        prediction = service.predictor.predict_location(location)
+        predictor = service.predictor
+        with MODEL_INFERENCE.time("location"):
+            prediction = predictor.predict_location(location)
         
-        # Analyse de cannibalisation
-        canibalization = service.canibalization_analyzer.calculate_canibalization(location)
+        # Analyse de cannibalisation (instantané cohérent du réseau)
+        with CANIBALIZATION_QUERY.time():
+            canibalization = service.snapshot.analyzer.calculate_canibalization(location)
         
         # Ajustement du score en fonction de la cannibalisation
         adjusted_score = prediction['global_score'] * (1 - canibalization['canibalization_risk'] / 200)
 
+        # Indicateurs de la commune la plus proche (feature store, construit hors de la boucle si froid)
+        commune = await anearest_commune(location.latitude, location.longitude)
+        # Densités des couches au point (rasters en cache, calculés hors de la boucle si froids)
+        density = await apoint_density(location.latitude, location.longitude)
+
         response = PredictionResponse(
             predicted_volume=prediction['predicted_volume'],
             roi_probability=prediction['roi_probability'],
@@ -143,7 +317,9 @@ async def predict_location(
             global_score=round(max(0, adjusted_score), 2),
             reason_codes=prediction['reason_codes'],
             recommendation=prediction['recommendation'],
-            canibalization_analysis=canibalization
+            canibalization_analysis=canibalization,
+            commune=commune,
+            density=density
         )
         
         return response
@@ -156,13 +332,43 @@ async def predict_location(
         logger.error("Error during prediction", extra={"error": str(e)}, exc_info=True)
         raise HTTPException(status_code=500, detail="An internal error occurred during prediction.")
 
-@app.get("/atms", response_model=ATMListResponse, tags=["ATM Management"])
-async def get_existing_atms(service: ATMService = Depends(get_atm_service)):
-    """Retourne la liste des ATMs existants"""
-    return ATMListResponse(
-        atms=service.existing_atms,
-        total_count=len(service.existing_atms)
+@app.get("/atms", response_model=Union[ATMDeltaResponse, ATMListResponse], tags=["ATM Management"])
+async def get_existing_atms(
+    since: Optional[int] = Query(None, description="Version déjà connue du client: ne renvoie que les changements"),
+    region: Optional[str] = None,
+    city: Optional[str] = None,
+    bank_name: Optional[str] = None,
+    status: Optional[str] = None,
+    installation_type: Optional[str] = None,
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    min_volume: Optional[float] = None,
+    max_volume: Optional[float] = None,
+    sort: Optional[str] = Query(None, description="Champ de tri, préfixe '-' pour l'ordre décroissant"),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    service: ATMService = Depends(get_atm_service),
+):
+    """Retourne les ATMs existants, filtrés, triés et paginés via les index secondaires"""
+    filters = dict(
+        region=region,
+        city=city,
+        bank_name=bank_name,
+        status=status,
+        installation_type=installation_type,
+        bbox=bbox,
+        min_volume=min_volume,
+        max_volume=max_volume,
+        sort=sort,
+        limit=limit,
+        cursor=cursor,
     )
+    try:
+        if since is not None:
+            return service.atms_since(since, **filters)
+        # Enregistrements en cache du snapshot: pas de re-validation par le response_model
+        return FastJSONResponse(service.query_atms_payload(**filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/atms", response_model=ATMData, tags=["ATM Management"])
 async def add_atm(atm: ATMData, service: ATMService = Depends(get_atm_service)):
@@ -170,29 +376,108 @@ async def add_atm(atm: ATMData, service: ATMService = Depends(get_atm_service)):
     new_atm = await service.add_new_atm(atm)
     return new_atm
 
+@app.get("/nearest", response_model=NearestResponse, tags=["ATM Management"])
+async def nearest_atms(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    layer: Literal["own", "competitors", "all"] = "all",
+    service: ATMService = Depends(get_atm_service),
+):
+    """Les k ATMs (Saham et/ou concurrents) les plus proches d'un point"""
+    try:
+        if layer != "own":
+            await _competitor_spatial_index.aget()
+        return service.nearest([(lat, lon)], k=k, layer=layer)[0]
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/nearest/batch", response_model=NearestBatchResponse, tags=["ATM Management"])
+async def nearest_atms_batch(request: NearestBatchRequest, service: ATMService = Depends(get_atm_service)):
+    """Version batch de /nearest pour les outils de scénarios"""
+    try:
+        if request.layer != "own":
+            await _competitor_spatial_index.aget()
+        results = service.nearest(
+            [(p.latitude, p.longitude) for p in request.points], k=request.k, layer=request.layer
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return NearestBatchResponse(results=results)
+
+@app.get("/events", tags=["Monitoring"])
+async def stream_events(service: ATMService = Depends(get_atm_service)):
+    """Flux SSE des changements du réseau (ajouts/suppressions d'ATMs, version, agrégats)"""
+    return StreamingResponse(
+        service.events.stream(hello={"version": service.snapshot.version}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", response_model=JobStatus, status_code=202, tags=["Jobs"])
+async def submit_job(request: JobRequest):
+    """Lance une analyse longue en arrière-plan; un job identique encore valide est renvoyé tel quel"""
+    try:
+        job, created = await asyncio.to_thread(jobs.submit, request.kind, request.params)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    headers = {"Location": f"/jobs/{job['id']}"}
+    if created:
+        return FastJSONResponse(JobStatus(**job), status_code=202, headers=headers)
+    return FastJSONResponse(JobStatus(**job, deduplicated=True), status_code=200, headers=headers)
+
+
+async def _job_or_404(job_id: str) -> Dict[str, Any]:
+    # Registre SQLite (attente de verrou possible): hors de la boucle
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job introuvable: {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["Jobs"])
+async def get_job(job_id: str):
+    """État et progression d'un job"""
+    return JobStatus(**await _job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/events", tags=["Jobs"])
+async def stream_job(job_id: str):
+    """Flux SSE de la progression d'un job, terminé par un évènement `done`"""
+    await _job_or_404(job_id)
+    return StreamingResponse(
+        jobs.stream(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/result", tags=["Jobs"])
+async def get_job_result(job_id: str):
+    """Télécharge le résultat d'un job terminé"""
+    job = await _job_or_404(job_id)
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail="Résultat expiré, relancez le job")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job {job['status']}, pas de résultat disponible")
+    path = await asyncio.to_thread(jobs.result_path, job_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=410, detail="Fichier de résultat supprimé, relancez le job")
+    media_type = "text/csv" if path.suffix == ".csv" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=f"{job['kind']}-{job_id}{path.suffix}")
+
 @app.get("/analytics/dashboard", response_model=DashboardResponse, tags=["Analytics"])
 async def get_dashboard_data(service: ATMService = Depends(get_atm_service)):
     """Données pour le tableau de bord avec analyse régionale"""
-    atms = service.existing_atms
-    # Calcul des métriques globales
-    total_atms = len(atms)
-    total_volume = sum(atm.monthly_volume for atm in atms if atm.monthly_volume is not None)
-    avg_volume = total_volume / total_atms if total_atms > 0 else 0
-    
-    # Analyse par région
-    regional_analysis_data = {}
-    for atm in atms:
-        region = atm.region or 'Unknown'
-        if region not in regional_analysis_data:
-            regional_analysis_data[region] = {'count': 0, 'volume': 0, 'cities': set()}
-        regional_analysis_data[region]['count'] += 1
-        regional_analysis_data[region]['volume'] += atm.monthly_volume or 0
-        regional_analysis_data[region]['cities'].add(atm.city or 'Unknown')
-    
-    # Conversion des sets en listes pour JSON
-    for region_data in regional_analysis_data.values():
-        region_data['cities'] = list(region_data['cities'])
-        region_data['avg_volume'] = region_data['volume'] / region_data['count']
+    # Agrégats précalculés sur l'instantané courant du réseau
+    aggregates = service.snapshot.aggregates
     
     # Simulation de données de performance étendues
     performance_data = [
@@ -258,36 +543,90 @@ async def get_dashboard_data(service: ATMService = Depends(get_atm_service)):
     
     return DashboardResponse(
         summary=DashboardSummary(
-            total_atms=total_atms,
-            total_monthly_volume=total_volume,
-            average_volume_per_atm=round(avg_volume, 0),
+            total_atms=aggregates["total_atms"],
+            total_monthly_volume=aggregates["total_monthly_volume"],
+            average_volume_per_atm=aggregates["average_volume_per_atm"],
             network_roi=14.2,  # Simulated
             coverage_rate=78.5,  # Simulated
-            cities_covered=len(set(atm.city for atm in atms if atm.city)),
-            regions_covered=len(regional_analysis_data)
+            cities_covered=aggregates["cities_covered"],
+            regions_covered=aggregates["regions_covered"]
         ),
-        regional_analysis={k: RegionalAnalysis(**v) for k, v in regional_analysis_data.items()},
+        regional_analysis={k: RegionalAnalysis(**v) for k, v in aggregates["regional_analysis"].items()},
         performance_trend=[PerformanceTrend(**p) for p in performance_data],
         opportunity_zones=[OpportunityZone(**o) for o in opportunity_zones],
         last_updated=datetime.now().isoformat()
     )
 
+@app.get("/analytics/market-share", response_model=MarketShareResponse, tags=["Analytics"])
+async def get_market_share(
+    top: int = Query(20, ge=1, le=1000),
+    service: ATMService = Depends(get_atm_service),
+):
+    """Parts de marché attendues (modèle de Huff) du réseau et des concurrents, et les ATMs qui captent le plus"""
+    try:
+        model = await asyncio.to_thread(service.huff_model)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    atms = sorted(model.site_captures(), key=lambda a: -a["capture"])[:top]
+    return MarketShareResponse(
+        parameters=asdict(model.params),
+        total_demand=round(model.total_demand, 2),
+        served_demand=round(model.served_demand, 2),
+        own_share=round(model.own_share(), 6),
+        shares_by_operator={op: round(share, 6) for op, share in model.shares_by_operator().items()},
+        atms=atms,
+    )
+
+
+@app.post("/analytics/market-share/candidate", response_model=MarketShareCandidateResponse, tags=["Analytics"])
+async def evaluate_market_share_candidate(
+    candidate: MarketShareCandidateRequest,
+    service: ATMService = Depends(get_atm_service),
+):
+    """Demande captée par un nouvel ATM, cannibalisation de notre réseau et gain pris aux concurrents"""
+    try:
+        return await asyncio.to_thread(
+            service.huff_candidate, candidate.latitude, candidate.longitude, candidate.monthly_volume
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/health", tags=["Monitoring"])
 async def health_check(service: ATMService = Depends(get_atm_service)):
     """Vérification de l'état de l'API"""
+    artifacts = service.artifacts()
+    if not startup.ready:
+        status = "starting"
+    else:
+        status = "healthy" if artifacts["model_artifacts"] or artifacts["bundle"] else "degraded"
     return {
-        "status": "healthy",
+        "status": status,
+        "ready": startup.ready,
+        "startup": startup.status(),
         "timestamp": datetime.now().isoformat(),
-        "models_loaded": service.predictor.is_trained,
-        "atms_count": len(service.existing_atms)
+        "models_loaded": service.models_loaded,
+        **artifacts,
+        "atms_count": len(service.existing_atms),
+        "worker": {"pid": os.getpid(), **process_memory()},
+        "shared_segments": segment_versions(),
+        "admission": admission.status(),
     }
 
+@app.get("/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+async def metrics():
+    """Métriques du processus au format texte Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 #andpoint ajoute 
 
 @app.get("/competitors", response_model=CompetitorListResponse, tags=["ATM Management"])
 async def list_competitors():
     try:
-        return get_competitors()
+        return FastJSONResponse(await encoded_layer.aget("competitors"))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except KeyError as e:
@@ -300,7 +639,7 @@ async def list_competitors():
 @app.get("/population", response_model=PopulationListResponse, tags=["Layers"])
 async def list_population():
     try:
-        return get_population()
+        return FastJSONResponse(await encoded_layer.aget("population"))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except KeyError as e:
@@ -312,7 +651,7 @@ async def list_population():
 @app.get("/pois", response_model=POIListResponse, tags=["Layers"])
 async def list_pois():
     try:
-        return get_pois()
+        return FastJSONResponse(await encoded_layer.aget("poi"))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except KeyError as e:
@@ -321,15 +660,137 @@ async def list_pois():
         logger.error("Erreur /pois: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erreur interne lors du chargement des POI")
 
-    
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting Saham Bank Geomarketing API")
-    await atm_service.initialize()
+# --- Rasters de densité ---
 
-    # clear file-based caches so we don't reuse a bad parse after code changes
-    clear_data_caches()
+DensityLayer = Literal["poi", "competitors", "population"]
+DensityResolution = Literal["coarse", "medium", "fine"]
+DENSITY_CACHE_CONTROL = "public, max-age=300"
 
-    asyncio.create_task(periodic_update_task())
-    logger.info("API ready!")
+
+async def _density_or_error(layer: str, resolution: str):
+    try:
+        return await density_raster.aget(layer, resolution)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Erreur densité %s/%s: %s", layer, resolution, e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur interne lors du calcul de la densité")
+
+
+def _density_response(request: Request, raster, body: bytes, media_type: str, headers: Optional[Dict[str, str]] = None):
+    """Réponse binaire avec ETag; 304 si le client a déjà cette version"""
+    headers = {"ETag": raster.etag, "Cache-Control": DENSITY_CACHE_CONTROL,
+               "X-Density-Max": repr(raster.max), "X-Density-Scale": "sqrt", **(headers or {})}
+    if request.headers.get("if-none-match") == raster.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@app.get("/layers/density/features", tags=["Layers"])
+async def get_density_features(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    resolution: DensityResolution = "medium",
+):
+    """Densités (par km²) des couches au point donné, lues dans les rasters en cache"""
+    try:
+        features = await asyncio.to_thread(density_features, [lat], [lon], resolution)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"latitude": lat, "longitude": lon, "resolution": resolution,
+            **{name: float(values[0]) for name, values in features.items()}}
+
+
+@app.get("/layers/density/{layer}/{resolution}", tags=["Layers"])
+async def get_density_metadata(layer: DensityLayer, resolution: DensityResolution):
+    """Emprise, taille de grille et découpage en tuiles d'un raster de densité"""
+    raster = await _density_or_error(layer, resolution)
+    base = f"/layers/density/{layer}/{resolution}"
+    return {**raster.metadata(), "etag": raster.etag, "png_url": f"{base}/raster.png",
+            "tile_url": f"{base}/tiles/{{row}}/{{col}}?format=png"}
+
+
+@app.get("/layers/density/{layer}/{resolution}/raster.png", tags=["Layers"])
+async def get_density_png(request: Request, layer: DensityLayer, resolution: DensityResolution):
+    """Raster complet en PNG niveaux de gris (valeur = max * (pixel / 255)²)"""
+    raster = await _density_or_error(layer, resolution)
+    return _density_response(request, raster, raster.png, "image/png")
+
+
+@app.get("/layers/density/{layer}/{resolution}/tiles/{row}/{col}", tags=["Layers"])
+async def get_density_tile(
+    request: Request,
+    layer: DensityLayer,
+    resolution: DensityResolution,
+    row: int,
+    col: int,
+    format: Literal["png", "u8"] = "png",
+):
+    """Tuile du raster: PNG, ou octets uint8 bruts (ligne par ligne) avec leur forme en en-tête"""
+    raster = await _density_or_error(layer, resolution)
+    try:
+        tile = raster.tile(row, col)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    shape = {"X-Tile-Shape": f"{tile.shape[0]}x{tile.shape[1]}"}
+    if format == "u8":
+        return _density_response(request, raster, tile.tobytes(), "application/octet-stream", shape)
+    return _density_response(request, raster, encode_png(tile), "image/png", shape)
+
+
+# --- Indicateurs communaux ---
+
+async def _commune_store():
+    try:
+        return await commune_features.aget()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"CSV invalide: {e}")
+
+
+@app.get("/communes/features", response_model=CommuneFeatures, tags=["Layers"])
+async def get_nearest_commune_features(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+):
+    """Indicateurs de la commune dont le centroïde est le plus proche du point"""
+    store = await _commune_store()
+    rows, distances = store.nearest([lat], [lon])
+    return store.record(int(rows[0]), distances[0])
+
+
+@app.get("/communes/{commune}/features", response_model=CommuneFeatures, tags=["Layers"])
+async def get_commune_features(commune: str):
+    """Indicateurs d'une commune, par `commune_norm` ou par nom"""
+    store = await _commune_store()
+    try:
+        return store.get(commune)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/communes/features/batch", response_model=CommuneFeaturesBatchResponse, tags=["Layers"])
+async def get_commune_features_batch(request: CommuneFeaturesBatchRequest):
+    """Version vectorisée: une matrice d'indicateurs pour des points ou des communes"""
+    if (request.points is None) == (request.communes is None):
+        raise HTTPException(status_code=400, detail="Fournir soit 'points', soit 'communes'")
+    store = await _commune_store()
+    features = request.features or list(store.features)
+    try:
+        if request.points is not None:
+            rows, distances, values = store.lookup(
+                [p.latitude for p in request.points], [p.longitude for p in request.points], features
+            )
+            communes = [store.communes[i] for i in rows]
+            distances = [round(float(d), 3) for d in distances]
+        else:
+            values = store.batch(request.communes, features)
+            communes = [store.communes[store.row_of(c)] for c in request.communes]
+            distances = None
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"features": features, "communes": communes, "distances_km": distances, "values": values})
@@ -0,0 +1 @@
+"""Micro-benchmarks for the backend hot paths (run as `python -m backend.benchmarks.<name>`)."""
@@ -0,0 +1,404 @@
+"""
+HTTP load generator replaying traffic mixes against a running API.
+
+    uvicorn backend.api_server:app --port 8000 &
+    python -m backend.benchmarks.loadgen --mix mixed --rps 200 --duration 60
+
+    # or let it start the server, e.g. to compare worker counts
+    python -m backend.benchmarks.loadgen --spawn gunicorn --workers 4 --mix map --rps 100
+
+Traffic is open-loop: requests are scheduled at the target rate whatever the
+server's response times, and each latency is measured from the scheduled
+start. Time spent waiting for a free connection therefore counts, so a
+saturated server shows up as growing tail latencies rather than as a quietly
+reduced load.
+
+A mix is a weighted set of actions. Actions stand for what a user does:
+`map_load` fires the four map layers at once, `predict_burst` fires
+`--burst-size` predictions at once. `--rps` counts requests, not actions.
+The report gives throughput and p50/p95/p99 per route, the status codes, and
+the mean of every `Server-Timing` stage the server reports.
+
+Only the standard library is used: a small keep-alive HTTP/1.1 client on
+asyncio streams, so the generator's overhead stays low.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: Optional[bytes] = None
+
+    @property
+    def route(self) -> str:
+        return f"{self.method} {self.path.split('?', 1)[0]}"
+
+
+def _predict_body(rng: random.Random) -> bytes:
+    return json.dumps({
+        "latitude": 33.57 + rng.gauss(0, 0.05),
+        "longitude": -7.59 + rng.gauss(0, 0.05),
+        "population_density": rng.lognormvariate(6, 1),
+        "commercial_poi_count": rng.randint(0, 40),
+        "competitor_atms_500m": rng.randint(0, 8),
+        "foot_traffic_score": rng.uniform(0, 100),
+        "income_level": rng.gauss(50000, 15000),
+        "accessibility_score": rng.uniform(0, 10),
+    }).encode()
+
+
+def build_action(name: str, rng: random.Random, burst_size: int) -> List[Request]:
+    """Requests fired together for one occurrence of the action."""
+    if name == "map_load":
+        return [Request("GET", "/atms"), Request("GET", "/competitors"),
+                Request("GET", "/population"), Request("GET", "/pois")]
+    if name == "predict":
+        return [Request("POST", "/predict", _predict_body(rng))]
+    if name == "predict_burst":
+        return [Request("POST", "/predict", _predict_body(rng)) for _ in range(burst_size)]
+    if name == "dashboard":
+        return [Request("GET", "/analytics/dashboard")]
+    if name == "nearest":
+        lat, lon = 33.57 + rng.gauss(0, 0.05), -7.59 + rng.gauss(0, 0.05)
+        return [Request("GET", f"/nearest?lat={lat:.5f}&lon={lon:.5f}&k=5")]
+    raise ValueError(f"Unknown action {name!r}; expected one of {ACTIONS}")
+
+
+ACTIONS = ("map_load", "predict", "predict_burst", "dashboard", "nearest")
+
+MIXES: Dict[str, Dict[str, float]] = {
+    "map": {"map_load": 1},
+    "predict": {"predict_burst": 1},
+    "dashboard": {"dashboard": 1},
+    "mixed": {"map_load": 4, "dashboard": 3, "nearest": 2, "predict": 2, "predict_burst": 1},
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """A preset name, or `action=weight,action=weight`."""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name.strip()!r} (actions: {', '.join(ACTIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# ---------- Client ----------
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, req: Request) -> Tuple[int, Dict[str, str], int]:
+        reused = self.writer is not None
+        try:
+            status_line = await self._send(req)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if not reused:
+                raise
+            # The server closed the idle keep-alive connection: retry once on a fresh one
+            self.close()
+            status_line = await self._send(req)
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            size = int(headers["content-length"])
+            await self.reader.readexactly(size)
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            size = 0
+            while True:
+                chunk = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(chunk + 2)
+                if chunk == 0:
+                    break
+                size += chunk
+        else:
+            size = len(await self.reader.read())
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers, size
+
+    async def _send(self, req: Request) -> bytes:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{req.method} {req.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: */*\r\n"
+        if req.body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(req.body)}\r\n"
+        self.writer.write(head.encode("latin-1") + b"\r\n" + (req.body or b""))
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        return status_line
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Pool:
+    def __init__(self, host: str, port: int, size: int):
+        # LIFO: the most recently used connections stay warm, the others may idle out
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        for _ in range(size):
+            self._idle.put_nowait(Connection(host, port))
+
+    async def request(self, req: Request) -> Tuple[int, Dict[str, str], int]:
+        conn = await self._idle.get()
+        try:
+            return await conn.request(req)
+        except BaseException:
+            conn.close()  # unknown state: reconnect on next use
+            raise
+        finally:
+            self._idle.put_nowait(conn)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+# ---------- Recording ----------
+
+@dataclass
+class RouteStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    bytes: int = 0
+    stages: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    timed: int = 0
+
+    def record(self, latency_ms: float, status: str, size: int = 0, server_timing: str = "") -> None:
+        self.latencies_ms.append(latency_ms)
+        self.statuses[status] += 1
+        self.bytes += size
+        if server_timing:
+            self.timed += 1
+            for entry in server_timing.split(","):
+                name, _, params = entry.strip().partition(";")
+                for param in params.split(";"):
+                    if param.strip().startswith("dur="):
+                        self.stages[name] += float(param.strip()[4:])
+
+    @property
+    def errors(self) -> int:
+        return sum(n for s, n in self.statuses.items() if not s.startswith("2"))
+
+    def summary(self, window_s: float) -> Dict:
+        lat = sorted(self.latencies_ms)
+        return {
+            "requests": len(lat),
+            "errors": self.errors,
+            "rps": round(len(lat) / window_s, 2),
+            "p50_ms": round(percentile(lat, 50), 2),
+            "p95_ms": round(percentile(lat, 95), 2),
+            "p99_ms": round(percentile(lat, 99), 2),
+            "max_ms": round(lat[-1], 2) if lat else 0.0,
+            "mean_kb": round(self.bytes / len(lat) / 1024, 1) if lat else 0.0,
+            "statuses": dict(self.statuses),
+            "server_timing_ms": {k: round(v / self.timed, 2) for k, v in self.stages.items()} if self.timed else {},
+        }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# ---------- Runner ----------
+
+async def run_load(
+    url: str,
+    mix: Dict[str, float],
+    rps: float,
+    duration: float,
+    warmup: float = 0.0,
+    connections: int = 64,
+    burst_size: int = 10,
+    timeout: float = 30.0,
+    seed: int = 0,
+) -> Dict:
+    parts = urlsplit(url)
+    pool = Pool(parts.hostname or "127.0.0.1", parts.port or 80, connections)
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    stats: Dict[str, RouteStats] = defaultdict(RouteStats)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def fire(req: Request, scheduled: float) -> None:
+        try:
+            status, headers, size = await asyncio.wait_for(pool.request(req), timeout)
+            outcome, server_timing = str(status), headers.get("server-timing", "")
+        except asyncio.TimeoutError:
+            outcome, size, server_timing = "timeout", 0, ""
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            outcome, size, server_timing = exc.__class__.__name__, 0, ""
+        if scheduled - start >= warmup:
+            stats[req.route].record((loop.time() - scheduled) * 1000, outcome, size, server_timing)
+
+    tasks = set()
+    offset = 0.0
+    while offset < duration:
+        requests = build_action(rng.choices(names, weights)[0], rng, burst_size)
+        scheduled = start + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for req in requests:
+            task = asyncio.create_task(fire(req, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        offset += len(requests) / rps
+    if tasks:
+        await asyncio.wait(tasks)
+    pool.close()
+
+    window = max(duration - warmup, 1e-9)
+    routes = {route: s.summary(window) for route, s in sorted(stats.items())}
+    total = RouteStats()
+    for s in stats.values():
+        total.latencies_ms += s.latencies_ms
+        total.statuses.update(s.statuses)
+        total.bytes += s.bytes
+    return {
+        "config": {"url": url, "mix": mix, "target_rps": rps, "duration_s": duration, "warmup_s": warmup,
+                   "connections": connections, "burst_size": burst_size, "seed": seed},
+        "elapsed_s": round(loop.time() - start, 2),
+        "total": total.summary(window),
+        "routes": routes,
+    }
+
+
+# ---------- Local server ----------
+
+def spawn_server(kind: str, url: str, workers: int) -> subprocess.Popen:
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", str(parts.port or 8000)
+    if kind == "uvicorn":
+        cmd = [sys.executable, "-m", "uvicorn", "backend.api_server:app", "--host", host, "--port", port,
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "backend.api_server:app", "-k", "uvicorn.workers.UvicornWorker",
+               "-w", str(workers), "--bind", f"{host}:{port}", "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, env={**os.environ, "LOG_SAMPLE_RATE": "0"})
+
+
+async def wait_ready(url: str, timeout: float) -> None:
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = Connection(parts.hostname or "127.0.0.1", parts.port or 80)
+        try:
+            status, _, _ = await conn.request(Request("GET", "/health"))
+            if status == 200:
+                return
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            conn.close()
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} did not answer /health within {timeout:.0f}s")
+
+
+def print_report(report: Dict) -> None:
+    cfg = report["config"]
+    print(f"mix={cfg['mix']} target={cfg['target_rps']} rps duration={cfg['duration_s']}s "
+          f"(warm-up {cfg['warmup_s']}s) connections={cfg['connections']}")
+    header = f"{'route':<28} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["routes"].items()) + [("TOTAL", report["total"])]
+    for route, s in rows:
+        print(f"{route:<28} {s['requests']:>7} {s['errors']:>5} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>8.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms {s['max_ms']:>7.1f}ms")
+    for route, s in report["routes"].items():
+        if s["errors"]:
+            print(f"  {route}: statuses {s['statuses']}")
+        if s["server_timing_ms"]:
+            stages = ", ".join(f"{k}={v:.1f}" for k, v in s["server_timing_ms"].items())
+            print(f"  {route}: server-timing mean ms: {stages}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", type=parse_mix, default="mixed",
+                        help=f"preset ({', '.join(MIXES)}) or action=weight,... (actions: {', '.join(ACTIONS)})")
+    parser.add_argument("--rps", type=float, default=50.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--warmup", type=float, default=5.0, help="leading seconds excluded from the report")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connection pool size")
+    parser.add_argument("--burst-size", type=int, default=10, help="requests per predict_burst")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    parser.add_argument("--spawn", choices=("uvicorn", "gunicorn"), help="start the API locally for the run")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes when spawning")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+    if args.warmup >= args.duration:
+        parser.error("--warmup must be shorter than --duration")
+
+    server = spawn_server(args.spawn, args.url, args.workers) if args.spawn else None
+    try:
+        asyncio.run(wait_ready(args.url, args.startup_timeout if server else 5.0))
+        report = asyncio.run(run_load(
+            args.url, args.mix, args.rps, args.duration, args.warmup,
+            args.connections, args.burst_size, args.timeout, args.seed,
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if server is not None:
+        report["config"]["server"] = {"kind": args.spawn, "workers": args.workers}
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
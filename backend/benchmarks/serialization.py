@@ -0,0 +1,116 @@
+"""
+Response encoding benchmark for three paths per route:
+
+- before: `.dict()` / `jsonable_encoder` followed by `json.dumps`;
+- encoder: the shared encoder over the same Pydantic response;
+- cached: what the endpoints serve now (snapshot records / pre-encoded layers).
+
+    python -m backend.benchmarks.serialization [--atms N] [--repeat R]
+
+`--atms` enlarges the network with copies of the bundled ATMs so the
+difference is visible at production sizes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from .. import services
+from ..serialization import BACKEND, dumps
+from ..snapshot import NetworkSnapshot
+
+
+def timeit(func: Callable[[], object], repeat: int) -> float:
+    """Best wall time in ms over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _grow_network(service: services.ATMService, size: int) -> None:
+    base = list(service.existing_atms)
+    atms = [
+        atm.copy(update={"id": f"{atm.id}-BENCH{i}"})
+        for i in range(size // len(base) + 1)
+        for atm in base
+    ][:size]
+    service._snapshot = NetworkSnapshot.build(atms, service.changes.version)
+
+
+def run(atm_count: Optional[int], repeat: int) -> List[Dict[str, object]]:
+    service = services.atm_service
+    asyncio.run(service.load_atm_store())
+    if atm_count:
+        _grow_network(service, atm_count)
+
+    cases = {
+        "/atms": (
+            lambda: json.dumps(jsonable_encoder(service.query_atms()), ensure_ascii=False).encode("utf-8"),
+            lambda: dumps(service.query_atms()),
+            lambda: dumps(service.query_atms_payload()),
+        ),
+        "/population": (
+            lambda: json.dumps(services.get_population().dict(), ensure_ascii=False).encode("utf-8"),
+            lambda: dumps(services.get_population()),
+            lambda: services.encoded_layer("population"),
+        ),
+        "/pois": (
+            lambda: json.dumps(services.get_pois().dict(), ensure_ascii=False).encode("utf-8"),
+            lambda: dumps(services.get_pois()),
+            lambda: services.encoded_layer("poi"),
+        ),
+    }
+
+    results = []
+    for route, (before, encoder, cached) in cases.items():
+        try:
+            cached()  # warms the loaders and the per-snapshot / per-layer caches
+        except FileNotFoundError as exc:
+            results.append({"route": route, "skipped": str(exc)})
+            continue
+        before_ms = timeit(before, repeat)
+        results.append({
+            "route": route,
+            "bytes": len(cached()),
+            "before_ms": round(before_ms, 3),
+            "encoder_ms": round(timeit(encoder, repeat), 3),
+            "cached_ms": round(timeit(cached, repeat), 3),
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atms", type=int, default=None, help="network size to benchmark /atms with")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    results = run(args.atms, args.repeat)
+    if args.json:
+        print(json.dumps({"encoder": BACKEND, "results": results}, indent=2))
+        return
+    print(f"encoder: {BACKEND}")
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['route']:<12} skipped ({r['skipped']})")
+        else:
+            print(
+                f"{r['route']:<12} {r['bytes'] / 1024:9.1f} KB  before {r['before_ms']:9.3f}ms  "
+                f"encoder {r['encoder_ms']:9.3f}ms  cached {r['cached_ms']:9.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
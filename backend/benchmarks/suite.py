@@ -0,0 +1,465 @@
+"""
+Benchmark suite for the backend hot paths, with committed baselines.
+
+    python -m backend.benchmarks.suite                      # run everything, compare to baselines.json
+    python -m backend.benchmarks.suite -k canibalization    # only names containing the substring
+    python -m backend.benchmarks.suite --output results.json
+    python -m backend.benchmarks.suite --update-baseline    # rewrite baselines.json from this run
+
+Each benchmark reports the median and minimum wall time of `repeat` runs
+(after one warm-up run unless it measures a cold path). A result whose
+median exceeds its baseline by more than `--threshold` (default 25%) is a
+regression and makes the command exit with status 1.
+
+Baselines store the machine and library versions they were recorded with,
+plus the time of a fixed reference loop. When both runs have one, baselines
+are rescaled by the ratio of the reference times before comparing, so a
+slower or faster machine (a CI runner) does not read as a regression;
+`--raw` compares the recorded times as they are. Regenerate the baselines
+when the reference machine changes anyway: the rescaling is approximate.
+
+    npm run bench:compare                                   # what CI runs
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .. import services
+from ..ml_models import ATMLocationPredictor, CanibalizationAnalyzer
+from ..schemas import ATMData, LocationData
+from ..serialization import BACKEND, dumps
+from ..snapshot import compute_aggregates
+
+BASELINE_FILE = Path(__file__).parent / "baselines.json"
+DEFAULT_THRESHOLD = 0.25
+
+
+class Skip(Exception):
+    """Raised by a benchmark setup when its input is unavailable."""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    repeat: int = 10
+    warmup: bool = True
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, repeat: int = 10, warmup: bool = True):
+    """Registers a setup function returning the callable to time."""
+    def register(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS.append(Benchmark(name, setup, repeat, warmup))
+        return setup
+    return register
+
+
+# ---------- Fixtures ----------
+
+def synthetic_atms(n: int, seed: int = 42) -> List[ATMData]:
+    """ATMs scattered around Casablanca, dense enough for realistic overlap."""
+    rng = np.random.default_rng(seed)
+    lats = rng.normal(33.57, 0.08, n)
+    lons = rng.normal(-7.59, 0.08, n)
+    volumes = rng.lognormal(7, 0.4, n)
+    return [
+        ATMData(id=f"BENCH-{i}", latitude=float(lat), longitude=float(lon), monthly_volume=float(vol),
+                city="Casablanca", region="Casablanca-Settat")
+        for i, (lat, lon, vol) in enumerate(zip(lats, lons, volumes))
+    ]
+
+
+def sample_locations(n: int, seed: int = 7) -> List[LocationData]:
+    rng = np.random.default_rng(seed)
+    return [
+        LocationData(
+            latitude=float(33.57 + rng.normal(0, 0.05)),
+            longitude=float(-7.59 + rng.normal(0, 0.05)),
+            population_density=float(rng.lognormal(6, 1)),
+            commercial_poi_count=int(rng.poisson(15)),
+            competitor_atms_500m=int(rng.poisson(3)),
+            foot_traffic_score=float(rng.uniform(0, 100)),
+            income_level=float(rng.normal(50000, 15000)),
+            accessibility_score=float(rng.uniform(0, 10)),
+        )
+        for _ in range(n)
+    ]
+
+
+_predictor: Optional[ATMLocationPredictor] = None
+
+
+def trained_predictor() -> ATMLocationPredictor:
+    """
+    Predictor trained on the synthetic data. The stock ROI label is a single
+    class, so it is re-derived from the volume median to make training work.
+    """
+    global _predictor
+    if _predictor is None:
+        predictor = ATMLocationPredictor()
+        data = predictor.generate_synthetic_data()
+        data["roi_positive"] = (data["monthly_withdrawals"] > data["monthly_withdrawals"].median()).astype(int)
+        predictor.train(data)
+        _predictor = predictor
+    return _predictor
+
+
+def _layer_or_skip(func: Callable[[], Any]) -> Any:
+    try:
+        return func()
+    except FileNotFoundError as exc:
+        raise Skip(str(exc))
+
+
+# ---------- Benchmarks ----------
+
+@benchmark("predict_location.single", repeat=50)
+def _predict_single():
+    predictor, location = trained_predictor(), sample_locations(1)[0]
+    return lambda: predictor.predict_location(location)
+
+
+@benchmark("predict_location.batch100", repeat=5)
+def _predict_batch():
+    predictor, locations = trained_predictor(), sample_locations(100)
+    return lambda: [predictor.predict_location(loc) for loc in locations]
+
+
+def _canibalization(n: int, repeat: int):
+    @benchmark(f"calculate_canibalization.{n}", repeat=repeat)
+    def setup():
+        analyzer = CanibalizationAnalyzer()
+        analyzer.existing_atms = synthetic_atms(n)
+        location = sample_locations(1)[0]
+        return lambda: analyzer.calculate_canibalization(location)
+
+
+_canibalization(100, 50)
+_canibalization(10_000, 10)
+_canibalization(100_000, 3)
+
+
+def _layer_load(name: str, loader: Callable[[], Any]):
+    @benchmark(f"{name}.cold", repeat=5, warmup=False)
+    def cold():
+        _layer_or_skip(loader)
+
+        def run():
+            services.invalidate_datasets()
+            return loader()
+        return run
+
+    @benchmark(f"{name}.warm", repeat=200)
+    def warm():
+        _layer_or_skip(loader)
+        return loader
+
+
+_layer_load("load_population_df", lambda: services._load_population_df())
+_layer_load("load_poi_df", lambda: services._load_poi_df())
+
+
+def _layer_serialization(name: str, builder: Callable[[], Any]):
+    @benchmark(f"{name}.serialize", repeat=5)
+    def setup():
+        _layer_or_skip(builder)
+        return lambda: dumps(builder())
+
+
+_layer_serialization("get_competitors", lambda: services.get_competitors())
+_layer_serialization("get_population", lambda: services.get_population())
+_layer_serialization("get_pois", lambda: services.get_pois())
+
+
+@benchmark("dashboard_aggregates.10000", repeat=10)
+def _dashboard():
+    atms = synthetic_atms(10_000)
+    return lambda: compute_aggregates(atms)
+
+
+@benchmark("add_new_atm.persist_1000", repeat=10, warmup=False)
+def _add_atm():
+    """One copy-on-write insert plus the data.json rewrite, on a 1k-ATM network (temp file)."""
+    service = services.ATMService()
+    service.feed = None
+    base = synthetic_atms(1000)
+    asyncio.run(_seed(service, base))
+    counter = iter(range(10**9))
+    data_file = Path(tempfile.mkdtemp(prefix="bench-")) / "data.json"
+
+    def run():
+        atm = base[0].copy(update={"id": f"BENCH-NEW-{next(counter)}"})
+        original, services.DATA_FILE = services.DATA_FILE, data_file
+        try:
+            return asyncio.run(service.add_new_atm(atm))
+        finally:
+            services.DATA_FILE = original
+    return run
+
+
+def _huff_service(n: int) -> services.ATMService:
+    service = services.ATMService()
+    service.feed = None
+    asyncio.run(_seed(service, synthetic_atms(n)))
+    _layer_or_skip(service.huff_model)
+    return service
+
+
+@benchmark("huff.build.10000", repeat=5)
+def _huff_build():
+    """Full market-share model: 10k own ATMs plus the competitor and population layers."""
+    service = _huff_service(10_000)
+
+    def run():
+        service._huff = None
+        return service.huff_model()
+    return run
+
+
+@benchmark("huff.candidate.10000", repeat=50)
+def _huff_candidate():
+    service = _huff_service(10_000)
+    location = sample_locations(1)[0]
+    return lambda: service.huff_candidate(location.latitude, location.longitude)
+
+
+@benchmark("huff.with_site.10000", repeat=20)
+def _huff_with_site():
+    service = _huff_service(10_000)
+    model = service.huff_model()
+    location = sample_locations(1)[0]
+    return lambda: model.with_site("BENCH-NEW", "Saham Bank", location.latitude, location.longitude, 1.0)
+
+
+@benchmark("density_raster.population.fine", repeat=5)
+def _density_compute():
+    """Binning + FFT convolution + PNG encoding of the finest population raster."""
+    _layer_or_skip(services._load_population_df)
+
+    def run():
+        services.density_raster.cache_clear()
+        return services.density_raster("population", "fine")
+    return run
+
+
+@benchmark("density_features.1000", repeat=50)
+def _density_lookup():
+    locations = sample_locations(1000)
+    lats = [loc.latitude for loc in locations]
+    lons = [loc.longitude for loc in locations]
+    _layer_or_skip(lambda: services.density_features(lats, lons))
+    return lambda: services.density_features(lats, lons)
+
+
+async def _seed(service: services.ATMService, atms: List[ATMData]) -> None:
+    from ..snapshot import NetworkSnapshot
+
+    service._set_snapshot(NetworkSnapshot.build(atms, service.changes.version))
+
+
+# ---------- Runner ----------
+
+def run_benchmarks(pattern: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for bench in BENCHMARKS:
+        if pattern and pattern not in bench.name:
+            continue
+        try:
+            func = bench.setup()
+        except Skip as exc:
+            results[bench.name] = {"skipped": str(exc)}
+            continue
+        if bench.warmup:
+            func()
+        timings = []
+        for _ in range(bench.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[bench.name] = {
+            "median_ms": round(statistics.median(timings), 4),
+            "min_ms": round(min(timings), 4),
+            "runs": bench.repeat,
+        }
+    return results
+
+
+def reference_ms(repeat: int = 7) -> float:
+    """Median time of a fixed CPU-bound loop (Python bytecode plus a numpy sort)."""
+    values = np.random.default_rng(0).random(200_000)
+
+    def work():
+        total = 0
+        for i in range(200_000):
+            total += i * i % 7
+        np.sort(values)
+        return total
+
+    work()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 4)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baselines: Dict[str, Dict[str, Any]],
+    threshold: float,
+    scale: float = 1.0,
+    min_delta_ms: float = 0.0,
+) -> List[str]:
+    """
+    Annotates `results` with the ratio to the baseline, itself multiplied by
+    `scale` (see `machine_scale`); returns the regressed names. A slowdown
+    below `min_delta_ms` in absolute terms is timer noise, not a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baselines.get(name, {})
+        if "median_ms" not in result or "median_ms" not in base or not base["median_ms"]:
+            continue
+        expected = base["median_ms"] * scale
+        ratio = result["median_ms"] / expected
+        result["baseline_ms"] = round(expected, 4)
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + threshold and result["median_ms"] - expected > min_delta_ms:
+            result["regression"] = True
+            regressions.append(name)
+    return regressions
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _library_versions() -> Dict[str, Optional[str]]:
+    from importlib.metadata import PackageNotFoundError, version
+
+    versions: Dict[str, Optional[str]] = {}
+    for name in ("numpy", "pandas", "scipy", "scikit-learn", "orjson"):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def metadata(reference: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "libraries": _library_versions(),
+        "encoder": BACKEND,
+        "reference_ms": reference_ms() if reference is None else reference,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def machine_scale(current: Dict[str, Any], recorded: Dict[str, Any]) -> float:
+    """How much slower this machine runs the reference loop than the baseline's (1.0 if unknown)."""
+    if current.get("reference_ms") and recorded.get("reference_ms"):
+        return current["reference_ms"] / recorded["reference_ms"]
+    return 1.0
+
+
+def environment_changes(current: Dict[str, Any], recorded: Dict[str, Any]) -> List[str]:
+    """Human-readable differences between this run's environment and the baseline's."""
+    changes = []
+    for key in ("python", "machine", "cpu", "cpu_count", "encoder"):
+        if key in recorded and recorded[key] != current.get(key):
+            changes.append(f"{key}: {recorded[key]} -> {current.get(key)}")
+    for name, recorded_version in (recorded.get("libraries") or {}).items():
+        if recorded_version != current["libraries"].get(name):
+            changes.append(f"{name}: {recorded_version} -> {current['libraries'].get(name)}")
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", type=Path, help="write the JSON results to this file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, 0.25 = +25%%")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--raw", action="store_true", help="do not rescale baselines by the reference loop")
+    parser.add_argument("--min-delta-ms", type=float, default=0.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    meta = metadata()
+    results = run_benchmarks(args.pattern)
+
+    baselines, recorded = {}, {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text(encoding="utf-8"))
+        baselines, recorded = stored.get("results", {}), stored.get("meta", {})
+    scale = 1.0 if args.raw else machine_scale(meta, recorded)
+    regressions = compare(results, baselines, args.threshold, scale, args.min_delta_ms)
+
+    for change in environment_changes(meta, recorded):
+        print(f"env  {change}")
+    if scale != 1.0:
+        print(f"env  baselines rescaled x{scale:.2f} (reference loop {meta['reference_ms']:.1f}ms "
+              f"vs {recorded['reference_ms']:.1f}ms)")
+
+    report = {
+        "meta": meta,
+        "baseline_meta": recorded,
+        "scale": round(scale, 4),
+        "threshold": args.threshold,
+        "results": results,
+        "regressions": regressions,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"SKIP {name:<36} {r['skipped']}")
+            continue
+        versus = f"  x{r['ratio']:.2f} vs {r['baseline_ms']:.3f}ms" if "ratio" in r else ""
+        flag = "SLOW" if r.get("regression") else "ok  "
+        print(f"{flag} {name:<36} median {r['median_ms']:10.3f}ms  min {r['min_ms']:10.3f}ms{versus}")
+
+    if args.update_baseline:
+        kept = {n: {"median_ms": r["median_ms"], "min_ms": r["min_ms"]} for n, r in results.items() if "median_ms" in r}
+        merged = {**baselines, **kept}
+        args.baseline.write_text(json.dumps({"meta": meta, "results": merged}, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Synthetic national-scale dataset for load and scale testing.
+
+    python -m backend.benchmarks.synthetic_data /tmp/national --atms 200000 --pois 2000000
+    DATA_DIR=/tmp/national uvicorn backend.api_server:app
+
+Writes the four inputs of the service under the names and schemas it reads
+(`data.json`, `nb_atm_normalise_with_coords.csv`,
+`master_indicateurs_normalise.csv`, `poi_maroc.csv`), so the output
+directory can be served as is through the `DATA_DIR` setting.
+
+Points are spatially clustered the way the real network is: a layout of
+urban hotspots is drawn around the main Moroccan cities (weighted by their
+size), each row picks a hotspot and is scattered around it, and a fraction
+of every layer is spread over the rural surroundings. Attributes follow the
+feature model of `ATMLocationPredictor.generate_synthetic_data`, driven by an
+"urbanity" score that decays with the distance to the city centre.
+
+Rows are generated and written `--chunk-size` at a time, so memory stays
+bounded whatever the sizes. The same seed and arguments produce identical
+files; each layer has its own random stream, so resizing one layer leaves
+the others unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 50_000
+
+# (ville, région, latitude, longitude, poids ~ population urbaine en millions)
+CITIES = [
+    ("Casablanca", "Casablanca-Settat", 33.5731, -7.5898, 3.7),
+    ("Fès", "Fès-Meknès", 34.0181, -5.0078, 1.2),
+    ("Tanger", "Tanger-Tétouan-Al Hoceïma", 35.7595, -5.8340, 1.0),
+    ("Marrakech", "Marrakech-Safi", 31.6295, -7.9811, 0.95),
+    ("Salé", "Rabat-Salé-Kénitra", 34.0531, -6.7985, 0.9),
+    ("Meknès", "Fès-Meknès", 33.8935, -5.5473, 0.65),
+    ("Rabat", "Rabat-Salé-Kénitra", 34.0209, -6.8416, 0.6),
+    ("Oujda", "Oriental", 34.6814, -1.9086, 0.55),
+    ("Kénitra", "Rabat-Salé-Kénitra", 34.2610, -6.5802, 0.45),
+    ("Agadir", "Souss-Massa", 30.4278, -9.5981, 0.45),
+    ("Tétouan", "Tanger-Tétouan-Al Hoceïma", 35.5785, -5.3684, 0.4),
+    ("Safi", "Marrakech-Safi", 32.2994, -9.2372, 0.3),
+    ("Laâyoune", "Laâyoune-Sakia El Hamra", 27.1253, -13.1625, 0.22),
+    ("Nador", "Oriental", 35.1681, -2.9335, 0.2),
+    ("Béni Mellal", "Béni Mellal-Khénifra", 32.3373, -6.3498, 0.2),
+    ("El Jadida", "Casablanca-Settat", 33.2316, -8.5007, 0.2),
+    ("Errachidia", "Drâa-Tafilalet", 31.9314, -4.4244, 0.1),
+    ("Guelmim", "Guelmim-Oued Noun", 28.9870, -10.0574, 0.1),
+    ("Dakhla", "Dakhla-Oued Ed-Dahab", 23.6848, -15.9570, 0.1),
+]
+
+BANKS = ["Saham Bank", "Attijariwafa Bank", "BMCE Bank", "Banque Populaire", "CIH Bank",
+         "Crédit du Maroc", "Société Générale", "BMCI", "Al Barid Bank", "CFG Bank"]
+BANK_SHARES = [0.14, 0.22, 0.13, 0.2, 0.08, 0.06, 0.06, 0.05, 0.04, 0.02]
+
+POI_KINDS = [
+    # (key, value, part du total)
+    ("amenity", "cafe", 0.16), ("amenity", "restaurant", 0.12), ("shop", "convenience", 0.12),
+    ("amenity", "pharmacy", 0.07), ("shop", "supermarket", 0.05), ("shop", "clothes", 0.08),
+    ("shop", "bakery", 0.06), ("amenity", "school", 0.07), ("amenity", "bank", 0.05),
+    ("amenity", "atm", 0.04), ("amenity", "fuel", 0.04), ("amenity", "hospital", 0.01),
+    ("amenity", "place_of_worship", 0.06), ("shop", "mall", 0.01), ("tourism", "hotel", 0.03),
+    ("amenity", "marketplace", 0.03),
+]
+POI_BRANDS = {"supermarket": ["Marjane", "Carrefour", "BIM", "Aswak Assalam"],
+              "fuel": ["Afriquia", "Shell", "TotalEnergies", "Petrom"],
+              "bank": BANKS, "atm": BANKS}
+
+POPULATION_COLUMNS = [
+    "commune_norm", "commune_x", "taux_jeunesse", "taux_vieillesse", "INIV", "nb_atm", "IEDU",
+    "Indice_accessibilite_x", "Indice_transport", "indice_densite_routiere", "Indice_POI",
+    "densite_norm", "Indice_POI_norm", "indice_densite_routiere_norm", "indice_transport_norm_x",
+    "indice_transport_norm_y", "commune_key", "commune_y", "latitude", "longitude", "densite",
+]
+COMPETITOR_COLUMNS = ["commune", "societe", "nb_atm", "commune_norm", "latitude", "longitude"]
+POI_COLUMNS = ["key", "value", "name", "brand", "operator", "addr_full", "commune", "province",
+               "region", "COMMUNE_PCODE", "tags_json", "lat", "lon"]
+
+# Habitants au-delà desquels densite_norm vaut 1: comme dans le fichier maître,
+# `densite` est la population de la commune (malgré son nom), pas des hab/km².
+DENSITY_CAP = 40_000.0
+
+LAYERS = ("atms", "competitors", "pois", "population")
+RURAL_SHARE = {"atms": 0.04, "competitors": 0.06, "pois": 0.12, "population": 0.35}
+
+KM_PER_DEGREE = 111.0
+LAT_RANGE = (21.0, 35.95)
+LON_RANGE = (-17.1, -1.0)
+
+
+def normalize_commune(name: str) -> str:
+    """Same key shape as the bundled CSVs: lowercase ASCII, no separators."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return "".join(ch for ch in ascii_name.lower() if ch.isalnum())
+
+
+@dataclass
+class Layout:
+    """Urban hotspots shared by every layer, so ATMs, shops and people co-locate."""
+    city: np.ndarray       # index in CITIES
+    lat: np.ndarray
+    lon: np.ndarray
+    sigma_km: np.ndarray   # spread of the points around the hotspot
+    weight: np.ndarray     # probability of a point falling in the hotspot
+
+    @classmethod
+    def build(cls, seed: int) -> "Layout":
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+        city, lat, lon, sigma, weight = [], [], [], [], []
+        for c, (_, _, clat, clon, size) in enumerate(CITIES):
+            count = max(3, int(round(size * 25)))
+            radius_km = 3.0 + 4.0 * np.sqrt(size)
+            dist = np.abs(rng.normal(0, radius_km, count))
+            angle = rng.uniform(0, 2 * np.pi, count)
+            city += [c] * count
+            lat += list(clat + dist * np.sin(angle) / KM_PER_DEGREE)
+            lon += list(clon + dist * np.cos(angle) / (KM_PER_DEGREE * np.cos(np.radians(clat))))
+            # Central hotspots are denser and tighter
+            sigma += list(rng.uniform(0.4, 1.2, count) * (1 + dist / radius_km))
+            local = rng.lognormal(0, 0.6, count) * np.exp(-dist / radius_km)
+            weight += list(size * local / local.sum())
+        w = np.asarray(weight)
+        return cls(np.asarray(city), np.asarray(lat), np.asarray(lon), np.asarray(sigma), w / w.sum())
+
+
+@dataclass
+class Points:
+    lat: np.ndarray
+    lon: np.ndarray
+    city: np.ndarray
+    urbanity: np.ndarray   # 1 au centre-ville, -> 0 en zone rurale
+
+
+def sample_points(layout: Layout, rng: np.random.Generator, n: int, rural_share: float) -> Points:
+    spot = rng.choice(len(layout.weight), size=n, p=layout.weight)
+    city = layout.city[spot]
+    sigma_km = layout.sigma_km[spot].copy()
+    rural = rng.random(n) < rural_share
+    sigma_km[rural] = rng.uniform(15, 60, int(rural.sum()))
+    centre_lat = np.array([c[2] for c in CITIES])[city]
+    centre_lon = np.array([c[3] for c in CITIES])[city]
+    lat = layout.lat[spot] + rng.normal(0, 1, n) * sigma_km / KM_PER_DEGREE
+    lon = layout.lon[spot] + rng.normal(0, 1, n) * sigma_km / (KM_PER_DEGREE * np.cos(np.radians(centre_lat)))
+    # Points drawn outside the country fall back onto their hotspot
+    outside = (lat < LAT_RANGE[0]) | (lat > LAT_RANGE[1]) | (lon < LON_RANGE[0]) | (lon > LON_RANGE[1])
+    lat = np.where(outside, layout.lat[spot], lat)
+    lon = np.where(outside, layout.lon[spot], lon)
+
+    dist_km = np.hypot(lat - centre_lat, (lon - centre_lon) * np.cos(np.radians(centre_lat))) * KM_PER_DEGREE
+    size = np.array([c[4] for c in CITIES])[city]
+    urbanity = np.exp(-dist_km / (4.0 + 6.0 * np.sqrt(size)))
+    return Points(lat, lon, city, urbanity)
+
+
+def _chunks(total: int, chunk_size: int) -> Iterator[tuple]:
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+# ---------- Layers ----------
+
+def write_atms(out: TextIO, layout: Layout, rng: np.random.Generator, total: int, chunk_size: int) -> None:
+    """data.json: a JSON array, one ATM object per line like the bundled file."""
+    out.write("[\n")
+    for start, n in _chunks(total, chunk_size):
+        p = sample_points(layout, rng, n, RURAL_SHARE["atms"])
+        u = p.urbanity
+        # Volume modelled after ATMLocationPredictor.generate_synthetic_data
+        volume = (
+            rng.lognormal(6, 1, n) * (0.2 + u) * 0.01
+            + rng.poisson(5 + 25 * u) * 50
+            + rng.beta(2, 5, n) * 100 * (0.3 + u) * 10
+            + rng.normal(50000, 15000, n) * 0.001
+            + rng.beta(3, 2, n) * 10 * 100
+            + (rng.random(n) < 0.2 + 0.3 * u) * 800
+            + rng.normal(0, 200, n)
+        ).clip(100, None).round()
+        banks = rng.choice(len(BANKS), size=n, p=BANK_SHARES)
+        status = rng.choice(3, size=n, p=[0.92, 0.05, 0.03])
+        mobile = rng.random(n) < 0.12
+        lines = []
+        for i in range(n):
+            name, region = CITIES[p.city[i]][0], CITIES[p.city[i]][1]
+            lines.append(json.dumps({
+                "id": f"SYN{start + i + 1:08d}",
+                "latitude": round(float(p.lat[i]), 6),
+                "longitude": round(float(p.lon[i]), 6),
+                "monthly_volume": float(volume[i]),
+                "city": name,
+                "region": region,
+                "bank_name": BANKS[banks[i]],
+                "status": ("active", "maintenance", "inactive")[status[i]],
+                "installation_type": "mobile" if mobile[i] else "agency",
+            }, ensure_ascii=False))
+        last = start + n == total
+        out.write(",\n".join(lines) + ("\n" if last else ",\n"))
+    out.write("]\n")
+
+
+def write_competitors(out: TextIO, layout: Layout, rng: np.random.Generator, total: int, chunk_size: int) -> None:
+    """nb_atm_normalise_with_coords.csv: one row per competitor site (bank, commune)."""
+    writer = csv.writer(out)
+    writer.writerow(COMPETITOR_COLUMNS)
+    for _, n in _chunks(total, chunk_size):
+        p = sample_points(layout, rng, n, RURAL_SHARE["competitors"])
+        banks = rng.choice(len(BANKS), size=n, p=BANK_SHARES)
+        nb_atm = 1 + rng.poisson(1 + 6 * p.urbanity)
+        writer.writerows(
+            (CITIES[c][0].lower(), BANKS[b], k, normalize_commune(CITIES[c][0]), f"{lat:.7f}", f"{lon:.7f}")
+            for c, b, k, lat, lon in zip(p.city, banks, nb_atm, p.lat, p.lon)
+        )
+
+
+def write_population(out: TextIO, layout: Layout, rng: np.random.Generator, total: int, chunk_size: int) -> None:
+    """master_indicateurs_normalise.csv (tab-separated): one row per synthetic commune."""
+    writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+    writer.writerow(POPULATION_COLUMNS)
+    for start, n in _chunks(total, chunk_size):
+        p = sample_points(layout, rng, n, RURAL_SHARE["population"])
+        u = p.urbanity
+        densite = (rng.lognormal(4, 1, n) + DENSITY_CAP * 0.6 * u ** 1.5 * rng.uniform(0.5, 1.5, n)).round()
+        poi = (rng.gamma(2, 1 + 6 * u, n)).round(2)
+        road = (100 * u * rng.uniform(0.6, 1.0, n)).round(2)
+        transport = (100 * u ** 1.2 * rng.uniform(0.5, 1.0, n)).round(2)
+        columns = {
+            "taux_jeunesse": (rng.normal(26, 4, n) + 6 * (1 - u)).round(1),
+            "taux_vieillesse": (rng.normal(11, 2.5, n) - 2 * (1 - u)).clip(3).round(1),
+            "INIV": (0.55 + 0.4 * u + rng.normal(0, 0.05, n)).clip(0, 1).round(4),
+            "nb_atm": np.where(u > 0.05, rng.poisson(1 + 12 * u), 0).astype(float),
+            "IEDU": (0.45 + 0.45 * u + rng.normal(0, 0.05, n)).clip(0, 1).round(4),
+            "Indice_accessibilite_x": (100 * u * rng.uniform(0.4, 1.0, n)).round(2),
+            "Indice_transport": transport,
+            "indice_densite_routiere": road,
+            "Indice_POI": poi,
+            "densite_norm": np.minimum(densite / DENSITY_CAP, 1.0).round(6),
+            "Indice_POI_norm": np.minimum(poi / 30, 1.0).round(6),
+            "indice_densite_routiere_norm": (road / 100).round(6),
+            "indice_transport_norm_x": (transport / 100).round(6),
+            "indice_transport_norm_y": (transport / 100).round(6),
+            "latitude": p.lat.round(7),
+            "longitude": p.lon.round(7),
+            "densite": densite,
+        }
+        rows = []
+        for i in range(n):
+            name = f"{CITIES[p.city[i]][0]} {start + i + 1}"
+            key = name.lower()
+            rows.append([normalize_commune(name), name] + [columns[c][i] for c in POPULATION_COLUMNS[2:16]]
+                        + [key, key, columns["latitude"][i], columns["longitude"][i], columns["densite"][i]])
+        writer.writerows(rows)
+
+
+def write_pois(out: TextIO, layout: Layout, rng: np.random.Generator, total: int, chunk_size: int) -> None:
+    """poi_maroc.csv: OSM-style extract (key/value/tags_json, lat/lon)."""
+    writer = csv.writer(out)
+    writer.writerow(POI_COLUMNS)
+    shares = np.array([k[2] for k in POI_KINDS])
+    shares = shares / shares.sum()
+    for start, n in _chunks(total, chunk_size):
+        p = sample_points(layout, rng, n, RURAL_SHARE["pois"])
+        kinds = rng.choice(len(POI_KINDS), size=n, p=shares)
+        brand_pick = rng.random(n)
+        named = rng.random(n) < 0.7
+        rows = []
+        for i in range(n):
+            key, value, _ = POI_KINDS[kinds[i]]
+            city, region = CITIES[p.city[i]][0], CITIES[p.city[i]][1]
+            brands = POI_BRANDS.get(value)
+            brand = brands[int(brand_pick[i] * len(brands))] if brands else ""
+            name = brand or (f"{value.replace('_', ' ').title()} {start + i + 1}" if named[i] else "")
+            tags = {key: value}
+            if name:
+                tags["name"] = name
+            if brand:
+                tags["brand"] = brand
+            rows.append([
+                key, value, name, brand, brand, "", city, city, region,
+                f"MA{p.city[i]:03d}", json.dumps(tags, ensure_ascii=False),
+                f"{p.lat[i]:.7f}", f"{p.lon[i]:.7f}",
+            ])
+        writer.writerows(rows)
+
+
+_WRITERS = {
+    "atms": ("data.json", write_atms),
+    "competitors": ("nb_atm_normalise_with_coords.csv", write_competitors),
+    "pois": ("poi_maroc.csv", write_pois),
+    "population": ("master_indicateurs_normalise.csv", write_population),
+}
+
+
+def generate(
+    output_dir: Path,
+    sizes: Dict[str, int],
+    seed: int = DEFAULT_SEED,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Path]:
+    """Writes every layer of `sizes` (rows per layer) into `output_dir`; returns the files."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    layout = Layout.build(seed)
+    written = {}
+    for index, layer in enumerate(LAYERS, start=1):
+        if layer not in sizes:
+            continue
+        filename, writer = _WRITERS[layer]
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+        path = output_dir / filename
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            writer(out, layout, rng, sizes[layer], chunk_size)
+        written[layer] = path
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--atms", type=int, default=20_000)
+    parser.add_argument("--competitors", type=int, default=10_000)
+    parser.add_argument("--pois", type=int, default=200_000)
+    parser.add_argument("--population", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    sizes = {layer: getattr(args, layer) for layer in LAYERS}
+    for layer, size in sizes.items():
+        if size < 0:
+            parser.error(f"--{layer} must be >= 0")
+    start = time.perf_counter()
+    written = generate(args.output_dir, sizes, args.seed, args.chunk_size)
+    for layer, path in written.items():
+        print(f"{layer:<12} {sizes[layer]:>10,} rows  {path.stat().st_size / 1e6:9.1f} MB  {path}")
+    print(f"Done in {time.perf_counter() - start:.1f}s (seed {args.seed})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
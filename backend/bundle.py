@@ -0,0 +1,332 @@
+"""
+Build-time bundle for instant serverless warm-up.
+
+A cold function instance otherwise has to read `data.json`, validate every
+ATM, parse the layer CSVs and rebuild the aggregates before its first
+response. The bundle moves that work to build time and stores the result in
+a single file:
+
+    magic (8 bytes) | header length (uint64 LE) | JSON header | padding | blobs
+
+The header holds the validated ATM records, the precomputed aggregates and
+the fingerprints of the sources it was built from; the blobs are the layer
+columns (raw numpy arrays, 64-byte aligned) and the pickled model artifacts.
+At runtime the file is memory-mapped and the columns are wrapped with
+`np.frombuffer`, so attaching costs one small JSON parse.
+
+A bundle whose format or source fingerprints no longer match is ignored and
+the service takes the regular loading path.
+
+    python -m backend.bundle build [--output PATH]
+    python -m backend.bundle check
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .config import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from .ml_models import ATMLocationPredictor
+    from .schemas import ATMData
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+MAGIC = b"SAHAMBDL"
+ALIGN = 64
+DEFAULT_BUNDLE_FILE = Path(__file__).parent / "build" / "service.bundle"
+LAYERS = ("competitors", "population", "poi")
+MODEL_ARTIFACTS = ("volume_model", "roi_model", "scaler")
+
+
+def bundle_path() -> Path:
+    return Path(settings.BUNDLE_FILE) if settings.BUNDLE_FILE else DEFAULT_BUNDLE_FILE
+
+
+def _sources() -> Dict[str, Path]:
+    from . import schemas, services
+
+    return {
+        "data.json": services.DATA_FILE,
+        "competitors.csv": services.COMPETITORS_FILE,
+        "population.csv": services.POP_FILE,
+        "poi.csv": services.POI_FILE,
+        "services.py": Path(services.__file__),
+        "schemas.py": Path(schemas.__file__),
+    }
+
+
+def _fingerprint(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _stat(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def source_fingerprints() -> Dict[str, Optional[str]]:
+    """
+    SHA-256 of every input baked into the bundle, including the modules that
+    hold the built-in ATM records and the schemas (None for a missing file).
+    """
+    return {name: _fingerprint(path) for name, path in _sources().items()}
+
+
+def source_stats() -> Dict[str, Optional[List[int]]]:
+    """(mtime_ns, size) of the same inputs: a cheap pre-check before hashing."""
+    return {name: _stat(path) for name, path in _sources().items()}
+
+
+class Bundle:
+    """Read-only view over a memory-mapped bundle file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a service bundle")
+        (header_len,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header: Dict[str, Any] = json.loads(self._mm[start : start + header_len])
+        self.version: int = self.header["version"]
+
+    def is_fresh(self) -> bool:
+        """
+        Sources whose (mtime, size) still match the build are taken as
+        unchanged; only the others are hashed (all of them after a copy
+        that reset the mtimes).
+        """
+        if self.header.get("format") != FORMAT_VERSION:
+            return False
+        fingerprints = self.header.get("sources") or {}
+        stats = self.header.get("source_stats") or {}
+        sources = _sources()
+        if set(fingerprints) != set(sources):
+            return False
+        for name, path in sources.items():
+            if stats.get(name) is not None and _stat(path) == stats[name]:
+                continue
+            if _fingerprint(path) != fingerprints[name]:
+                return False
+        return True
+
+    def atms(self) -> List[ATMData]:
+        """ATM records validated at build time, rebuilt without re-validation."""
+        from .schemas import ATMData
+
+        return [ATMData.construct(**record) for record in self.header["atms"]]
+
+    @property
+    def aggregates(self) -> Dict[str, Any]:
+        return self.header["aggregates"]
+
+    def frame(self, name: str) -> Optional[pd.DataFrame]:
+        layer = self.header["layers"].get(name)
+        if layer is None:
+            return None
+        import numpy as np
+
+        from .shared_segments import frame_from_columns
+
+        data, categories = {}, {}
+        for col in layer["columns"]:
+            dtype = np.dtype(col["dtype"])
+            count = int(np.prod(col["shape"])) if col["shape"] else 1
+            array = np.frombuffer(self._mm, dtype=dtype, count=count, offset=col["offset"])
+            data[col["name"]] = array.reshape(col["shape"])
+            if col.get("categories") is not None:
+                categories[col["name"]] = col["categories"]
+        return frame_from_columns(data, layer["index"], self.version, categories)
+
+    @property
+    def has_models(self) -> bool:
+        return bool(self.header.get("models"))
+
+    def attach_models(self, predictor: ATMLocationPredictor) -> bool:
+        models = self.header.get("models")
+        if not models:
+            return False
+        import joblib
+
+        for attr in MODEL_ARTIFACTS:
+            blob = models[attr]
+            raw = self._mm[blob["offset"] : blob["offset"] + blob["length"]]
+            setattr(predictor, attr, joblib.load(io.BytesIO(raw)))
+        predictor.is_trained = True
+        return True
+
+
+_loaded: Optional[Bundle] = None
+_load_attempted = False
+
+
+def load_bundle() -> Optional[Bundle]:
+    """
+    The bundle for this process, or None when it is missing, unreadable or
+    stale. Checked once per process.
+    """
+    global _loaded, _load_attempted
+    if _load_attempted:
+        return _loaded
+    _load_attempted = True
+
+    path = bundle_path()
+    if not path.exists():
+        return None
+    try:
+        bundle = Bundle(path)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Ignoring unreadable bundle %s: %s", path, exc)
+        return None
+    if not bundle.is_fresh():
+        logger.warning("Ignoring stale bundle %s; rebuild it with `python -m backend.bundle build`", path)
+        return None
+    _loaded = bundle
+    return bundle
+
+
+# ---------- Build ----------
+
+def build_bundle(output: Optional[Path] = None) -> Path:
+    """Loads and validates every dataset the service serves, then writes the bundle."""
+    from . import services
+    from .ml_models import ATMLocationPredictor
+    from .shared_segments import frame_columns
+    from .snapshot import compute_aggregates
+
+    output = Path(output) if output else bundle_path()
+    atms = asyncio.run(services.ATMService()._load_and_merge_atms())
+
+    blobs: List[bytes] = []
+    layers: Dict[str, Any] = {}
+    parsers = {
+        "competitors": services._parse_competitors_csv,
+        "population": services._parse_population_csv,
+        "poi": services._parse_poi_csv,
+    }
+    for name in LAYERS:
+        try:
+            df = parsers[name]()
+        except (FileNotFoundError, KeyError, ValueError) as exc:
+            logger.warning("Layer '%s' not bundled: %s", name, exc)
+            continue
+        columns = []
+        for col, values, labels in frame_columns(df):
+            columns.append({
+                "name": col,
+                "dtype": values.dtype.str,
+                "shape": list(values.shape),
+                "categories": labels,
+                "blob": len(blobs),
+            })
+            blobs.append(values.tobytes())
+        layers[name] = {"columns": columns, "index": [int(i) for i in df.index]}
+
+    models: Dict[str, Any] = {}
+    predictor = ATMLocationPredictor()
+    try:
+        predictor.train()
+    except ValueError as exc:
+        logger.warning("Models not bundled: %s", exc)
+    else:
+        import joblib
+
+        for attr in MODEL_ARTIFACTS:
+            buffer = io.BytesIO()
+            joblib.dump(getattr(predictor, attr), buffer)
+            models[attr] = {"blob": len(blobs)}
+            blobs.append(buffer.getvalue())
+
+    header: Dict[str, Any] = {
+        "format": FORMAT_VERSION,
+        "version": int(time.time() * 1000),
+        "sources": source_fingerprints(),
+        "source_stats": source_stats(),
+        "atms": [atm.dict() for atm in atms],
+        "aggregates": compute_aggregates(atms),
+        "layers": layers,
+        "models": models,
+    }
+
+    # Blob offsets depend on the header size, which depends on the offsets:
+    # lay the blobs out after a header sized with placeholder offsets, then
+    # widen the reserved space until the final header fits.
+    entries = [c for layer in layers.values() for c in layer["columns"]] + list(models.values())
+    reserved = 0
+    while True:
+        offset = _align(len(MAGIC) + 8 + reserved)
+        for entry in entries:
+            blob = blobs[entry["blob"]]
+            entry["offset"] = offset
+            entry["length"] = len(blob)
+            offset = _align(offset + len(blob))
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(encoded) <= reserved:
+            break
+        reserved = len(encoded) + ALIGN
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as out:
+        out.write(MAGIC)
+        out.write(struct.pack("<Q", len(encoded)))
+        out.write(encoded)
+        for entry in entries:
+            out.write(b"\0" * (entry["offset"] - out.tell()))
+            out.write(blobs[entry["blob"]])
+    tmp.replace(output)
+    logger.info(
+        "Bundle written to %s (%d ATMs, layers: %s, models: %s, %.1f KB)",
+        output,
+        len(atms),
+        ", ".join(layers) or "none",
+        "yes" if models else "no",
+        output.stat().st_size / 1024,
+    )
+    return output
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if args[:1] == ["build"]:
+        target = Path(args[2]) if args[1:2] == ["--output"] and len(args) > 2 else None
+        build_bundle(target)
+    elif args[:1] == ["check"]:
+        path = bundle_path()
+        if not path.exists():
+            print(f"{path}: missing")
+            sys.exit(1)
+        fresh = Bundle(path).is_fresh()
+        print(f"{path}: {'fresh' if fresh else 'stale'}")
+        sys.exit(0 if fresh else 1)
+    else:
+        print("usage: python -m backend.bundle build [--output PATH] | check")
+        sys.exit(2)
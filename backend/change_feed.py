@@ -0,0 +1,210 @@
+"""
+File-based change feed shared by the workers of one host.
+
+A worker that mutates the ATM network appends one JSON line per change to
+`settings.CHANGE_FEED_FILE`. Every worker follows the file from the byte
+offset it has already consumed, applies the records written by the others
+to its own snapshot, and so converges within one poll interval without a
+full reload and without any external service.
+
+The file is rotated once it grows past `ROTATE_BYTES`: the writer that
+crosses the limit swaps in an empty file while holding the lock, but only
+when every live worker already follows the current file (each one records
+the file it follows under `<feed>.readers/`). A worker keeps that file
+open, so after a rotation it drains it to its end before moving on; the
+old file is freed once the last worker has read past it and closed it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 0.05
+ROTATE_BYTES = 1 << 20
+
+
+class ChangeFeed:
+    """Append-only JSON-lines log with per-process position tracking."""
+
+    def __init__(self, path: Path, poll_interval: float = POLL_INTERVAL_SECONDS, rotate_bytes: int = ROTATE_BYTES):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.rotate_bytes = rotate_bytes
+        self.position = 0
+        self._pending = b""
+        self._file: Optional[BinaryIO] = None
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.readers_dir = self.path.with_name(self.path.name + ".readers")
+
+    def _inode_on_disk(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_ino
+        except FileNotFoundError:
+            return None
+
+    def _open_current(self, at_end: bool) -> None:
+        """Follows the file now at `path`, from its end or from its start."""
+        if self._file is not None:
+            self._file.close()
+            self._file = self._inode = None
+        self.position = 0
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            pass
+        else:
+            st = os.fstat(self._file.fileno())
+            self._inode = st.st_ino
+            if at_end:
+                self.position = st.st_size
+        self._register()
+
+    def _register(self) -> None:
+        """Records which file this reader follows, so writers know when to rotate."""
+        self.readers_dir.mkdir(parents=True, exist_ok=True)
+        entry = self.readers_dir / f"{os.getpid()}-{id(self):x}"
+        tmp = entry.with_name("." + entry.name)
+        tmp.write_text(str(self._inode))
+        os.replace(tmp, entry)
+
+    def _readers_caught_up(self, inode: int) -> bool:
+        """True when every live reader follows the file with this inode."""
+        try:
+            entries = list(self.readers_dir.iterdir())
+        except FileNotFoundError:
+            return True
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            pid = int(entry.name.split("-", 1)[0])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                entry.unlink(missing_ok=True)  # lecteur mort
+                continue
+            except PermissionError:
+                pass
+            try:
+                if entry.read_text() != str(inode):
+                    return False
+            except FileNotFoundError:
+                continue
+        return True
+
+    def mark_position(self) -> None:
+        """Starts following from the current end of the file."""
+        with self._lock:
+            self.pid = os.getpid()
+            self._pending = b""
+            self._open_current(at_end=True)
+
+    def append(self, op: str, record: Dict[str, Any]) -> None:
+        """
+        Writes one change; the exclusive lock keeps lines from interleaving.
+        Blocking: call it through `asyncio.to_thread` from the event loop.
+        """
+        line = json.dumps({"pid": os.getpid(), "op": op, "record": record}, ensure_ascii=False, default=str)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            with open(self.path, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(f.fileno()).st_ino != self._inode_on_disk():
+                        continue  # fichier remplacé pendant l'attente du verrou
+                    f.write(line.encode("utf-8") + b"\n")
+                    f.flush()
+                    if f.tell() >= self.rotate_bytes and self._readers_caught_up(os.fstat(f.fileno()).st_ino):
+                        self._rotate()
+                    return
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _rotate(self) -> None:
+        """Swaps in an empty file; called with the lock of the current one held."""
+        fd, tmp = tempfile.mkstemp(prefix=f".{self.path.name}.", dir=self.path.parent)
+        os.close(fd)
+        os.replace(tmp, self.path)
+        logger.info("Change feed rotated: %s", self.path)
+
+    def _read_to_end(self) -> bytes:
+        self._file.seek(self.position)
+        chunk = self._file.read()
+        self.position += len(chunk)
+        return chunk
+
+    def read_new(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Changes appended by other processes since the last call, or None when
+        the file shrank (truncated in place) and the caller must reload.
+        Blocking: call it through `asyncio.to_thread` from the event loop.
+        """
+        with self._lock:
+            data = self._pending
+            inode = self._inode_on_disk()
+            if self._file is not None and inode != self._inode:
+                # Rotation: l'ancien fichier est figé, on le lit jusqu'au bout
+                data += self._read_to_end()
+                if not data.endswith(b"\n") and data:
+                    logger.warning("Change feed: dropping a partial line left in the rotated file")
+                    data = data[: data.rfind(b"\n") + 1]
+                self._open_current(at_end=False)
+            elif self._file is None and inode is not None:
+                self._open_current(at_end=False)
+
+            if self._file is not None:
+                size = os.fstat(self._file.fileno()).st_size
+                if size < self.position:
+                    self.position = size
+                    self._pending = b""
+                    return None
+                if size > self.position:
+                    data += self._read_to_end()
+
+            lines = data.split(b"\n")
+            self._pending = lines.pop()  # incomplete trailing line, if any
+
+        changes = []
+        for raw in lines:
+            if not raw.strip():
+                continue
+            try:
+                entry = json.loads(raw)
+            except json.JSONDecodeError:
+                logger.warning("Change feed: ignoring malformed line")
+                continue
+            if entry.get("pid") != self.pid:
+                changes.append(entry)
+        return changes
+
+    async def follow(
+        self,
+        apply: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_reset: Callable[[], Awaitable[None]],
+    ) -> None:
+        """Polls the file (a cheap stat when idle, off the loop) and applies new changes."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changes = await asyncio.to_thread(self.read_new)
+                if changes is None:
+                    logger.info("Change feed truncated, reloading network")
+                    await on_reset()
+                    continue
+                for change in changes:
+                    await apply(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Change feed: failed to apply changes: %s", exc, exc_info=True)
@@ -0,0 +1,86 @@
+"""
+Bounded change log for the ATM network.
+
+Every mutation gets a monotonically increasing version so clients can ask
+for "what changed since version N" instead of downloading the whole network.
+
+Each process numbers its own history (workers behind gunicorn apply the
+same changes at different moments), so a version also carries the epoch of
+the log that issued it: a cursor issued by another worker, or by an earlier
+process, never falls inside this log's window and gets a full snapshot.
+"""
+
+from __future__ import annotations
+
+import secrets
+import time
+from collections import deque
+from typing import Deque, Dict, NamedTuple, Optional
+
+CHANGE_LOG_SIZE = 1000
+# version = compteur << EPOCH_BITS | époque; reste sous 2**53 (entiers JSON/JS exacts)
+EPOCH_BITS = 21
+
+UPSERT = "upsert"
+REMOVE = "remove"
+
+
+class Change(NamedTuple):
+    version: int
+    op: str
+    atm_id: str
+
+
+class ChangeLog:
+    """
+    Keeps the last `maxlen` changes. The counter is seeded from the wall
+    clock (seconds) so versions keep increasing across process restarts; the
+    low `EPOCH_BITS` hold a random epoch drawn per log, checked by `since`.
+    """
+
+    def __init__(self, maxlen: int = CHANGE_LOG_SIZE, start_version: Optional[int] = None,
+                 epoch: Optional[int] = None):
+        self._entries: Deque[Change] = deque(maxlen=maxlen)
+        self.epoch = secrets.randbits(EPOCH_BITS) if epoch is None else epoch % (1 << EPOCH_BITS)
+        counter = int(time.time()) if start_version is None else start_version
+        self.version = counter << EPOCH_BITS | self.epoch
+        self._floor = self.version
+
+    def _next(self) -> int:
+        self.version += 1 << EPOCH_BITS
+        return self.version
+
+    def owns(self, version: int) -> bool:
+        """True when `version` was issued by this log."""
+        return version & ((1 << EPOCH_BITS) - 1) == self.epoch
+
+    def record(self, op: str, atm_id: str) -> int:
+        self._next()
+        if len(self._entries) == self._entries.maxlen:
+            self._floor = self._entries[0].version
+        self._entries.append(Change(self.version, op, atm_id))
+        return self.version
+
+    def reset(self) -> int:
+        """Starts a new history: every earlier version now maps to a full snapshot."""
+        self._next()
+        self._entries.clear()
+        self._floor = self.version
+        return self.version
+
+    def since(self, version: int, until: Optional[int] = None) -> Optional[Dict[str, str]]:
+        """
+        Latest operation per ATM id for changes in (`version`, `until`], or
+        None when that history is no longer (or was never) available here.
+        """
+        until = self.version if until is None else until
+        if not self.owns(version) or version < self._floor or version > until:
+            return None
+        latest: Dict[str, str] = {}
+        for change in reversed(self._entries):
+            if change.version > until:
+                continue
+            if change.version <= version:
+                break
+            latest.setdefault(change.atm_id, change.op)
+        return latest
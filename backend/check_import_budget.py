@@ -0,0 +1,74 @@
+"""
+Import-time budget check for the serverless handlers in `api/`.
+
+Each handler is imported in a fresh interpreter under `python -X importtime`;
+the check fails when a handler takes longer than its budget or pulls in a
+heavy module at import time (those must be imported on first use instead).
+
+Usage (from the repository root):
+
+    python -m backend.check_import_budget
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+API_DIR = ROOT / "api"
+
+DEFAULT_BUDGET_MS = 800
+BUDGETS_MS: Dict[str, int] = {}
+FORBIDDEN_AT_IMPORT = ("pandas", "sklearn", "scipy", "joblib")
+RUNS = 3
+
+
+def discover_handlers() -> List[str]:
+    modules = []
+    for path in sorted(API_DIR.rglob("*.py")):
+        if path.name.startswith("_"):
+            continue
+        modules.append(".".join(path.relative_to(ROOT).with_suffix("").parts))
+    return modules
+
+
+def measure(module: str) -> Tuple[float, Set[str]]:
+    """Total import time (ms) and top-level packages imported by `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    packages: Set[str] = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        total_us += int(self_us)
+        packages.add(name.split(".")[0])
+    return total_us / 1000, packages
+
+
+def main() -> int:
+    failures = 0
+    for module in discover_handlers():
+        budget = BUDGETS_MS.get(module, DEFAULT_BUDGET_MS)
+        best_ms, packages = min((measure(module) for _ in range(RUNS)), key=lambda r: r[0])
+        heavy = sorted(p for p in FORBIDDEN_AT_IMPORT if p in packages)
+        ok = best_ms <= budget and not heavy
+        failures += not ok
+        detail = f" imports {', '.join(heavy)}" if heavy else ""
+        print(f"{'OK  ' if ok else 'FAIL'} {module:<28} {best_ms:7.1f}ms / {budget}ms{detail}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
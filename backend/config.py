@@ -8,6 +8,41 @@ class Settings(BaseSettings):
     """Manages application settings loaded from environment variables."""
     # Example: ALLOWED_ORIGINS="http://localhost:3000,https://my-prod-frontend.com"
     ALLOWED_ORIGINS: str = "*"
+    # Directory holding data.json and the CSV layers (e.g. the output of
+    # backend/benchmarks/synthetic_data.py). Empty uses the bundled backend/data.
+    DATA_DIR: str = ""
+    # Directory of the read-only segments shared by gunicorn workers (preload mode).
+    # Empty disables it: every process parses the CSVs itself.
+    SHARED_SEGMENTS_DIR: str = ""
+    # Append-only file through which workers of one host propagate ATM writes.
+    # Empty disables it (single-process deployments).
+    CHANGE_FEED_FILE: str = ""
+    # Build-time bundle attached by cold serverless instances (see backend/bundle.py).
+    # Empty uses backend/build/service.bundle.
+    BUNDLE_FILE: str = ""
+    # Fraction of successful, fast requests whose access log line is kept (0..1).
+    # Errors and requests slower than LOG_SLOW_REQUEST_MS are always logged.
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_SLOW_REQUEST_MS: float = 1000.0
+    # Admission control of the expensive routes (see backend/admission.py):
+    # concurrent controlled requests per process, and the batch lane's share of them.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CAPACITY: int = 16
+    ADMISSION_BATCH_SHARE: float = 0.5
+    # Asynchronous jobs (see backend/jobs.py): registry and result files, pool
+    # processes per worker, result lifetime, and the heartbeat age after which
+    # another worker takes over a job.
+    JOBS_DIR: str = "/tmp/saham-geomarketing-jobs"
+    JOB_WORKERS: int = 2
+    JOB_RESULT_TTL_S: float = 86400.0
+    JOB_STALE_S: float = 60.0
+    # On-demand request profiling (see backend/profiling.py). Requests are
+    # profiled only when enabled AND they carry `X-Profile: <PROFILING_TOKEN>`.
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str = ""
+    PROFILE_DIR: str = "/tmp/saham-geomarketing-profiles"
+    PROFILE_MAX_FILES: int = 50
+    PROFILE_SAMPLE_INTERVAL_MS: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,204 @@
+"""
+Kernel density rasters of the point layers (POIs, competitors, population).
+
+Points are binned (with their weight: one per POI, `nb_atm` per competitor
+row, inhabitants per commune, see `services._population_counts`) onto a
+regular grid over Morocco, then convolved with a Gaussian kernel through
+NumPy's FFT. The grid is equirectangular with square cells at the
+country's mid latitude, so the kernel is isotropic in km. Values are
+densities per km² (hab/km² for the population layer).
+
+A raster is computed once per dataset version and resolution (see
+`services.density_raster`) and served as an 8-bit grayscale PNG or as raw
+uint8 tiles. Quantization is square-root scaled so that low densities keep
+some contrast: value = max * (q / 255) ** 2.
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+import zlib
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Tuple
+
+import numpy as np
+
+KM_PER_DEGREE = 111.0
+# min_lon, min_lat, max_lon, max_lat
+MOROCCO_BOUNDS = (-17.2, 20.7, -0.9, 36.0)
+RESOLUTIONS_KM: Dict[str, float] = {"coarse": 10.0, "medium": 4.0, "fine": 2.0}
+TILE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class Grid:
+    bounds: Tuple[float, float, float, float]
+    cell_km: float
+
+    @property
+    def lat_step(self) -> float:
+        return self.cell_km / KM_PER_DEGREE
+
+    @property
+    def lon_step(self) -> float:
+        mid_lat = (self.bounds[1] + self.bounds[3]) / 2
+        return self.cell_km / (KM_PER_DEGREE * math.cos(math.radians(mid_lat)))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        return math.ceil((max_lat - min_lat) / self.lat_step), math.ceil((max_lon - min_lon) / self.lon_step)
+
+    def cells(self, latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(rows, cols, inside) of each point; row 0 is the northern edge, as in an image."""
+        min_lon, _, _, max_lat = self.bounds
+        rows = np.floor((max_lat - np.asarray(latitudes, dtype=float)) / self.lat_step).astype(int)
+        cols = np.floor((np.asarray(longitudes, dtype=float) - min_lon) / self.lon_step).astype(int)
+        height, width = self.shape
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        return rows, cols, inside
+
+
+def gaussian_kernel(sigma_cells: float) -> np.ndarray:
+    radius = max(1, math.ceil(3 * sigma_cells))
+    x = np.arange(-radius, radius + 1)
+    g = np.exp(-0.5 * (x / sigma_cells) ** 2)
+    kernel = np.outer(g, g)
+    return kernel / kernel.sum()
+
+
+def fast_length(n: int) -> int:
+    """Smallest 2^a 3^b 5^c >= n: sizes the FFT is fastest on."""
+    best = 2 ** math.ceil(math.log2(n))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            size = p35 * 2 ** max(0, math.ceil(math.log2(n / p35)))
+            best = min(best, size)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def fft_convolve(grid: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """'same'-size linear convolution (zero padding, no wrap-around)."""
+    kh, kw = kernel.shape
+    shape = (fast_length(grid.shape[0] + kh - 1), fast_length(grid.shape[1] + kw - 1))
+    spectrum = np.fft.rfft2(grid, shape) * np.fft.rfft2(kernel, shape)
+    full = np.fft.irfft2(spectrum, shape)
+    top, left = kh // 2, kw // 2
+    out = full[top:top + grid.shape[0], left:left + grid.shape[1]]
+    return np.clip(out, 0, None)  # bruit d'arrondi de la FFT autour de zéro
+
+
+@dataclass(frozen=True)
+class DensityRaster:
+    layer: str
+    resolution: str
+    grid: Grid
+    bandwidth_km: float
+    values: np.ndarray  # float32, (height, width), densité par km²
+    points: int
+
+    @classmethod
+    def compute(cls, layer: str, resolution: str, latitudes, longitudes, weights, bandwidth_km: float,
+                bounds: Tuple[float, float, float, float] = MOROCCO_BOUNDS) -> "DensityRaster":
+        grid = Grid(bounds, RESOLUTIONS_KM[resolution])
+        rows, cols, inside = grid.cells(latitudes, longitudes)
+        height, width = grid.shape
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), inside.shape)
+        binned = np.bincount(
+            rows[inside] * width + cols[inside], weights=weights[inside], minlength=height * width
+        ).reshape(height, width)
+        # Le noyau ne descend pas sous la taille d'une cellule
+        sigma_km = max(bandwidth_km, grid.cell_km)
+        smoothed = fft_convolve(binned, gaussian_kernel(sigma_km / grid.cell_km))
+        values = (smoothed / grid.cell_km ** 2).astype(np.float32)
+        return cls(layer, resolution, grid, sigma_km, values, int(inside.sum()))
+
+    @property
+    def max(self) -> float:
+        return float(self.values.max()) if self.values.size else 0.0
+
+    def sample(self, latitudes, longitudes) -> np.ndarray:
+        """Density of the cell holding each point (0 outside the grid)."""
+        rows, cols, inside = self.grid.cells(latitudes, longitudes)
+        out = np.zeros(inside.shape, dtype=np.float32)
+        out[inside] = self.values[rows[inside], cols[inside]]
+        return out
+
+    # ---------- Encodage ----------
+
+    @cached_property
+    def quantized(self) -> np.ndarray:
+        peak = self.max
+        if peak <= 0:
+            return np.zeros(self.values.shape, dtype=np.uint8)
+        return np.rint(255 * np.sqrt(self.values / peak)).astype(np.uint8)
+
+    @cached_property
+    def png(self) -> bytes:
+        return encode_png(self.quantized)
+
+    def prepare(self) -> "DensityRaster":
+        """Encodes the PNG and the ETag now, so that serving them later costs nothing."""
+        # Premier accès aux cached_property: calculées puis mémorisées
+        self.png
+        self.etag
+        return self
+
+    @cached_property
+    def etag(self) -> str:
+        """Derived from the content, so that every worker serves the same tag for the same raster."""
+        digest = zlib.crc32(self.quantized.tobytes(), zlib.crc32(struct.pack(">f", self.max)))
+        return f'"{self.layer}-{self.resolution}-{digest:08x}"'
+
+    def tiles_shape(self) -> Tuple[int, int]:
+        height, width = self.values.shape
+        return math.ceil(height / TILE_SIZE), math.ceil(width / TILE_SIZE)
+
+    def tile(self, row: int, col: int) -> np.ndarray:
+        """Quantized block (at most TILE_SIZE x TILE_SIZE; edge tiles are smaller)."""
+        tile_rows, tile_cols = self.tiles_shape()
+        if not (0 <= row < tile_rows and 0 <= col < tile_cols):
+            raise KeyError(f"Tuile hors grille: ({row}, {col}), grille de {tile_rows}x{tile_cols} tuiles")
+        return self.quantized[row * TILE_SIZE:(row + 1) * TILE_SIZE, col * TILE_SIZE:(col + 1) * TILE_SIZE]
+
+    def metadata(self) -> Dict:
+        min_lon, min_lat, max_lon, max_lat = self.grid.bounds
+        height, width = self.values.shape
+        return {
+            "layer": self.layer,
+            "resolution": self.resolution,
+            "bounds": {"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat},
+            "cell_km": self.grid.cell_km,
+            "lat_step": self.grid.lat_step,
+            "lon_step": self.grid.lon_step,
+            "shape": [height, width],
+            "bandwidth_km": self.bandwidth_km,
+            "points": self.points,
+            "max_density": self.max,
+            "scale": "sqrt",
+            "tile_size": TILE_SIZE,
+            "tiles": list(self.tiles_shape()),
+        }
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """8-bit grayscale PNG (no external imaging library needed)."""
+    height, width = pixels.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    # Filtre 0 (aucun) en tête de chaque ligne
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), np.ascontiguousarray(pixels, dtype=np.uint8)])
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
@@ -0,0 +1,113 @@
+"""
+Server-sent events broadcaster.
+
+Each connected client gets its own bounded queue. Publishing serializes the
+event once and hands the same frame to every queue without blocking; a
+client whose queue is full is considered too slow and is disconnected.
+Events published from another thread are handed to the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CLIENT_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15.0
+
+_KEEPALIVE_FRAME = ": keepalive\n\n"
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+
+class EventBroadcaster:
+    """Fan-out of compact change events to every connected SSE client."""
+
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE, keepalive: float = KEEPALIVE_SECONDS):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped_total = 0
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> None:
+        """Queues an event for every client; never blocks the caller."""
+        if not self._subscribers:
+            return
+        frame = format_event(event, data, event_id)
+        loop = self._loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is not None and current is not loop:
+            # Les files asyncio ne sont pas thread-safe
+            loop.call_soon_threadsafe(self._fan_out, frame)
+        else:
+            self._fan_out(frame)
+
+    def _fan_out(self, frame: str) -> None:
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: _Subscriber) -> None:
+        sub.dropped = True
+        self._subscribers.discard(sub)
+        self.dropped_total += 1
+        # Wake the consumer so it notices it was dropped.
+        try:
+            sub.queue.get_nowait()
+            sub.queue.put_nowait(None)
+        except (asyncio.QueueEmpty, asyncio.QueueFull):
+            pass
+        logger.warning("SSE client dropped (queue full, %d pending events)", self.queue_size)
+
+    async def stream(self, hello: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Yields SSE frames for one client until it disconnects or is dropped.
+        Idle clients only cost a pending `queue.get` plus a keepalive timer.
+        """
+        sub = _Subscriber(self.queue_size)
+        self._loop = asyncio.get_running_loop()
+        self._subscribers.add(sub)
+        try:
+            yield "retry: 5000\n\n"
+            if hello is not None:
+                yield format_event("hello", hello)
+            while not sub.dropped:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield _KEEPALIVE_FRAME
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self._subscribers.discard(sub)
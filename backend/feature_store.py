@@ -0,0 +1,182 @@
+"""
+Commune feature store: the socio-economic indicators of
+`master_indicateurs_normalise.csv` as one contiguous float32 matrix.
+
+Rows are communes, columns the indicators of `FEATURES`. A hash index on
+`commune_norm` gives the row of a commune in O(1), and a KD-tree over the
+commune centroids (as 3-D unit vectors, where the nearest chord is the
+nearest great-circle distance) gives the nearest commune of any point, one
+at a time or for a whole batch, about ten times faster than the haversine
+ball tree of `geo.SpatialIndex`.
+
+Predictions (/predict, the serverless handler) and scan jobs attach the
+nearest commune's row to their results, and the /communes endpoints serve
+it. The rows are not model inputs: the predictor is trained on features
+whose scales do not match these indicators (`densite`, for one, is a head
+count), so mapping them onto `LocationData` would silently skew scores.
+The dashboard aggregates the ATM network and does not read them either.
+
+Missing indicators are imputed with the column median (`nb_atm` with 0: a
+commune absent from the ATM census has none); `imputed` counts them.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import unicodedata
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FEATURES: Tuple[str, ...] = (
+    "densite",
+    "densite_norm",
+    "taux_jeunesse",
+    "taux_vieillesse",
+    "INIV",
+    "IEDU",
+    "Indice_accessibilite_x",
+    "Indice_transport",
+    "indice_transport_norm_x",
+    "indice_densite_routiere",
+    "indice_densite_routiere_norm",
+    "Indice_POI",
+    "Indice_POI_norm",
+    "nb_atm",
+)
+# Absent du recensement des ATMs = aucun ATM
+ZERO_FILLED = ("nb_atm",)
+
+
+def _unit_vectors(latitudes, longitudes) -> np.ndarray:
+    lat = np.radians(np.atleast_1d(np.asarray(latitudes, dtype=float)))
+    lon = np.radians(np.atleast_1d(np.asarray(longitudes, dtype=float)))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def normalize_commune(name: str) -> str:
+    """Key of the `commune_norm` column: 'Aïn-Chock' -> 'ainchock'."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]", "", ascii_name.lower())
+
+
+class CommuneFeatureStore:
+    def __init__(self, communes: Sequence[str], labels: Sequence[str], latitudes: np.ndarray,
+                 longitudes: np.ndarray, matrix: np.ndarray, features: Sequence[str] = FEATURES,
+                 imputed: Optional[Dict[str, int]] = None):
+        if matrix.shape != (len(communes), len(features)):
+            raise ValueError(f"matrix shape {matrix.shape} does not match {len(communes)} communes x {len(features)} features")
+        self.communes = tuple(communes)
+        self.labels = tuple(labels)
+        self.features = tuple(features)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.matrix.setflags(write=False)
+        self.columns = {name: j for j, name in enumerate(self.features)}
+        self.imputed = imputed or {}
+        self.index: Dict[str, int] = {}
+        for i, commune in enumerate(self.communes):
+            # Homonymes: la première ligne fait foi pour la recherche par nom
+            self.index.setdefault(commune, i)
+        duplicates = len(self.communes) - len(self.index)
+        if duplicates:
+            logger.warning("Feature store: %d communes homonymes, seule la première est indexée par nom", duplicates)
+        from scipy.spatial import cKDTree
+
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self._tree = cKDTree(_unit_vectors(self.latitudes, self.longitudes)) if len(self.communes) else None
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", features: Sequence[str] = FEATURES) -> "CommuneFeatureStore":
+        import pandas as pd
+
+        matrix = np.empty((len(df), len(features)), dtype=np.float32)
+        imputed: Dict[str, int] = {}
+        for j, name in enumerate(features):
+            if name in df.columns:
+                values = np.array(pd.to_numeric(df[name], errors="coerce"), dtype=float)  # copie: le DataFrame est partagé
+            else:
+                values = np.full(len(df), np.nan)
+            missing = ~np.isfinite(values)
+            if missing.any():
+                imputed[name] = int(missing.sum())
+                fill = 0.0 if name in ZERO_FILLED or missing.all() else float(np.median(values[~missing]))
+                values[missing] = fill
+            matrix[:, j] = values
+        labels = df["commune"] if "commune" in df.columns else df["commune_norm"]
+        return cls(
+            communes=[str(c) for c in df["commune_norm"]],
+            labels=[str(c) for c in labels],
+            latitudes=df["latitude"].to_numpy(dtype=float),
+            longitudes=df["longitude"].to_numpy(dtype=float),
+            matrix=matrix,
+            features=features,
+            imputed=imputed,
+        )
+
+    def __len__(self) -> int:
+        return len(self.communes)
+
+    def _columns(self, features: Optional[Sequence[str]]) -> List[int]:
+        if features is None:
+            return list(range(len(self.features)))
+        unknown = [name for name in features if name not in self.columns]
+        if unknown:
+            raise KeyError(f"Indicateurs inconnus: {unknown} (disponibles: {list(self.features)})")
+        return [self.columns[name] for name in features]
+
+    # ---------- Par commune ----------
+
+    def row_of(self, commune: str) -> int:
+        """Row of a commune, by `commune_norm` or display name. Raises KeyError."""
+        row = self.index.get(commune)
+        if row is None:
+            row = self.index.get(normalize_commune(commune))
+        if row is None:
+            raise KeyError(f"Commune inconnue: {commune!r}")
+        return row
+
+    def get(self, commune: str) -> Dict:
+        return self.record(self.row_of(commune))
+
+    def batch(self, communes: Sequence[str], features: Optional[Sequence[str]] = None) -> np.ndarray:
+        """(len(communes), len(features)) matrix; raises KeyError on the first unknown commune."""
+        rows = [self.row_of(c) for c in communes]
+        return self.matrix[np.ix_(rows, self._columns(features))]
+
+    # ---------- Par coordonnées ----------
+
+    def nearest(self, latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, distances_km) of the commune centroid nearest to each point."""
+        if self._tree is None:
+            raise ValueError("Feature store vide")
+        chords, rows = self._tree.query(_unit_vectors(latitudes, longitudes))
+        return rows, 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2, 0, 1))
+
+    def lookup(self, latitudes, longitudes, features: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized: (rows, distances_km, features matrix) of the nearest commune of each point."""
+        columns = self._columns(features)
+        rows, distances = self.nearest(latitudes, longitudes)
+        return rows, distances, self.matrix[np.ix_(rows, columns)]
+
+    def record(self, row: int, distance_km: Optional[float] = None) -> Dict:
+        record = {
+            "commune_norm": self.communes[row],
+            "commune": self.labels[row],
+            "latitude": float(self.latitudes[row]),
+            "longitude": float(self.longitudes[row]),
+            # str() d'un float32 = plus courte écriture exacte (16.8 et non 16.799999237)
+            "features": {name: float(str(value)) for name, value in zip(self.features, self.matrix[row])},
+        }
+        if distance_km is not None:
+            record["distance_km"] = round(float(distance_km), 3)
+        return record
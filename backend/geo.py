@@ -0,0 +1,89 @@
+"""
+Geographic helpers: haversine distances and a spatial index for k-nearest
+and radius lookups over point layers (own ATMs, competitors, ...).
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or broadcastable arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialIndex:
+    """
+    Ball tree (haversine metric) over a set of points, each carrying an
+    arbitrary payload. Distances returned are in km.
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float], payloads: Sequence[Any]):
+        if not (len(latitudes) == len(longitudes) == len(payloads)):
+            raise ValueError("latitudes, longitudes and payloads must have the same length")
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.payloads = list(payloads)
+        self._tree = None
+        if len(self.payloads):
+            from sklearn.neighbors import BallTree
+
+            coords = np.radians(np.column_stack([self.latitudes, self.longitudes]))
+            self._tree = BallTree(coords, metric="haversine")
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def query(self, latitudes, longitudes, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k-nearest neighbours for a batch of points.
+        Returns (distances_km, indices), both shaped (n_points, min(k, len(self))).
+        """
+        points = np.radians(np.column_stack([np.atleast_1d(latitudes), np.atleast_1d(longitudes)]))
+        k = min(k, len(self))
+        if self._tree is None or k <= 0:
+            empty = np.empty((len(points), 0))
+            return empty, empty.astype(int)
+        distances, indices = self._tree.query(points, k=k)
+        return distances * EARTH_RADIUS_KM, indices
+
+    def query_radius(self, latitude: float, longitude: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of every point within `radius_km`, nearest first."""
+        if self._tree is None:
+            return np.empty(0), np.empty(0, dtype=int)
+        point = np.radians([[latitude, longitude]])
+        indices, distances = self._tree.query_radius(
+            point, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True
+        )
+        return distances[0] * EARTH_RADIUS_KM, indices[0]
+
+    def pairs_within(self, latitudes, longitudes, radius_km: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every (query point, indexed point) pair closer than `radius_km`, for a
+        batch of query points, as flat arrays (query_rows, indices, distances_km).
+        """
+        lats, lons = np.atleast_1d(latitudes), np.atleast_1d(longitudes)
+        if self._tree is None or not len(lats):
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+        points = np.radians(np.column_stack([lats, lons]))
+        indices, distances = self._tree.query_radius(points, r=radius_km / EARTH_RADIUS_KM, return_distance=True)
+        counts = np.fromiter((len(i) for i in indices), dtype=int, count=len(indices))
+        rows = np.repeat(np.arange(len(indices)), counts)
+        if not counts.sum():
+            return rows, np.empty(0, dtype=int), np.empty(0)
+        return rows, np.concatenate(indices).astype(int), np.concatenate(distances) * EARTH_RADIUS_KM
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> List[Tuple[Any, float]]:
+        """(payload, distance_km) pairs for the k nearest points, nearest first."""
+        distances, indices = self.query([latitude], [longitude], k)
+        return [(self.payloads[i], float(d)) for d, i in zip(distances[0], indices[0])]
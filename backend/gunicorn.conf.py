@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for the preload mode (`./run.sh preload`).
+
+The master process builds the shared read-only segments (layer datasets and
+model artifacts, see `backend/shared_segments.py`) once before forking; each
+worker then memory-maps them instead of parsing and training on its own.
+"""
+import os
+
+os.environ.setdefault("SHARED_SEGMENTS_DIR", "/dev/shm/saham-geomarketing" if os.path.isdir("/dev/shm") else "/tmp/saham-geomarketing")
+os.environ.setdefault("CHANGE_FEED_FILE", os.path.join(os.environ["SHARED_SEGMENTS_DIR"], "atm_changes.log"))
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+pidfile = os.environ.get("PIDFILE", "/tmp/saham-geomarketing.pid")
+
+
+def on_starting(server):
+    from backend.shared_segments import build_segments
+
+    built = build_segments()
+    server.log.info("Shared segments ready in %s: %s", os.environ["SHARED_SEGMENTS_DIR"], built)
+
+    # Every worker starts from data.json, so earlier feed entries are no longer needed.
+    feed = os.environ["CHANGE_FEED_FILE"]
+    os.makedirs(os.path.dirname(feed), exist_ok=True)
+    open(feed, "w").close()
@@ -0,0 +1,210 @@
+"""
+Huff gravity model of ATM market share, over our network and the competitors.
+
+Each demand point i (a commune centroid weighted by its population) spreads
+its demand D_i over the sites j it can reach, in proportion to
+
+    w_ij = A_j ** alpha * max(d_ij, min_distance_km) ** -decay
+
+where A_j is the site's attractiveness, in "typical ATM" units: one of our
+ATMs weighs its monthly volume over the network median, a competitor row
+weighs its `nb_atm`. Pairs further apart than `max_distance_km` are dropped
+(found through a ball tree over the demand points), so the weights form a
+sparse demand x site matrix W and a site's expected capture is
+
+    capture_j = sum_i D_i * w_ij / T_i,   T_i = sum_j w_ij
+
+A candidate site only changes the rows it reaches: `evaluate` computes its
+capture and what it takes from every existing site from those rows alone,
+and `with_site` returns the model with the site added without renormalizing
+the whole matrix.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .geo import SpatialIndex
+
+
+@dataclass(frozen=True)
+class HuffParams:
+    decay: float = 2.0
+    alpha: float = 1.0
+    min_distance_km: float = 1.0
+    max_distance_km: float = 30.0
+
+
+@dataclass(frozen=True)
+class Sites:
+    """Columns of the model: one entry per site."""
+
+    ids: Sequence[str]
+    operators: Sequence[str]
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    attractiveness: np.ndarray
+    own: np.ndarray  # bool: one of our ATMs
+
+    def extend(self, other: "Sites") -> "Sites":
+        return Sites(
+            ids=tuple(self.ids) + tuple(other.ids),
+            operators=tuple(self.operators) + tuple(other.operators),
+            latitudes=np.concatenate([self.latitudes, other.latitudes]),
+            longitudes=np.concatenate([self.longitudes, other.longitudes]),
+            attractiveness=np.concatenate([self.attractiveness, other.attractiveness]),
+            own=np.concatenate([self.own, other.own]),
+        )
+
+    def append(self, site_id: str, operator: str, latitude: float, longitude: float,
+               attractiveness: float, own: bool) -> "Sites":
+        return Sites(
+            ids=tuple(self.ids) + (site_id,),
+            operators=tuple(self.operators) + (operator,),
+            latitudes=np.append(self.latitudes, latitude),
+            longitudes=np.append(self.longitudes, longitude),
+            attractiveness=np.append(self.attractiveness, attractiveness),
+            own=np.append(self.own, own),
+        )
+
+
+class HuffModel:
+    def __init__(self, demand: np.ndarray, demand_index: SpatialIndex, sites: Sites, params: HuffParams,
+                 weights, totals: np.ndarray, capture: np.ndarray):
+        self.demand = demand
+        self.demand_index = demand_index
+        self.sites = sites
+        self.params = params
+        self.weights = weights  # CSR, demand x sites
+        self.totals = totals
+        self.capture = capture
+
+    @classmethod
+    def build(cls, demand: np.ndarray, demand_index: SpatialIndex, sites: Sites,
+              params: HuffParams = HuffParams()) -> "HuffModel":
+        from scipy import sparse
+
+        sites_idx, rows, distances = demand_index.pairs_within(
+            sites.latitudes, sites.longitudes, params.max_distance_km
+        )
+        values = cls._weight(sites.attractiveness[sites_idx], distances, params)
+        weights = sparse.csr_matrix(
+            (values, (rows, sites_idx)), shape=(len(demand), len(sites.ids))
+        )
+        totals = np.asarray(weights.sum(axis=1)).ravel()
+        capture = weights.T @ cls._per_weight(demand, totals)
+        return cls(demand, demand_index, sites, params, weights, totals, capture)
+
+    @staticmethod
+    def _weight(attractiveness: np.ndarray, distances: np.ndarray, params: HuffParams) -> np.ndarray:
+        return (attractiveness ** params.alpha) * np.maximum(distances, params.min_distance_km) ** -params.decay
+
+    @staticmethod
+    def _per_weight(demand: np.ndarray, totals: np.ndarray) -> np.ndarray:
+        """D_i / T_i, 0 where no site is in reach."""
+        return np.divide(demand, totals, out=np.zeros_like(demand, dtype=float), where=totals > 0)
+
+    # ---------- Lecture ----------
+
+    @property
+    def total_demand(self) -> float:
+        return float(self.demand.sum())
+
+    @property
+    def served_demand(self) -> float:
+        return float(self.demand[self.totals > 0].sum())
+
+    def shares_by_operator(self) -> Dict[str, float]:
+        """Share of the served demand captured by each operator."""
+        served = self.served_demand
+        shares: Dict[str, float] = {}
+        for operator, capture in zip(self.sites.operators, self.capture):
+            shares[operator] = shares.get(operator, 0.0) + float(capture)
+        return {op: value / served if served else 0.0 for op, value in sorted(shares.items(), key=lambda kv: -kv[1])}
+
+    def own_share(self) -> float:
+        served = self.served_demand
+        return float(self.capture[self.sites.own].sum()) / served if served else 0.0
+
+    # ---------- Candidat ----------
+
+    def _column(self, latitude: float, longitude: float, attractiveness: float):
+        _, rows, distances = self.demand_index.pairs_within([latitude], [longitude], self.params.max_distance_km)
+        return rows, self._weight(np.full(len(rows), float(attractiveness)), distances, self.params)
+
+    def _impact(self, rows: np.ndarray, column: np.ndarray):
+        """(candidate capture, capture lost by each existing site, new row totals) for a new column."""
+        demand, old_totals = self.demand[rows], self.totals[rows]
+        new_totals = old_totals + column
+        capture = float((demand * column / new_totals).sum()) if len(rows) else 0.0
+        # Perte du site j: sum_i D_i w_ij (1/T_i - 1/T'_i) sur les seules lignes touchées
+        delta = self._per_weight(demand, old_totals) - demand / new_totals
+        loss = self.weights[rows].T @ delta if len(rows) else np.zeros(len(self.sites.ids))
+        return capture, loss, new_totals
+
+    def evaluate(self, latitude: float, longitude: float, attractiveness: float = 1.0, top: int = 10) -> Dict[str, Any]:
+        """What-if for a new own site, the network being left unchanged."""
+        rows, column = self._column(latitude, longitude, attractiveness)
+        capture, loss, _ = self._impact(rows, column)
+        own = self.sites.own
+        cannibalized = float(loss[own].sum())
+        taken: Dict[str, float] = {}
+        for j in np.flatnonzero(~own & (loss > 0)):
+            taken[self.sites.operators[j]] = taken.get(self.sites.operators[j], 0.0) + float(loss[j])
+        affected = np.flatnonzero(own & (loss > 0))
+        affected = affected[np.argsort(-loss[affected], kind="stable")[:top]]
+        affected_atms = [
+            {
+                "id": self.sites.ids[j],
+                "capture_lost": round(float(loss[j]), 2),
+                "capture_lost_percent": round(100 * float(loss[j] / self.capture[j]), 2) if self.capture[j] else 0.0,
+            }
+            for j in affected
+        ]
+        return {
+            "capture": round(capture, 2),
+            "reachable_demand": round(float(self.demand[rows].sum()), 2),
+            "own_cannibalization": round(cannibalized, 2),
+            "net_gain": round(capture - cannibalized, 2),
+            "cannibalization_ratio": round(cannibalized / capture, 4) if capture else 0.0,
+            "taken_from_competitors": {op: round(v, 2) for op, v in sorted(taken.items(), key=lambda kv: -kv[1])},
+            "affected_atms": affected_atms,
+        }
+
+    def with_site(self, site_id: str, operator: str, latitude: float, longitude: float,
+                  attractiveness: float, own: bool = True) -> "HuffModel":
+        """The model with one more site; only the rows it reaches are renormalized."""
+        from scipy import sparse
+
+        rows, column = self._column(latitude, longitude, attractiveness)
+        capture, loss, new_totals = self._impact(rows, column)
+        new_column = sparse.csr_matrix(
+            (column, (rows, np.zeros(len(rows), dtype=int))), shape=(len(self.demand), 1)
+        )
+        totals = self.totals.copy()
+        totals[rows] = new_totals
+        return HuffModel(
+            self.demand,
+            self.demand_index,
+            self.sites.append(site_id, operator, latitude, longitude, attractiveness, own),
+            self.params,
+            sparse.hstack([self.weights, new_column], format="csr"),
+            totals,
+            np.append(self.capture - loss, capture),
+        )
+
+    def site_captures(self, own_only: bool = True) -> List[Dict[str, Any]]:
+        served = self.served_demand
+        return [
+            {
+                "id": self.sites.ids[j],
+                "operator": self.sites.operators[j],
+                "capture": round(float(self.capture[j]), 2),
+                "share_percent": round(100 * float(self.capture[j]) / served, 4) if served else 0.0,
+            }
+            for j in range(len(self.sites.ids))
+            if self.sites.own[j] or not own_only
+        ]
@@ -0,0 +1,322 @@
+"""
+In-memory secondary indexes over the ATM network.
+
+`ATMIndex` keeps hash indexes on the categorical ATM fields and a sorted array
+per sort field (plus latitude for bounding boxes), so `/atms` filters are
+answered by lookups and binary searches, and a page is read by walking the
+sorted array from the cursor instead of sorting every match.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import heapq
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .schemas import ATMData
+
+CATEGORICAL_FIELDS = ("region", "city", "bank_name", "status", "installation_type")
+SORT_FIELDS = ("id", "monthly_volume", "city", "region", "bank_name")
+FILTER_FIELDS = (*CATEGORICAL_FIELDS, "bbox", "min_volume", "max_volume")
+
+MAX_LIMIT = 5000
+
+# Sous cette fraction du réseau, trier les correspondances coûte moins que
+# parcourir l'index trié en testant l'appartenance.
+SPARSE_MATCH_RATIO = 8
+
+
+def _norm(value: Optional[str]) -> str:
+    return (value or "").strip().casefold()
+
+
+def sort_key(atm: ATMData, field: str) -> Any:
+    """Value `field` is ordered by: the volume as a float, other fields casefolded."""
+    if field == "monthly_volume":
+        return float(atm.monthly_volume or 0)
+    return _norm(getattr(atm, field))
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[Optional[str], bool]:
+    """Splits `-field` into (field, descending); (None, False) for insertion order."""
+    if not sort:
+        return None, False
+    field = sort.lstrip("-")
+    if field not in SORT_FIELDS:
+        raise ValueError(f"Unsupported sort field: {field!r}. Expected one of {SORT_FIELDS}")
+    return field, sort.startswith("-")
+
+
+def filters_digest(**filters: Any) -> str:
+    """Stable digest of the non-null filters, normalised as `ATMIndex.query` compares them."""
+    canonical = {}
+    for name, value in filters.items():
+        if name not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter: {name!r}")
+        if value is None:
+            continue
+        if name in CATEGORICAL_FIELDS:
+            canonical[name] = _norm(value)
+        elif name == "bbox":
+            canonical[name] = [float(v) for v in value]
+        else:
+            canonical[name] = float(value)
+    raw = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class Cursor(NamedTuple):
+    """Position after the last row of a page, tied to the query that produced it."""
+
+    version: int
+    sort: str
+    filters: str
+    key: Any
+    atm_id: str
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = json.dumps(list(cursor), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Cursor]:
+    if not value:
+        return None
+    try:
+        version, sort, filters, key, atm_id = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError) as exc:
+        raise ValueError(f"Invalid cursor: {value!r}") from exc
+    if not (
+        isinstance(version, int)
+        and isinstance(sort, str)
+        and isinstance(filters, str)
+        and isinstance(key, (int, float, str))
+        and isinstance(atm_id, str)
+    ):
+        raise ValueError(f"Invalid cursor: {value!r}")
+    return Cursor(version, sort, filters, key, atm_id)
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parses `min_lon,min_lat,max_lon,max_lat` (GeoJSON order)."""
+    if not value:
+        return None
+    parts = [p.strip() for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be 'min_lon,min_lat,max_lon,max_lat'")
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(p) for p in parts)
+    except ValueError as exc:
+        raise ValueError(f"Invalid bbox: {value!r}") from exc
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+class Page(NamedTuple):
+    atms: List[ATMData]
+    total: int
+    more: bool
+
+
+class ATMIndex:
+    """Secondary indexes over a set of ATMs, keyed by ATM id."""
+
+    def __init__(self, atms: Iterable[ATMData] = ()):
+        self._by_id: Dict[str, ATMData] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._hash: Dict[str, Dict[str, Set[str]]] = {f: defaultdict(set) for f in CATEGORICAL_FIELDS}
+        # (seq, id) par ordre d'insertion, et (clé, id) triés pour chaque champ de tri
+        self._order: List[Tuple[int, str]] = []
+        self._sorted: Dict[str, List[Tuple[Any, str]]] = {f: [] for f in SORT_FIELDS}
+        self._latitudes: List[Tuple[float, str]] = []
+        for atm in atms:
+            self.add(atm)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, atm_id: str) -> bool:
+        return atm_id in self._by_id
+
+    def get(self, atm_id: str) -> Optional[ATMData]:
+        return self._by_id.get(atm_id)
+
+    def copy(self) -> "ATMIndex":
+        """Independent copy that can be mutated without affecting this index."""
+        clone = ATMIndex.__new__(ATMIndex)
+        clone._by_id = dict(self._by_id)
+        clone._seq = dict(self._seq)
+        clone._next_seq = self._next_seq
+        clone._hash = {
+            field: defaultdict(set, {key: set(ids) for key, ids in buckets.items()})
+            for field, buckets in self._hash.items()
+        }
+        clone._order = list(self._order)
+        clone._sorted = {field: list(entries) for field, entries in self._sorted.items()}
+        clone._latitudes = list(self._latitudes)
+        return clone
+
+    def add(self, atm: ATMData) -> None:
+        """Indexes an ATM, replacing any previous record with the same id."""
+        if atm.id in self._by_id:
+            self.remove(atm.id)
+        self._by_id[atm.id] = atm
+        self._seq[atm.id] = self._next_seq
+        self._order.append((self._next_seq, atm.id))
+        self._next_seq += 1
+        for field in CATEGORICAL_FIELDS:
+            self._hash[field][_norm(getattr(atm, field))].add(atm.id)
+        for field, entries in self._sorted.items():
+            insort(entries, (sort_key(atm, field), atm.id))
+        insort(self._latitudes, (atm.latitude, atm.id))
+
+    def remove(self, atm_id: str) -> Optional[ATMData]:
+        atm = self._by_id.pop(atm_id, None)
+        if atm is None:
+            return None
+        self._discard_sorted(self._order, (self._seq.pop(atm_id), atm_id))
+        for field in CATEGORICAL_FIELDS:
+            bucket = self._hash[field].get(_norm(getattr(atm, field)))
+            if bucket is not None:
+                bucket.discard(atm_id)
+                if not bucket:
+                    del self._hash[field][_norm(getattr(atm, field))]
+        for field, entries in self._sorted.items():
+            self._discard_sorted(entries, (sort_key(atm, field), atm_id))
+        self._discard_sorted(self._latitudes, (atm.latitude, atm_id))
+        return atm
+
+    def position(self, atm_id: str, sort: Optional[str] = None) -> Tuple[Any, str]:
+        """(key, id) of an indexed ATM in the order `sort` walks, for building a cursor."""
+        field, _ = parse_sort(sort)
+        if field is None:
+            return self._seq[atm_id], atm_id
+        return sort_key(self._by_id[atm_id], field), atm_id
+
+    @staticmethod
+    def _discard_sorted(values: List[Tuple[Any, str]], key: Tuple[Any, str]) -> None:
+        pos = bisect_left(values, key)
+        if pos < len(values) and values[pos] == key:
+            del values[pos]
+
+    @staticmethod
+    def _range(values: List[Tuple[float, str]], low: Optional[float], high: Optional[float]) -> Set[str]:
+        start = 0 if low is None else bisect_left(values, (low, ""))
+        end = len(values) if high is None else bisect_right(values, (high, "\uffff"))
+        return {atm_id for _, atm_id in values[start:end]}
+
+    def _matches(
+        self,
+        categorical: Dict[str, Optional[str]],
+        bbox: Optional[Tuple[float, float, float, float]],
+        min_volume: Optional[float],
+        max_volume: Optional[float],
+    ) -> Optional[Set[str]]:
+        """Ids matching every given filter, or None when no filter is given."""
+        candidate_sets: List[Set[str]] = []
+        for field, value in categorical.items():
+            if value is not None:
+                candidate_sets.append(self._hash[field].get(_norm(value), set()))
+
+        if min_volume is not None or max_volume is not None:
+            candidate_sets.append(self._range(self._sorted["monthly_volume"], min_volume, max_volume))
+
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            in_lat = self._range(self._latitudes, min_lat, max_lat)
+            candidate_sets.append(
+                {i for i in in_lat if min_lon <= self._by_id[i].longitude <= max_lon}
+            )
+
+        if not candidate_sets:
+            return None
+        candidate_sets.sort(key=len)
+        # Les ensembles du hachage ne sont que lus : l'intersection en crée un nouveau
+        matches = candidate_sets[0]
+        for other in candidate_sets[1:]:
+            if not matches:
+                break
+            matches = matches & other
+        return matches
+
+    @staticmethod
+    def _walk(entries: List[Tuple[Any, str]], after: Optional[Tuple[Any, str]], descending: bool) -> Iterator[Tuple[Any, str]]:
+        """Entries strictly after `after` in walking order."""
+        if descending:
+            end = len(entries) if after is None else bisect_left(entries, after)
+            return (entries[i] for i in range(end - 1, -1, -1))
+        start = 0 if after is None else bisect_right(entries, after)
+        return (entries[i] for i in range(start, len(entries)))
+
+    def query(
+        self,
+        *,
+        region: Optional[str] = None,
+        city: Optional[str] = None,
+        bank_name: Optional[str] = None,
+        status: Optional[str] = None,
+        installation_type: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        min_volume: Optional[float] = None,
+        max_volume: Optional[float] = None,
+        sort: Optional[str] = None,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: Optional[int] = None,
+    ) -> Page:
+        """
+        Returns one page of matching ATMs, the total number of matches and
+        whether more follow. `sort` is one of SORT_FIELDS, optionally prefixed
+        by '-' for descending (ties broken by id); without it ATMs come in
+        insertion order. `after` is the `position` of the previous page's last
+        row; without `limit` every match past it is returned.
+        """
+        field, descending = parse_sort(sort)
+        entries = self._order if field is None else self._sorted[field]
+        matches = self._matches(
+            {
+                "region": region,
+                "city": city,
+                "bank_name": bank_name,
+                "status": status,
+                "installation_type": installation_type,
+            },
+            bbox,
+            min_volume,
+            max_volume,
+        )
+        total = len(self._by_id) if matches is None else len(matches)
+        want = None if limit is None else limit + 1
+        if after is not None:
+            after = tuple(after)
+
+        try:
+            if matches is not None and len(matches) * SPARSE_MATCH_RATIO < len(entries):
+                keyed = [self.position(i, sort) for i in matches]
+                if after is not None:
+                    keyed = [k for k in keyed if (k < after if descending else k > after)]
+                if want is None:
+                    keyed.sort(reverse=descending)
+                else:
+                    keyed = (heapq.nlargest if descending else heapq.nsmallest)(want, keyed)
+                picked = [atm_id for _, atm_id in keyed]
+            else:
+                picked = []
+                for _, atm_id in self._walk(entries, after, descending):
+                    if matches is None or atm_id in matches:
+                        picked.append(atm_id)
+                        if want is not None and len(picked) == want:
+                            break
+        except TypeError as exc:
+            raise ValueError(f"Cursor position {after!r} does not fit sort {sort!r}") from exc
+
+        more = want is not None and len(picked) == want
+        if more:
+            picked.pop()
+        return Page([self._by_id[i] for i in picked], total, more)
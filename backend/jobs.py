@@ -0,0 +1,576 @@
+"""
+Asynchronous jobs for analyses that do not fit in an HTTP request.
+
+`POST /jobs` validates the parameters of a registered job kind and returns a
+job id at once; the work runs in a process pool (spawned processes, so the
+event loop and its threads are never forked). Workers report progress
+through a queue, which a listener thread writes into the registry.
+
+The registry is a SQLite file under `JOBS_DIR`, shared by every worker of
+the host: a job submitted through one worker can be polled or streamed
+through any other, and jobs survive restarts. Each owner heartbeats its
+queued and running jobs; a job whose owner stopped heartbeating for
+`stale_after` seconds (or whose owner process is gone, on this host) is
+claimed and run again by another worker.
+
+Results are files under `JOBS_DIR/results`, kept `ttl` seconds. Submissions
+are deduplicated on a hash of the kind, the normalized parameters and the
+signature of the source data files: an identical job that is still running,
+or whose result is still fresh, is returned instead of starting a new one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import math
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Literal, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field
+
+from .events import format_event
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, EXPIRED = "queued", "running", "succeeded", "failed", "expired"
+FINAL_STATUSES = (SUCCEEDED, FAILED, EXPIRED)
+
+MAX_SCAN_CELLS = 250_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    param_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    summary TEXT,
+    error TEXT,
+    result_path TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    expires REAL,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_param_hash ON jobs (param_hash);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+# =====================================================================
+# Types de jobs (exécutés dans les processus du pool)
+# =====================================================================
+
+@dataclass
+class JobKind:
+    name: str
+    params: Type[BaseModel]
+    run: Callable[[Dict[str, Any], "JobContext"], Dict[str, Any]]
+    check: Optional[Callable[[BaseModel], None]] = None
+
+
+KINDS: Dict[str, JobKind] = {}
+
+
+def job_kind(name: str, params: Type[BaseModel], check: Optional[Callable[[BaseModel], None]] = None):
+    """Registers `run(params, ctx) -> summary` as the job kind `name`."""
+    def register(run):
+        KINDS[name] = JobKind(name, params, run, check)
+        return run
+    return register
+
+
+_progress_queue = None  # multiprocessing queue, set in each pool process
+
+
+def _init_worker(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+class JobContext:
+    """Handed to a running job: progress reporting and its result file."""
+
+    def __init__(self, job_id: str, results_dir: Path):
+        self.job_id = job_id
+        self.results_dir = results_dir
+        self.result_path: Optional[Path] = None
+        self._last = (-1.0, 0.0)
+
+    def progress(self, fraction: float, message: str = "") -> None:
+        """Reports progress (0..1); throttled to 1% steps or every 0.5 s."""
+        now = time.monotonic()
+        last_fraction, last_time = self._last
+        if fraction < 1.0 and fraction - last_fraction < 0.01 and now - last_time < 0.5:
+            return
+        self._last = (fraction, now)
+        if _progress_queue is not None:
+            _progress_queue.put((self.job_id, round(min(max(fraction, 0.0), 1.0), 4), message))
+
+    def result_file(self, suffix: str) -> Path:
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.result_path = self.results_dir / f"{self.job_id}{suffix}"
+        return self.result_path
+
+
+def _execute(kind: str, params: Dict[str, Any], job_id: str, results_dir: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Pool entry point."""
+    ctx = JobContext(job_id, Path(results_dir))
+    ctx.progress(0.0, "started")
+    summary = KINDS[kind].run(params, ctx)
+    ctx.progress(1.0, "done")
+    return summary, str(ctx.result_path) if ctx.result_path else None
+
+
+_worker_service = None
+
+
+class JobUnavailable(RuntimeError):
+    """The resources a job kind needs are not available in this deployment."""
+
+
+def _service():
+    """ATM network and predictor of the pool process, loaded once per process."""
+    global _worker_service
+    if _worker_service is None:
+        from .services import ATMService
+
+        service = ATMService()
+        service.feed = None
+        asyncio.run(service.reload_data())
+        # Même chargement que l'étape de démarrage "models" (segments partagés, bundle)
+        service.load_models()
+        _worker_service = service
+    return _worker_service
+
+
+def _require_fitted(predictor) -> None:
+    if not predictor.is_fitted:
+        raise JobUnavailable("Modèles de prédiction non entraînés: scan indisponible sur ce déploiement")
+
+
+class ScanParams(BaseModel):
+    """Grille de candidats sur une emprise, classés par score ajusté de la cannibalisation."""
+    bbox: Tuple[float, float, float, float] = Field(..., description="min_lon, min_lat, max_lon, max_lat")
+    step_km: float = Field(1.0, gt=0.05, le=50)
+    top: int = Field(20, ge=1, le=1000)
+
+
+def _scan_grid(params: ScanParams) -> Tuple[List[float], List[float]]:
+    min_lon, min_lat, max_lon, max_lat = params.bbox
+    step_lat = params.step_km / 111.0
+    step_lon = params.step_km / (111.0 * max(math.cos(math.radians((min_lat + max_lat) / 2)), 0.01))
+    lats = [min_lat + i * step_lat for i in range(int((max_lat - min_lat) / step_lat) + 1)]
+    lons = [min_lon + i * step_lon for i in range(int((max_lon - min_lon) / step_lon) + 1)]
+    return lats, lons
+
+
+def _check_scan(params: ScanParams) -> None:
+    from .services import atm_service
+
+    min_lon, min_lat, max_lon, max_lat = params.bbox
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("bbox doit être 'min_lon, min_lat, max_lon, max_lat' avec min < max")
+    lats, lons = _scan_grid(params)
+    if len(lats) * len(lons) > MAX_SCAN_CELLS:
+        raise ValueError(f"{len(lats) * len(lons)} cellules: au-delà de {MAX_SCAN_CELLS}, augmentez step_km")
+    # Les processus du pool chargent les modèles comme l'application: même verdict
+    _require_fitted(atm_service.predictor)
+
+
+@job_kind("scan", ScanParams, _check_scan)
+def run_scan(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    from .schemas import LocationData
+
+    scan = ScanParams(**params)
+    service = _service()
+    predictor, analyzer = service.predictor, service.snapshot.analyzer
+    _require_fitted(predictor)
+    lats, lons = _scan_grid(scan)
+    total = len(lats) * len(lons)
+    best: List[Tuple[float, Dict[str, Any]]] = []
+    done = 0
+    for lat in lats:
+        for lon in lons:
+            location = LocationData(latitude=lat, longitude=lon)
+            prediction = predictor.predict_location(location)
+            canibalization = analyzer.calculate_canibalization(location)
+            # Même ajustement que /predict
+            score = prediction["global_score"] * (1 - canibalization["canibalization_risk"] / 200)
+            cell = {
+                "latitude": round(lat, 6),
+                "longitude": round(lon, 6),
+                "score": round(max(0.0, score), 2),
+                "predicted_volume": prediction["predicted_volume"],
+                "canibalization_risk": canibalization["canibalization_risk"],
+            }
+            item = (cell["score"], done, cell)
+            if len(best) < scan.top:
+                heapq.heappush(best, item)
+            else:
+                heapq.heappushpop(best, item)
+            done += 1
+            ctx.progress(done / total)
+    top = [cell for _, _, cell in sorted(best, key=lambda t: (-t[0], t[1]))]
+    _tag_communes(top)
+    ctx.result_file(".json").write_bytes(dumps({"cells": total, "top": top}))
+    return {"cells": total, "best_score": top[0]["score"] if top else None}
+
+
+def _tag_communes(cells: List[Dict[str, Any]]) -> None:
+    """Adds the nearest commune (feature store, one batched lookup) to each cell."""
+    from .services import commune_features
+
+    if not cells:
+        return
+    try:
+        store = commune_features()
+    except FileNotFoundError:
+        return
+    rows, _ = store.nearest([c["latitude"] for c in cells], [c["longitude"] for c in cells])
+    for cell, row in zip(cells, rows):
+        cell["commune"] = store.labels[row]
+        cell["commune_norm"] = store.communes[row]
+
+
+class ExportParams(BaseModel):
+    """Export complet d'une couche."""
+    layer: Literal["atms", "competitors", "population", "poi"]
+    format: Literal["csv", "json"] = "csv"
+
+
+@job_kind("export", ExportParams)
+def run_export(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    import pandas as pd
+
+    from . import services
+
+    export = ExportParams(**params)
+    if export.layer == "atms":
+        df = pd.DataFrame([atm.dict() for atm in _service().existing_atms])
+    else:
+        loaders = {
+            "competitors": services._load_competitors_df,
+            "population": services._load_population_df,
+            "poi": services._load_poi_df,
+        }
+        df = loaders[export.layer]()
+    ctx.progress(0.5, "loaded")
+    path = ctx.result_file(f".{export.format}")
+    if export.format == "csv":
+        df.to_csv(path, index=False)
+    else:
+        path.write_bytes(dumps(df.to_dict("records")))
+    return {"rows": len(df), "format": export.format, "bytes": path.stat().st_size}
+
+
+def data_signature() -> str:
+    """Identity of the source data files (path, mtime, size): part of the dedup key."""
+    from . import services
+
+    files = (services.DATA_FILE, services.COMPETITORS_FILE, services.POP_FILE, services.POI_FILE)
+    parts = [f"{path.name}:{services._file_signature(path)}" for path in files]
+    return "|".join(parts)
+
+
+# =====================================================================
+# Registre et exécution (processus serveur)
+# =====================================================================
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    def __init__(
+        self,
+        directory: Path,
+        workers: int = 2,
+        ttl: float = 86400.0,
+        stale_after: float = 60.0,
+        heartbeat: float = 5.0,
+    ):
+        self.directory = Path(directory)
+        self.results_dir = self.directory / "results"
+        self.db_path = self.directory / "jobs.sqlite3"
+        self.workers = workers
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self.owner = ""
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue = None
+        self._listener: Optional[threading.Thread] = None
+        # Modifié depuis submit() (thread), la maintenance et les callbacks du pool
+        self._running: Dict[str, Future] = {}
+        self._running_lock = threading.Lock()
+        self._maintenance: Optional[asyncio.Task] = None
+        self._closing = False
+
+    # ---------- SQLite ----------
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def open(self) -> None:
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    async def start(self) -> None:
+        """Opens the registry, resumes orphaned jobs and starts the maintenance loop (startup stage)."""
+        # Calculé ici (et non à l'import): avec gunicorn --preload, chaque worker a son pid
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        await asyncio.to_thread(self.open)
+        await asyncio.to_thread(self._maintain_once)
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    def shutdown(self) -> None:
+        """Stops the pool; jobs still running are left to be resumed by another worker."""
+        self._closing = True
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._queue is not None:
+            self._queue.put(None)
+
+    # ---------- Pool ----------
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            if self._queue is None:
+                self._queue = ctx.Queue()
+                self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+                self._listener.start()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx, initializer=_init_worker, initargs=(self._queue,)
+            )
+        return self._pool
+
+    def _listen(self) -> None:
+        """Writes the progress reported by pool processes into the registry."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, fraction, message = item
+            now = time.time()
+            try:
+                with self._db() as db:
+                    db.execute(
+                        "UPDATE jobs SET status = ?, started = COALESCE(started, ?), progress = ?, message = ?,"
+                        " heartbeat = ? WHERE id = ? AND status IN (?, ?)",
+                        (RUNNING, now, fraction, message, now, job_id, QUEUED, RUNNING),
+                    )
+            except sqlite3.Error as e:
+                logger.warning("Progression du job %s non enregistrée: %s", job_id, e)
+
+    def _launch(self, job_id: str, kind: str, params: Dict[str, Any]) -> None:
+        with self._running_lock:
+            future = self._ensure_pool().submit(_execute, kind, params, job_id, str(self.results_dir))
+            self._running[job_id] = future
+        # Enregistré depuis le thread de gestion du pool: jamais de SQLite sur la boucle de l'application
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        with self._running_lock:
+            self._running.pop(job_id, None)
+        if self._closing:
+            return
+        try:
+            self._record_outcome(job_id, future)
+        except sqlite3.Error as e:
+            logger.error("Issue du job %s non enregistrée: %s", job_id, e)
+
+    def _record_outcome(self, job_id: str, future: Future) -> None:
+        now = time.time()
+        exc = None if future.cancelled() else future.exception()
+        with self._db() as db:
+            if future.cancelled() or exc is not None:
+                if isinstance(exc, BrokenProcessPool):
+                    with self._running_lock:
+                        self._pool = None  # recréé au prochain job
+                error = "annulé" if exc is None else f"{exc.__class__.__name__}: {exc}"
+                logger.warning("Job %s en échec: %s", job_id, error)
+                db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                    (FAILED, error, now, job_id),
+                )
+                return
+            summary, result_path = future.result()
+            db.execute(
+                "UPDATE jobs SET status = ?, progress = 1, summary = ?, result_path = ?, finished = ?,"
+                " expires = ?, error = NULL WHERE id = ?",
+                (SUCCEEDED, json.dumps(summary, default=str), result_path, now, now + self.ttl, job_id),
+            )
+
+    # ---------- API ----------
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Returns (job, created); an identical live or fresh job is returned instead of a new one."""
+        spec = KINDS.get(kind)
+        if spec is None:
+            raise KeyError(f"Type de job inconnu: {kind!r} (disponibles: {sorted(KINDS)})")
+        model = spec.params(**params)
+        if spec.check is not None:
+            spec.check(model)
+        normalized = json.loads(json.dumps(model.dict(), default=str))
+        key = json.dumps({"kind": kind, "params": normalized, "data": data_signature()}, sort_keys=True)
+        param_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+        now = time.time()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")  # vérification + insertion atomiques entre workers
+            for row in db.execute(
+                "SELECT * FROM jobs WHERE param_hash = ? AND (status IN (?, ?) OR (status = ? AND expires > ?))"
+                " ORDER BY created DESC",
+                (param_hash, QUEUED, RUNNING, SUCCEEDED, now),
+            ):
+                if row["status"] != SUCCEEDED or not row["result_path"] or Path(row["result_path"]).exists():
+                    return self._public(row), False
+            job_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO jobs (id, kind, params, param_hash, status, created, owner, heartbeat)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(normalized), param_hash, QUEUED, now, self.owner, now),
+            )
+        self._launch(job_id, kind, normalized)
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._public(row) if row is not None else None
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        with self._db() as db:
+            row = db.execute("SELECT result_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Path(row["result_path"]) if row is not None and row["result_path"] else None
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": row["progress"],
+            "message": row["message"],
+            "params": json.loads(row["params"]),
+            "summary": json.loads(row["summary"]) if row["summary"] else None,
+            "error": row["error"],
+            "created_at": row["created"],
+            "started_at": row["started"],
+            "finished_at": row["finished"],
+            "expires_at": row["expires"],
+            "result_url": f"/jobs/{row['id']}/result" if row["status"] == SUCCEEDED else None,
+        }
+
+    async def stream(self, job_id: str, poll: float = 0.5, keepalive: float = 15.0) -> AsyncIterator[str]:
+        """SSE frames: `progress` on every change, then `done` with the final state."""
+        yield "retry: 5000\n\n"
+        last_state, last_sent = None, time.monotonic()
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                yield format_event("error", {"detail": "Job introuvable"})
+                return
+            if job["status"] in FINAL_STATUSES:
+                yield format_event("done", job)
+                return
+            state = (job["status"], job["progress"], job["message"])
+            if state != last_state:
+                yield format_event("progress", {k: job[k] for k in ("id", "status", "progress", "message")})
+                last_state, last_sent = state, time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(poll)
+
+    # ---------- Maintenance ----------
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await asyncio.to_thread(self._maintain_once)
+            except sqlite3.Error as e:
+                logger.warning("Maintenance des jobs: %s", e)
+
+    def _maintain_once(self) -> None:
+        now = time.time()
+        host = self.owner.rsplit(":", 1)[0]
+        orphans = []
+        with self._running_lock:
+            running = list(self._running)
+        with self._db() as db:
+            if running:
+                marks = ",".join("?" * len(running))
+                db.execute(f"UPDATE jobs SET heartbeat = ? WHERE id IN ({marks})", (now, *running))
+
+            for row in db.execute(
+                "SELECT id, kind, params, owner, heartbeat FROM jobs WHERE status IN (?, ?) AND owner != ?",
+                (QUEUED, RUNNING, self.owner),
+            ).fetchall():
+                owner_host, _, owner_pid = row["owner"].rpartition(":")
+                dead = owner_host == host and owner_pid.isdigit() and not _pid_alive(int(owner_pid))
+                if not dead and row["heartbeat"] >= now - self.stale_after:
+                    continue
+                claimed = db.execute(
+                    "UPDATE jobs SET owner = ?, heartbeat = ?, status = ?, progress = 0, message = ?, started = NULL"
+                    " WHERE id = ? AND owner = ? AND heartbeat = ?",
+                    (self.owner, now, QUEUED, "repris", row["id"], row["owner"], row["heartbeat"]),
+                ).rowcount
+                if claimed:
+                    orphans.append((row["id"], row["kind"], json.loads(row["params"])))
+
+            for row in db.execute(
+                "SELECT id, result_path FROM jobs WHERE status = ? AND expires <= ?", (SUCCEEDED, now)
+            ).fetchall():
+                if row["result_path"]:
+                    Path(row["result_path"]).unlink(missing_ok=True)
+                db.execute("UPDATE jobs SET status = ? WHERE id = ?", (EXPIRED, row["id"]))
+            db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (FAILED, EXPIRED, now - self.ttl)
+            )
+
+        for job_id, kind, params in orphans:
+            if kind not in KINDS:
+                continue
+            logger.info("Job %s (%s) orphelin: repris par %s", job_id, kind, self.owner)
+            self._launch(job_id, kind, params)
@@ -1,36 +1,117 @@
 """
 Configuration for structured JSON logging.
+
+Records are handed to a queue on the calling thread and formatted/written to
+stdout by a `QueueListener` thread, so request handlers never wait on JSON
+formatting or terminal I/O. The request id travels in a context variable set
+once per request by the HTTP middleware.
 """
+import atexit
 import logging
+import os
+import queue
+import random
 import sys
-import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 from pythonjsonlogger import jsonlogger
 
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_queue: Optional[queue.SimpleQueue] = None
+_output: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+_hooks_registered = False
+
+
 class RequestIdFilter(logging.Filter):
     """
-    A logging filter that injects a unique request ID into the log record.
-    If the request ID is not set, a new one is generated.
+    Stamps each record with the id of the request being served (or "-"
+    outside a request). Runs on the calling thread, where that context lives.
     """
     def filter(self, record):
         if not hasattr(record, 'request_id'):
-            record.request_id = str(uuid.uuid4())
+            record.request_id = request_id_var.get()
         return True
 
 
-def setup_logging():
-    """Sets up structured JSON logging."""
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction `rate` of the records logged with `extra={"sampleable": True}`
+    (routine success logs). Every other record, including all warnings and
+    errors, always passes.
+    """
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampleable', False) or record.levelno >= logging.WARNING:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records with only the message merged; the JSON formatting
+    (and any traceback rendering) happens on the listener thread.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _start_listener() -> None:
+    global _listener
+    _listener = QueueListener(_queue, _output, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # drains what is already queued
+        _listener = None
+
+
+def _restart_in_child() -> None:
+    """Forked workers (gunicorn preload) do not inherit the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+def setup_logging(sample_rate: float = 1.0):
+    """Sets up structured JSON logging through a background queue listener."""
+    global _queue, _output, _hooks_registered
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     # Prevent duplicate logs if already configured
+    _stop_listener()
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    log_handler = logging.StreamHandler(sys.stdout)
+    _output = logging.StreamHandler(sys.stdout)
     formatter = jsonlogger.JsonFormatter(
-        '%(asctime)s %(name)s %(levelname)s %(request_id)s %(message)s'
+        '%(asctime)s %(name)s %(levelname)s %(request_id)s %(message)s',
+        # Attribut interne de SamplingFilter, pas un champ de log
+        reserved_attrs=(*jsonlogger.RESERVED_ATTRS, 'sampleable'),
     )
-    log_handler.setFormatter(formatter)
-    log_handler.addFilter(RequestIdFilter())
-    logger.addHandler(log_handler)
\ No newline at end of file
+    _output.setFormatter(formatter)
+
+    _queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RequestIdFilter())
+    logger.addHandler(queue_handler)
+    _start_listener()
+
+    if not _hooks_registered:
+        os.register_at_fork(after_in_child=_restart_in_child)
+        atexit.register(_stop_listener)
+        _hooks_registered = True
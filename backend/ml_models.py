@@ -4,30 +4,28 @@ ML Pipeline for optimal ATM placement.
 """
 
 import json
+import math
 import warnings
 from datetime import datetime
 from typing import List
-from sklearn.dummy import DummyClassifier #ajoute
-import numpy as np #ajooute 
-from sklearn.dummy import DummyClassifier, DummyRegressor  #ajoute
 
-
-import joblib
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_squared_error, classification_report
 warnings.filterwarnings('ignore')
 
+# scikit-learn, pandas and joblib are imported where they are used: the
+# serverless handlers import this module without ever training a model.
+
 # Import Pydantic schemas to enforce data contracts
 from .schemas import ATMData, LocationData
+from .timing import stage
 
 class ATMLocationPredictor:
     """Modèle de prédiction des volumes et ROI pour les emplacements ATM"""
     
     def __init__(self):
+        from sklearn.ensemble import RandomForestRegressor, GradientBoostingClassifier
+        from sklearn.preprocessing import StandardScaler
+
         self.volume_model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.roi_model = GradientBoostingClassifier(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
@@ -35,6 +33,8 @@ class ATMLocationPredictor:
         
     def generate_synthetic_data(self, n_samples=1000):
         """Génère des données synthétiques pour l'entraînement"""
+        import pandas as pd
+
         np.random.seed(42)
         
         # Features géographiques et démographiques
@@ -83,6 +83,9 @@ class ATMLocationPredictor:
     
     def train(self, data=None):
         """Entraîne les modèles ML"""
+        from sklearn.metrics import mean_squared_error
+        from sklearn.model_selection import train_test_split
+
         if data is None:
             data = self.generate_synthetic_data()
         
@@ -131,6 +134,19 @@ class ATMLocationPredictor:
         
         return performance
     
+    @property
+    def is_fitted(self) -> bool:
+        """Whether the estimators were actually fitted (`is_trained` alone may be set on a dummy predictor)."""
+        from sklearn.exceptions import NotFittedError
+        from sklearn.utils.validation import check_is_fitted
+
+        try:
+            for estimator in (self.scaler, self.volume_model, self.roi_model):
+                check_is_fitted(estimator)
+        except NotFittedError:
+            return False
+        return True
+
     def predict_location(self, location: LocationData) -> dict:
         """Prédit le potentiel d'un emplacement"""
         if not self.is_trained:
@@ -138,31 +154,36 @@ class ATMLocationPredictor:
             self.train()
         
         # Préparation des données
-        features = np.array([[
-            location.population_density,
-            location.commercial_poi_count,
-            location.competitor_atms_500m,
-            location.foot_traffic_score,
-            location.income_level,
-            location.accessibility_score,
-            location.parking_availability,
-            location.public_transport_nearby,
-            location.business_district,
-            location.residential_area
-        ]])
-        
-        features_scaled = self.scaler.transform(features)
+        with stage("features"):
+            features = np.array([[
+                location.population_density,
+                location.commercial_poi_count,
+                location.competitor_atms_500m,
+                location.foot_traffic_score,
+                location.income_level,
+                location.accessibility_score,
+                location.parking_availability,
+                location.public_transport_nearby,
+                location.business_district,
+                location.residential_area
+            ]])
+        
+        with stage("scaler"):
+            features_scaled = self.scaler.transform(features)
         
         # Prédictions
-        volume_pred = self.volume_model.predict(features_scaled)[0]
-        roi_prob = self.roi_model.predict_proba(features_scaled)[0][1]
-        roi_pred = self.roi_model.predict(features_scaled)[0]
+        with stage("volume_model"):
+            volume_pred = self.volume_model.predict(features_scaled)[0]
+        with stage("roi_model"):
+            roi_prob = self.roi_model.predict_proba(features_scaled)[0][1]
+            roi_pred = self.roi_model.predict(features_scaled)[0]
         
         # Calcul du score global (0-100)
         global_score = min(100, max(0, (volume_pred / 50 + roi_prob * 100) / 2))
         
         # Reason codes (explicabilité)
-        reason_codes = self._generate_reason_codes(location, volume_pred, roi_prob)
+        with stage("reason_codes"):
+            reason_codes = self._generate_reason_codes(location, volume_pred, roi_prob)
         
         return {
             'predicted_volume': float(volume_pred),
@@ -211,7 +232,9 @@ class ATMLocationPredictor:
         """Sauvegarde les modèles entraînés"""
         if not self.is_trained:
             raise ValueError("Modèles non entraînés")
-        
+
+        import joblib
+
         joblib.dump(self.volume_model, f'{path_prefix}_volume.pkl')
         joblib.dump(self.roi_model, f'{path_prefix}_roi.pkl')
         joblib.dump(self.scaler, f'{path_prefix}_scaler.pkl')
@@ -230,6 +253,10 @@ class CanibalizationAnalyzer:
     
     def calculate_canibalization(self, new_location: LocationData) -> dict:
         """Calcule l'impact de cannibalisation d'un nouvel ATM"""
+        with stage("canibalization"):
+            return self._calculate_canibalization(new_location)
+
+    def _calculate_canibalization(self, new_location: LocationData) -> dict:
         if not self.existing_atms:
             return {'canibalization_risk': 0, 'affected_atms': []}
         
@@ -241,7 +268,7 @@ class CanibalizationAnalyzer:
         
         for atm in self.existing_atms:
             # Calcul de la distance (approximation)
-            distance = np.sqrt(
+            distance = math.sqrt(
                 (new_lat - atm.latitude)**2 +
                 (new_lon - atm.longitude)**2
             ) * 111  # Conversion en km approximative
@@ -0,0 +1,192 @@
+"""
+On-demand profiling of individual requests.
+
+Enabled with `PROFILING_ENABLED=true` and a `PROFILING_TOKEN`; a request
+carrying `X-Profile: <token>` is then profiled on its own, and the result is
+stored under `PROFILE_DIR` (the oldest files are pruned beyond
+`PROFILE_MAX_FILES`):
+
+- `X-Profile-Mode: sample` (default): a stdlib stack sampler reads the
+  event-loop thread's frames every `PROFILE_SAMPLE_INTERVAL_MS` and writes
+  collapsed stacks (`.folded`), ready for flamegraph.pl or speedscope;
+- `X-Profile-Mode: cprofile`: deterministic cProfile, written as `.pstats`.
+
+Both observe the event-loop thread, so other requests interleaved on the
+same worker during the profiled one show up too; profile on a quiet worker
+for clean results. Work offloaded to thread pools is not sampled. A cProfile
+run is exclusive per process: the profiler hooks the whole thread, so a
+second one started meanwhile would clobber the first; it raises
+`ProfilerBusy` instead.
+
+When profiling is disabled the middleware is not installed at all.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import json
+import marshal
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+MODES = ("sample", "cprofile")
+DEFAULT_INTERVAL_MS = 1.0
+
+_cprofile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """A cProfile run is already active in this process."""
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval_ms: float = DEFAULT_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format: `frame;frame;frame count` per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profile:
+    """Outcome of one profiled request."""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.duration_ms = 0.0
+        self.content = b""
+        self.samples: Optional[int] = None
+
+    @property
+    def suffix(self) -> str:
+        return ".folded" if self.mode == "sample" else ".pstats"
+
+
+@contextmanager
+def profile(mode: str = "sample", interval_ms: float = DEFAULT_INTERVAL_MS) -> Iterator[Profile]:
+    """Profiles the current thread for the duration of the block."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+    result = Profile(mode)
+    start = time.perf_counter()
+    if mode == "sample":
+        sampler = StackSampler(threading.get_ident(), interval_ms)
+        sampler.start()
+        try:
+            yield result
+        finally:
+            sampler.stop()
+            result.content = sampler.collapsed().encode("utf-8")
+            result.samples = sampler.samples
+            result.duration_ms = (time.perf_counter() - start) * 1000
+    else:
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusy("A cProfile run is already active in this process")
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield result
+            finally:
+                profiler.disable()
+                result.duration_ms = (time.perf_counter() - start) * 1000
+                profiler.create_stats()
+                result.content = marshal.dumps(profiler.stats)  # the format pstats.Stats loads
+        finally:
+            _cprofile_lock.release()
+
+
+def authorized(header_value: Optional[str], token: str) -> bool:
+    return bool(token) and header_value is not None and hmac.compare_digest(header_value, token)
+
+
+class ProfileStore:
+    """Bounded directory of profiles, each with a JSON metadata sidecar."""
+
+    def __init__(self, directory: Path, max_files: int = 50):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, result: Profile, method: str, path: str, query: str, status: int) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}-{method}-{slug}{result.suffix}"
+        (self.directory / name).write_bytes(result.content)
+        meta = {
+            "name": name,
+            "mode": result.mode,
+            "method": method,
+            "path": path,
+            "query": query,
+            "status": status,
+            "duration_ms": round(result.duration_ms, 2),
+            "samples": result.samples,
+            "created": time.time(),
+        }
+        (self.directory / f"{name}.json").write_text(json.dumps(meta), encoding="utf-8")
+        self._prune()
+        return name
+
+    def _prune(self) -> None:
+        profiles = sorted(self._profile_files(), key=lambda p: p.stat().st_mtime)
+        for old in profiles[: max(0, len(profiles) - self.max_files)]:
+            old.unlink(missing_ok=True)
+            old.with_name(f"{old.name}.json").unlink(missing_ok=True)
+
+    def _profile_files(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return [p for p in self.directory.iterdir() if p.suffix in (".folded", ".pstats")]
+
+    def list(self) -> List[Dict[str, Any]]:
+        entries = []
+        for path in self._profile_files():
+            try:
+                meta = json.loads(path.with_name(f"{path.name}.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                meta = {"name": path.name}
+            meta["size_bytes"] = path.stat().st_size
+            entries.append(meta)
+        return sorted(entries, key=lambda m: m.get("created", 0), reverse=True)
+
+    def path_of(self, name: str) -> Path:
+        """Resolves a stored profile by name; FileNotFoundError for anything else."""
+        path = self.directory / name
+        if Path(name).name != name or path.suffix not in (".folded", ".pstats") or not path.is_file():
+            raise FileNotFoundError(f"Profile introuvable: {name}")
+        return path
@@ -3,8 +3,8 @@
 # Saham Bank Geomarketing AI - Server Runner
 # This script provides commands to run the FastAPI server in different environments.
 
-# Ensure we are in the script's directory
-cd "$(dirname "$0")"
+# Run from the repository root so the backend package (relative imports) resolves
+cd "$(dirname "$0")/.."
 
 MODE=${1:-dev} # Default to 'dev' mode if no argument is provided
 
@@ -13,7 +13,7 @@ if [ "$MODE" = "dev" ]; then
     # Runs a single Uvicorn process with --reload enabled.
     # This is ideal for development as it automatically restarts on code changes.
     echo "🚀 Starting server in DEVELOPMENT mode on http://127.0.0.1:8000"
-    uvicorn api_server:app --host 127.0.0.1 --port 8000 --reload
+    uvicorn backend.api_server:app --host 127.0.0.1 --port 8000 --reload
 
 elif [ "$MODE" = "prod" ]; then
     # --- Production Mode ---
@@ -21,10 +21,24 @@ elif [ "$MODE" = "prod" ]; then
     # This is a robust setup for production.
     # -w 4: Spawns 4 worker processes. A good starting point is (2 * number of CPU cores) + 1.
     # -k uvicorn.workers.UvicornWorker: Specifies that Uvicorn should handle the requests.
+    # Workers propagate ATM writes to each other through a local change feed.
+    export CHANGE_FEED_FILE=${CHANGE_FEED_FILE:-/tmp/saham-geomarketing/atm_changes.log}
+    # Every worker starts from data.json, so earlier feed entries are no longer needed.
+    mkdir -p "$(dirname "$CHANGE_FEED_FILE")"
+    : > "$CHANGE_FEED_FILE"
     echo "🏭 Starting server in PRODUCTION mode on http://0.0.0.0:8000"
-    gunicorn -w 4 -k uvicorn.workers.UvicornWorker api_server:app --bind 0.0.0.0:8000
+    gunicorn -w 4 -k uvicorn.workers.UvicornWorker backend.api_server:app --bind 0.0.0.0:8000
+
+elif [ "$MODE" = "preload" ]; then
+    # --- Production Mode, shared memory ---
+    # The master loads datasets and models once into memory-mapped segments
+    # before forking; workers attach to them copy-on-write (see backend/gunicorn.conf.py).
+    # Refresh a segment: python -m backend.shared_segments refresh <name>
+    # then reload the workers: kill -HUP $(cat /tmp/saham-geomarketing.pid)
+    echo "🏭 Starting server in PRELOAD mode on http://0.0.0.0:8000"
+    gunicorn -c backend/gunicorn.conf.py backend.api_server:app
 
 else
-    echo "❌ Invalid mode: '$MODE'. Use 'dev' or 'prod'."
+    echo "❌ Invalid mode: '$MODE'. Use 'dev', 'prod' or 'preload'."
     exit 1
 fi
\ No newline at end of file
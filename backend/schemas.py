@@ -65,12 +65,24 @@ class PredictionResponse(BaseModel):
     reason_codes: List[str] = Field(..., description="Codes explaining the factors influencing the prediction.")
     recommendation: str = Field(..., description="A final recommendation (e.g., 'RECOMMANDÉ').")
     canibalization_analysis: Dict[str, Any] = Field(..., description="Analysis of the potential impact on nearby ATMs.")
+    commune: Optional[Dict[str, Any]] = Field(None, description="Indicators of the nearest commune (feature store).")
+    density: Optional[Dict[str, float]] = Field(None, description="Density (per km²) of each layer at the location, from the medium rasters.")
 
 
 class ATMListResponse(BaseModel):
     """Response model for a list of ATMs."""
     atms: List[ATMData]
     total_count: int
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, if any.")
+    version: Optional[int] = Field(None, description="Network change version, usable as `since` for delta sync.")
+
+
+class ATMDeltaResponse(BaseModel):
+    """Changes to the ATM network since a given version."""
+    version: int = Field(..., description="Current network change version.")
+    full_snapshot: bool = Field(..., description="True when `upserts` is the whole network (history truncated).")
+    upserts: List[ATMData] = Field(default_factory=list, description="ATMs added or changed.")
+    removed: List[str] = Field(default_factory=list, description="Ids of removed ATMs.")
 
 
 class DashboardSummary(BaseModel):
@@ -170,4 +182,126 @@ class POI(BaseModel):
 
 class POIListResponse(BaseModel):
     pois: List[POI]
-    total_count: int    
\ No newline at end of file
+    total_count: int
+
+# --- Plus proches voisins ---
+
+class NearestNeighbor(BaseModel):
+    id: str
+    layer: Literal['own', 'competitors']
+    bank_name: Optional[str] = None
+    latitude: float
+    longitude: float
+    distance_km: float = Field(..., description="Distance haversine en km")
+    nb_atm: Optional[int] = None
+
+
+class NearestResponse(BaseModel):
+    latitude: float
+    longitude: float
+    neighbors: List[NearestNeighbor]
+
+
+class GeoPoint(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+class NearestBatchRequest(BaseModel):
+    points: List[GeoPoint] = Field(..., min_length=1, max_length=1000)
+    k: int = Field(5, ge=1, le=100)
+    layer: Literal['own', 'competitors', 'all'] = 'all'
+
+
+class NearestBatchResponse(BaseModel):
+    results: List[NearestResponse]
+
+
+# --- Jobs asynchrones ---
+
+class JobRequest(BaseModel):
+    kind: str = Field(..., description="Type de job: 'scan' ou 'export'")
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: Literal['queued', 'running', 'succeeded', 'failed', 'expired']
+    progress: float = Field(0.0, ge=0, le=1)
+    message: Optional[str] = None
+    params: Dict[str, Any]
+    summary: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    result_url: Optional[str] = None
+    deduplicated: bool = False
+
+
+# --- Parts de marché (modèle de Huff) ---
+
+class SiteCapture(BaseModel):
+    id: str
+    operator: str
+    capture: float = Field(..., description="Demande captée attendue (habitants)")
+    share_percent: float = Field(..., description="Part de la demande desservie (%)")
+
+
+class MarketShareResponse(BaseModel):
+    parameters: Dict[str, float]
+    total_demand: float
+    served_demand: float = Field(..., description="Demande ayant au moins un site à portée")
+    own_share: float
+    shares_by_operator: Dict[str, float]
+    atms: List[SiteCapture]
+
+
+class MarketShareCandidateRequest(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    monthly_volume: Optional[float] = Field(None, gt=0, description="Volume attendu; par défaut un ATM médian du réseau")
+
+
+class AffectedATM(BaseModel):
+    id: str
+    capture_lost: float
+    capture_lost_percent: float
+
+
+class MarketShareCandidateResponse(BaseModel):
+    attractiveness: float
+    capture: float
+    reachable_demand: float
+    own_cannibalization: float
+    net_gain: float
+    cannibalization_ratio: float
+    taken_from_competitors: Dict[str, float]
+    affected_atms: List[AffectedATM]
+
+
+# --- Indicateurs communaux ---
+
+class CommuneFeatures(BaseModel):
+    commune_norm: str
+    commune: str
+    latitude: float
+    longitude: float
+    distance_km: Optional[float] = Field(None, description="Distance au centroïde (recherche par coordonnées)")
+    features: Dict[str, float]
+
+
+class CommuneFeaturesBatchRequest(BaseModel):
+    """Soit des points (commune la plus proche), soit des noms de communes."""
+    points: Optional[List[GeoPoint]] = Field(None, max_length=5000)
+    communes: Optional[List[str]] = Field(None, max_length=5000)
+    features: Optional[List[str]] = Field(None, description="Sous-ensemble d'indicateurs; tous par défaut")
+
+
+class CommuneFeaturesBatchResponse(BaseModel):
+    features: List[str]
+    communes: List[str]
+    distances_km: Optional[List[float]] = None
+    values: List[List[float]] = Field(..., description="Une ligne par entrée, dans l'ordre de `features`")
@@ -6,27 +6,43 @@ Handles data persistence, model interactions, and business logic.
 from __future__ import annotations
 
 import asyncio
+import fcntl
 import json
 import logging
-from functools import lru_cache
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
 
 import aiofiles
-import pandas as pd
+import numpy as np
 from pydantic import ValidationError, parse_obj_as
 
-<<<<<<< HEAD
+from .bundle import Bundle, load_bundle
+from .change_feed import ChangeFeed
+from .changelog import REMOVE, UPSERT, ChangeLog
+from .config import settings
+from .events import EventBroadcaster
+from .geo import SpatialIndex
+from .density import RESOLUTIONS_KM, DensityRaster
+from .feature_store import CommuneFeatureStore
+from .huff import HuffModel, HuffParams, Sites
+from .indexes import MAX_LIMIT, ATMIndex, Cursor, decode_cursor, encode_cursor, filters_digest, parse_bbox
+from .metrics import DATASET_LOAD, DATASET_ROWS, DATASET_VERSION, cache_collectors
 from .ml_models import ATMLocationPredictor, CanibalizationAnalyzer
-from .schemas import ATMData, CompetitorData, CompetitorListResponse
-from .schemas import PopulationPoint, PopulationListResponse
-=======
->>>>>>> cc602676c326901616ad1a6a127f59c8016cd484
-
-
-from ml_models import ATMLocationPredictor, CanibalizationAnalyzer
-from schemas import (
+from .shared_segments import attach_frame, attach_models, models_available
+from .serialization import dumps
+from .single_flight import VERSIONS, single_flight
+from .snapshot import NetworkSnapshot
+from .timing import stage
+from .schemas import (
     ATMData,
+    ATMDeltaResponse,
+    ATMListResponse,
+    NearestNeighbor,
+    NearestResponse,
     CompetitorData,
     CompetitorListResponse,
     PopulationPoint,
@@ -35,11 +51,21 @@ from schemas import (
     POIListResponse,
 )
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas (and scikit-learn, through the predictor) are imported on first use so
+# that handlers which never parse a CSV or run a model start quickly.
+
 logger = logging.getLogger(__name__)
 
 # ---------- Chemins ----------
-DATA_DIR = Path(__file__).parent / "data"
-DATA_FILE = Path(__file__).parent / "data.json"
+if settings.DATA_DIR:
+    DATA_DIR = Path(settings.DATA_DIR)
+    DATA_FILE = DATA_DIR / "data.json"
+else:
+    DATA_DIR = Path(__file__).parent / "data"
+    DATA_FILE = Path(__file__).parent / "data.json"
 COMPETITORS_FILE = DATA_DIR / "nb_atm_normalise_with_coords.csv"
 POP_FILE = DATA_DIR / "master_indicateurs_normalise.csv"
 POI_FILE = DATA_DIR / "poi_maroc.csv"
@@ -66,7 +92,7 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "Attijariwafa Bank",
-        "installation_type": "fixed",
+        "installation_type": "agency",
         "branch_location": "Agence Maarif",
         "services": ["retrait", "depot", "consultation", "virement"],
     },
@@ -80,7 +106,7 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "Banque Populaire",
-        "installation_type": "fixed",
+        "installation_type": "agency",
         "branch_location": "Agence Anfa",
         "services": ["retrait", "depot", "consultation"],
     },
@@ -94,7 +120,7 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "BMCE Bank",
-        "installation_type": "fixed",
+        "installation_type": "agency",
         "branch_location": "Centre Financier",
         "services": ["retrait", "depot", "consultation", "virement", "change"],
     },
@@ -108,7 +134,7 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "Crédit du Maroc",
-        "installation_type": "portable",
+        "installation_type": "mobile",
         "branch_location": "Centre Commercial Gauthier",
         "services": ["retrait", "consultation"],
     },
@@ -122,7 +148,7 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "CIH Bank",
-        "installation_type": "fixed",
+        "installation_type": "agency",
         "branch_location": "Corniche Ain Diab",
         "services": ["retrait", "depot", "consultation"],
     },
@@ -136,13 +162,45 @@ DETAILED_ATMS = [
         "city": "Casablanca",
         "region": "Casablanca-Settat",
         "bank_name": "BMCI",
-        "installation_type": "fixed",
+        "installation_type": "agency",
         "branch_location": "Twin Center",
         "services": ["retrait", "depot", "consultation", "virement"],
     },
 ]
 
 
+def _upsert_data_record(record: Dict[str, Any], path: Path = DATA_FILE) -> None:
+    """
+    Read-modify-write of one record of `data.json`. Workers each write from
+    their own snapshot, so rewriting a whole snapshot would drop the ATMs
+    another worker added meanwhile: the file is re-read under an exclusive
+    lock, and replaced atomically (temporary file + rename) so that a
+    concurrent reload never reads a half-written file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            records: List[Dict[str, Any]] = []
+            if path.exists():
+                content = path.read_text(encoding="utf-8")
+                records = json.loads(content) if content.strip() else []
+            records = [r for r in records if (r.get("id") or r.get("idatm")) != record["id"]]
+            records.append(record)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps(records, ensure_ascii=False, indent=2, default=str))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
 # =====================================================================
 # ATM service
 # =====================================================================
@@ -151,10 +209,51 @@ class ATMService:
     """Manages ATM data and related ML models."""
 
     def __init__(self):
-        self.predictor = ATMLocationPredictor()
-        self.canibalization_analyzer = CanibalizationAnalyzer()
-        self.existing_atms: List[ATMData] = []
-        self.lock = asyncio.Lock()
+        self._predictor: Optional[ATMLocationPredictor] = None
+        self.changes = ChangeLog()
+        self.events = EventBroadcaster()
+        self._snapshot = NetworkSnapshot.build((), self.changes.version)
+        # Cross-worker propagation of writes (multi-worker deployments only).
+        self.feed: Optional[ChangeFeed] = (
+            ChangeFeed(Path(settings.CHANGE_FEED_FILE)) if settings.CHANGE_FEED_FILE else None
+        )
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._huff: Optional[_HuffState] = None
+        self._huff_lock = threading.Lock()
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """
+        Serializes writers only; readers never take it. Created on the running
+        loop, and recreated if the service is later driven by another loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    @property
+    def snapshot(self) -> NetworkSnapshot:
+        """Current network version. Grab it once per request for a consistent view."""
+        return self._snapshot
+
+    @property
+    def existing_atms(self) -> Tuple[ATMData, ...]:
+        return self._snapshot.atms
+
+    @property
+    def index(self) -> ATMIndex:
+        return self._snapshot.index
+
+    @property
+    def canibalization_analyzer(self) -> CanibalizationAnalyzer:
+        return self._snapshot.analyzer
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        return self._snapshot.spatial_index
 
     async def _load_and_merge_atms(self) -> List[ATMData]:
         raw_atms: List[ATMData] = []
@@ -193,75 +292,437 @@ class ATMService:
         return list(combined_atms.values())
 
     async def initialize(self):
+        """Loads the ATM store; the models are loaded on first use of `predictor`."""
+        await self.load_atm_store()
+
+    @property
+    def predictor(self) -> ATMLocationPredictor:
+        """The ML predictor, loaded on first use (imports scikit-learn)."""
+        if self._predictor is None:
+            self.load_models()
+        return self._predictor
+
+    @property
+    def models_loaded(self) -> bool:
+        return self._predictor is not None and self._predictor.is_trained
+
+    @staticmethod
+    def artifacts() -> dict:
+        """
+        What is on disk for `load_models` and cold starts, checked without
+        loading the models (no scikit-learn import).
+        """
+        bundle = load_bundle()
+        if models_available():
+            models = "shared_segments"
+        elif bundle is not None and bundle.has_models:
+            models = "bundle"
+        else:
+            models = None
+        return {"model_artifacts": models, "bundle": bundle is not None}
+
+    def load_models(self):
+        predictor = ATMLocationPredictor()
+        if attach_models(predictor):
+            logger.info("ML models attached from shared segments.")
+            self._predictor = predictor
+            return
+        bundle = load_bundle()
+        if bundle is not None and bundle.attach_models(predictor):
+            logger.info("ML models attached from the build-time bundle.")
+            self._predictor = predictor
+            return
         logger.info("Training ML models (temporarily disabled)...")
         try:
-            # self.predictor.train()
-            self.predictor.is_trained = True
+            # predictor.train()
+            predictor.is_trained = True
             logger.info("Skipping model training, using dummy predictor.")
         except Exception as e:
             logger.error(f"Error initializing predictor: {e}", exc_info=True)
+        self._predictor = predictor
 
+    async def load_atm_store(self):
         logger.info("Loading ATM data...")
+        if self.feed is not None:
+            # Before loading: a change written meanwhile is replayed, never missed.
+            self.feed.mark_position()
         await self.reload_data()
 
+    def attach_bundle(self, bundle: Bundle) -> None:
+        """
+        Publishes the network baked into a build-time bundle, skipping the
+        read and validation of `data.json` on cold serverless starts.
+        """
+        if self.feed is not None:
+            self.feed.mark_position()
+        self.changes.reset()
+        self._set_snapshot(NetworkSnapshot.build(bundle.atms(), self.changes.version, bundle.aggregates))
+        logger.info("%d ATMs attached from bundle %s.", len(self._snapshot.atms), bundle.version)
+
     async def reload_data(self):
-        self.existing_atms = await self._load_and_merge_atms()
-        self.canibalization_analyzer = CanibalizationAnalyzer()
-        for atm in self.existing_atms:
-            self.canibalization_analyzer.add_existing_atm(atm)
-        logger.info("%d ATMs loaded and analyzer updated.", len(self.existing_atms))
-
-<<<<<<< HEAD
-    async def _persist_data(self):
+        async with self.lock:
+            with DATASET_LOAD.time("atms"):
+                atms = await self._load_and_merge_atms()
+            upserts, removed, counts = self._record_reload_changes(self._snapshot.index, ATMIndex(atms))
+            snapshot = NetworkSnapshot.build(atms, self.changes.version)
+            self._set_snapshot(snapshot)
+
+        if any(counts.values()):
+            for event, atm in upserts:
+                self.events.publish(event, atm.dict(), snapshot.version)
+            for atm_id in removed:
+                self.events.publish("atm_removed", {"id": atm_id}, snapshot.version)
+            self.events.publish(
+                "dataset_version", {"dataset": "atms", "version": snapshot.version, **counts}, snapshot.version
+            )
+            self.events.publish("dashboard_updated", self.network_aggregates(snapshot), snapshot.version)
+        logger.info("%d ATMs loaded and analyzer updated.", len(snapshot.atms))
+
+    def _set_snapshot(self, snapshot: NetworkSnapshot) -> None:
+        self._snapshot = snapshot
+        DATASET_VERSION.set(snapshot.version, "atms")
+        DATASET_ROWS.set(len(snapshot.atms), "atms")
+
+    def _record_reload_changes(
+        self, previous: ATMIndex, current: ATMIndex
+    ) -> Tuple[List[Tuple[str, ATMData]], List[str], dict]:
+        """(event name, ATM) per upsert, removed ids and counts of the reload diff."""
+        counts = {"added": 0, "changed": 0, "removed": 0}
+        upserts: List[Tuple[str, ATMData]] = []
+        removed: List[str] = []
+        if not len(previous):
+            self.changes.reset()
+            return upserts, removed, counts
+        for atm in current.query().atms:
+            old = previous.get(atm.id)
+            if old is None or old != atm:
+                self.changes.record(UPSERT, atm.id)
+                counts["added" if old is None else "changed"] += 1
+                upserts.append(("atm_added" if old is None else "atm_changed", atm))
+        for atm in previous.query().atms:
+            if atm.id not in current:
+                self.changes.record(REMOVE, atm.id)
+                removed.append(atm.id)
+        counts["removed"] = len(removed)
+        return upserts, removed, counts
+
+    def network_aggregates(self, snapshot: Optional[NetworkSnapshot] = None) -> dict:
+        """Compact network totals pushed to clients when the dashboard changes."""
+        snapshot = snapshot or self._snapshot
+        aggregates = {k: v for k, v in snapshot.aggregates.items() if k != "regional_analysis"}
+        return {"version": snapshot.version, **aggregates}
+
+    async def _persist_atm(self, atm: ATMData):
         """
-        Persist the current ATM dataset to disk.
+        Persist one new ATM to disk.
         In the Vercel serverless environment this is ephemeral, but it keeps
         local development behavior consistent.
         """
         try:
-            async with aiofiles.open(DATA_FILE, "w", encoding="utf-8") as f:
-                payload = [atm.dict() for atm in self.existing_atms]
-                await f.write(json.dumps(payload, ensure_ascii=False, indent=2))
+            await asyncio.to_thread(_upsert_data_record, atm.dict())
         except Exception as exc:
             logger.error("Failed to persist ATM data: %s", exc, exc_info=True)
 
     async def add_new_atm(self, atm: ATMData) -> ATMData:
         """
-        Register a new ATM in memory and update auxiliary structures.
+        Register a new ATM by publishing a copy-on-write snapshot that includes it.
         """
         async with self.lock:
-            if any(existing.id == atm.id for existing in self.existing_atms):
+            if atm.id in self._snapshot.index:
                 raise ValueError(f"An ATM with id '{atm.id}' already exists.")
 
-            self.existing_atms.append(atm)
-            self.canibalization_analyzer.add_existing_atm(atm)
+            version = self.changes.record(UPSERT, atm.id)
+            snapshot = self._snapshot.with_atm(atm, version)
+            self._set_snapshot(snapshot)
 
-            await self._persist_data()
+            await self._persist_atm(atm)
+            if self.feed is not None:
+                await asyncio.to_thread(self.feed.append, UPSERT, atm.dict())
+
+        self.events.publish("atm_added", atm.dict(), version)
+        self.events.publish("dashboard_updated", self.network_aggregates(snapshot), version)
 
         return atm
 
+    async def apply_remote_change(self, change: dict) -> None:
+        """Applies a change written to the feed by another worker."""
+        if change.get("op") != UPSERT:
+            logger.warning("Change feed: unsupported operation %r", change.get("op"))
+            return
+        atm = ATMData(**change["record"])
+        async with self.lock:
+            current = self._snapshot
+            existing = current.index.get(atm.id)
+            if existing == atm:
+                return
+            version = self.changes.record(UPSERT, atm.id)
+            if existing is None:
+                snapshot = current.with_atm(atm, version)
+            else:
+                snapshot = NetworkSnapshot.build(
+                    [atm if a.id == atm.id else a for a in current.atms], version
+                )
+            self._set_snapshot(snapshot)
+
+        self.events.publish("atm_added" if existing is None else "atm_changed", atm.dict(), version)
+        self.events.publish("dashboard_updated", self.network_aggregates(snapshot), version)
+
+    async def follow_change_feed(self) -> None:
+        """Background task: keeps this worker in sync with writes made by the others."""
+        if self.feed is None:
+            return
+        await self.feed.follow(self.apply_remote_change, self.reload_data)
+
+    def query_atms(
+        self,
+        *,
+        region: Optional[str] = None,
+        city: Optional[str] = None,
+        bank_name: Optional[str] = None,
+        status: Optional[str] = None,
+        installation_type: Optional[str] = None,
+        bbox: Optional[str] = None,
+        min_volume: Optional[float] = None,
+        max_volume: Optional[float] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ATMListResponse:
+        """
+        Filters, sorts and paginates the network through the secondary indexes.
+        Raises ValueError on malformed bbox, sort, limit or cursor values.
+        """
+        snapshot = self._snapshot
+        atms, total, next_cursor = self._query_page(
+            snapshot,
+            region=region,
+            city=city,
+            bank_name=bank_name,
+            status=status,
+            installation_type=installation_type,
+            bbox=bbox,
+            min_volume=min_volume,
+            max_volume=max_volume,
+            sort=sort,
+            limit=limit,
+            cursor=cursor,
+        )
+        return ATMListResponse(
+            atms=atms, total_count=total, next_cursor=next_cursor, version=snapshot.version
+        )
+
+    def query_atms_payload(self, **filters) -> dict:
+        """
+        Same result as `query_atms` (same keyword arguments), built from the
+        snapshot's cached records and ready for `serialization.dumps`.
+        """
+        snapshot = self._snapshot
+        atms, total, next_cursor = self._query_page(snapshot, **filters)
+        records = snapshot.records
+        return {
+            "atms": [records[atm.id] for atm in atms],
+            "total_count": total,
+            "next_cursor": next_cursor,
+            "version": snapshot.version,
+        }
+
+    @staticmethod
+    def _query_page(
+        snapshot: NetworkSnapshot,
+        *,
+        bbox: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        **filters,
+    ) -> Tuple[List[ATMData], int, Optional[str]]:
+        if limit is not None and not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+        sort = filters.pop("sort", None) or ""
+        box = parse_bbox(bbox)
+        digest = filters_digest(bbox=box, **filters)
+        position = decode_cursor(cursor)
+        if position is not None and (position.sort != sort or position.filters != digest):
+            raise ValueError("cursor was issued for a different sort or filters")
+        after = None if position is None else (position.key, position.atm_id)
+        atms, total, more = snapshot.index.query(bbox=box, sort=sort or None, after=after, limit=limit, **filters)
+        next_cursor = None
+        if limit is not None and more:
+            key, atm_id = snapshot.index.position(atms[-1].id, sort or None)
+            next_cursor = encode_cursor(Cursor(snapshot.version, sort, digest, key, atm_id))
+        return atms, total, next_cursor
+
+    def atms_since(self, version: int, **filters) -> ATMDeltaResponse:
+        """
+        Records added, changed or removed after `version`, or the full network
+        (`full_snapshot=True`) when the change log no longer covers it or the
+        version was issued by another process.
+
+        A delta covers the whole network: raises ValueError when any
+        `query_atms` filter is also given.
+        """
+        given = sorted(name for name, value in filters.items() if value is not None)
+        if given:
+            raise ValueError(f"'since' cannot be combined with {', '.join(given)}")
+        snapshot = self._snapshot
+        current = snapshot.version
+        latest = self.changes.since(version, until=current)
+        if latest is None:
+            atms = snapshot.index.query().atms
+            return ATMDeltaResponse(version=current, full_snapshot=True, upserts=atms, removed=[])
+
+        upserts: List[ATMData] = []
+        removed: List[str] = []
+        for atm_id, op in latest.items():
+            atm = snapshot.index.get(atm_id)
+            if op == REMOVE or atm is None:
+                removed.append(atm_id)
+            else:
+                upserts.append(atm)
+        return ATMDeltaResponse(version=current, full_snapshot=False, upserts=upserts, removed=removed)
+
+    def nearest(self, points: List[Tuple[float, float]], k: int = 5, layer: str = "all") -> List[NearestResponse]:
+        """
+        k nearest own and/or competitor ATMs for each (latitude, longitude)
+        point, with haversine distances in km.
+        """
+        if layer not in ("own", "competitors", "all"):
+            raise ValueError("layer must be one of 'own', 'competitors', 'all'")
+        lats = [p[0] for p in points]
+        lons = [p[1] for p in points]
+
+        per_point: List[List[NearestNeighbor]] = [[] for _ in points]
+        if layer in ("own", "all"):
+            own = self._snapshot.spatial_index
+            distances, indices = own.query(lats, lons, k)
+            for row, (dists, idxs) in enumerate(zip(distances, indices)):
+                for d, i in zip(dists, idxs):
+                    atm = own.payloads[i]
+                    per_point[row].append(NearestNeighbor(
+                        id=atm.id,
+                        layer="own",
+                        bank_name=atm.bank_name,
+                        latitude=atm.latitude,
+                        longitude=atm.longitude,
+                        distance_km=round(float(d), 3),
+                    ))
+        if layer in ("competitors", "all"):
+            competitors = _competitor_spatial_index()
+            distances, indices = competitors.query(lats, lons, k)
+            for row, (dists, idxs) in enumerate(zip(distances, indices)):
+                for d, i in zip(dists, idxs):
+                    cmp = competitors.payloads[i]
+                    per_point[row].append(NearestNeighbor(
+                        id=cmp.id,
+                        layer="competitors",
+                        bank_name=cmp.bank_name,
+                        latitude=cmp.latitude,
+                        longitude=cmp.longitude,
+                        distance_km=round(float(d), 3),
+                        nb_atm=cmp.nb_atm,
+                    ))
+
+        return [
+            NearestResponse(
+                latitude=lat,
+                longitude=lon,
+                neighbors=sorted(neighbors, key=lambda n: n.distance_km)[:k],
+            )
+            for lat, lon, neighbors in zip(lats, lons, per_point)
+        ]
+
+    def huff_model(self) -> HuffModel:
+        """
+        Market-share model of the current network (see backend/huff.py).
+        Rebuilt when the competitor or population layer changes; when ATMs
+        were only appended since it was built, they are added site by site
+        against the reference volume pinned at the last build, unless the
+        network median has drifted from it by more than HUFF_REFERENCE_DRIFT.
+        """
+        return self._huff_state().model
+
+    def _huff_state(self) -> _HuffState:
+        """The model with the reference volume it was built with, read together under the lock."""
+        snapshot = self._snapshot
+        datasets = VERSIONS.snapshot(HUFF_DATASETS)
+        with self._huff_lock:
+            state = self._huff
+            if state is not None and state.datasets == datasets:
+                if state.atms is snapshot.atms:
+                    return state
+                appended = _appended(state.atms, snapshot.atms)
+                if (
+                    appended is not None
+                    and len(appended) <= HUFF_INCREMENTAL_MAX
+                    and abs(_reference_volume(snapshot.atms) / state.reference - 1) <= HUFF_REFERENCE_DRIFT
+                ):
+                    model = state.model
+                    for atm in appended:
+                        if atm.status == "active":
+                            model = model.with_site(atm.id, OWN_OPERATOR, atm.latitude,
+                                                    atm.longitude, _own_attractiveness(atm, state.reference))
+                    self._huff = state._replace(atms=snapshot.atms, model=model)
+                    return self._huff
+
+            with stage("huff_build"):
+                demand, demand_index = _huff_demand()
+                competitors = _huff_competitor_sites()
+                own, reference = _own_sites(snapshot.atms)
+                model = HuffModel.build(demand, demand_index, own.extend(competitors), HUFF_PARAMS)
+            self._huff = _HuffState(snapshot.atms, datasets, reference, model)
+            return self._huff
+
+    def huff_candidate(self, latitude: float, longitude: float, monthly_volume: Optional[float] = None) -> dict:
+        """Capture of a candidate ATM and what it takes from our network and the competitors."""
+        state = self._huff_state()
+        attractiveness = monthly_volume / state.reference if monthly_volume else 1.0
+        with stage("huff"):
+            return {"attractiveness": round(attractiveness, 4), **state.model.evaluate(latitude, longitude, attractiveness)}
+
     async def simulate_external_updates(self):
         """
         Placeholder used by the former background task to refresh cached data.
         """
+        refresh_changed_datasets()
         await self.reload_data()
 
-    # ... (the rest of the class remains the same)
 
 atm_service = ATMService()
 
-=======
 
-atm_service = ATMService()
+def _load_layer(name: str, parse) -> pd.DataFrame:
+    """Attached or freshly parsed layer, with its load time and version recorded."""
+    start = time.perf_counter()
+    df = _attached_layer(name)
+    if df is None:
+        _source_signatures[name] = _file_signature(_DATASET_FILES[name])
+        df = parse()
+    DATASET_LOAD.observe(time.perf_counter() - start, name)
+    DATASET_VERSION.set(df.attrs.get("segment_version") or int(time.time() * 1000), name)
+    DATASET_ROWS.set(len(df), name)
+    return df
+
+
+def _attached_layer(name: str) -> Optional[pd.DataFrame]:
+    """Layer from the shared segments or the build-time bundle, if available."""
+    shared = attach_frame(name)
+    if shared is not None:
+        return shared
+    bundle = load_bundle()
+    return bundle.frame(name) if bundle is not None else None
 
 
 # =====================================================================
 # Compétiteurs
 # =====================================================================
 
->>>>>>> cc602676c326901616ad1a6a127f59c8016cd484
-@lru_cache(maxsize=1)
+@single_flight(datasets=("competitors",))
 def _load_competitors_df() -> pd.DataFrame:
+    return _load_layer("competitors", _parse_competitors_csv)
+
+
+def _parse_competitors_csv() -> pd.DataFrame:
+    import pandas as pd
+
     if not COMPETITORS_FILE.exists():
         raise FileNotFoundError(f"Fichier introuvable: {COMPETITORS_FILE}")
 
@@ -296,28 +757,45 @@ def _load_competitors_df() -> pd.DataFrame:
 
 
 def get_competitors() -> CompetitorListResponse:
-    df = _load_competitors_df()
+    with stage("layer_load"):
+        df = _load_competitors_df()
 
-    items: List[CompetitorData] = []
-    for i, row in df.iterrows():
-        try:
-            items.append(
-                CompetitorData(
-                    id=f"CMP-{i+1}",
-                    bank_name=row.get("societe") or "Inconnue",
-                    latitude=float(row["latitude"]),
-                    longitude=float(row["longitude"]),
-                    commune=row.get("commune") or "",
-                    commune_norm=row.get("commune_norm") or "",
-                    nb_atm=int(row.get("nb_atm") or 1),
+    with stage("layer_build"):
+        items: List[CompetitorData] = []
+        for i, row in df.iterrows():
+            try:
+                items.append(
+                    CompetitorData(
+                        id=f"CMP-{i+1}",
+                        bank_name=row.get("societe") or "Inconnue",
+                        latitude=float(row["latitude"]),
+                        longitude=float(row["longitude"]),
+                        commune=row.get("commune") or "",
+                        commune_norm=row.get("commune_norm") or "",
+                        nb_atm=int(row.get("nb_atm") or 1),
+                    )
                 )
-            )
-        except (ValueError, TypeError, ValidationError) as e:
-            logger.error("Ligne ignorée (%s): %s", e.__class__.__name__, e)
+            except (ValueError, TypeError, ValidationError) as e:
+                logger.error("Ligne ignorée (%s): %s", e.__class__.__name__, e)
 
     return CompetitorListResponse(competitors=items, total_count=len(items))
 
 
+def load_competitor_layer() -> None:
+    """Warms the competitor frame and its spatial index (startup stage)."""
+    _competitor_spatial_index()
+
+
+@single_flight(datasets=("competitors",))
+def _competitor_spatial_index() -> SpatialIndex:
+    competitors = get_competitors().competitors
+    return SpatialIndex(
+        [c.latitude for c in competitors],
+        [c.longitude for c in competitors],
+        competitors,
+    )
+
+
 # =====================================================================
 # Population
 # =====================================================================
@@ -331,8 +809,14 @@ def _detect_sep(sample: str) -> str:
         return ","
 
 
-@lru_cache(maxsize=1)
+@single_flight(datasets=("population",))
 def _load_population_df() -> pd.DataFrame:
+    return _load_layer("population", _parse_population_csv)
+
+
+def _parse_population_csv() -> pd.DataFrame:
+    import pandas as pd
+
     if not POP_FILE.exists():
         raise FileNotFoundError(f"Fichier introuvable: {POP_FILE}")
 
@@ -402,25 +886,29 @@ def _load_population_df() -> pd.DataFrame:
 
 
 def get_population() -> PopulationListResponse:
-    df = _load_population_df()
+    import pandas as pd
 
-    population_points: list[PopulationPoint] = []
-    for i, row in df.iterrows():
-        try:
-            population_points.append(
-                PopulationPoint(
-                    id=f"POP-{i+1}",
-                    commune=row.get("commune") or "",
-                    commune_norm=row["commune_norm"],
-                    latitude=float(row["latitude"]),
-                    longitude=float(row["longitude"]),
-                    densite_norm=float(row["densite_norm"]),
-                    densite=(float(row["densite"]) if pd.notna(row.get("densite")) else None),
+    with stage("layer_load"):
+        df = _load_population_df()
+
+    with stage("layer_build"):
+        population_points: list[PopulationPoint] = []
+        for i, row in df.iterrows():
+            try:
+                population_points.append(
+                    PopulationPoint(
+                        id=f"POP-{i+1}",
+                        commune=row.get("commune") or "",
+                        commune_norm=row["commune_norm"],
+                        latitude=float(row["latitude"]),
+                        longitude=float(row["longitude"]),
+                        densite_norm=float(row["densite_norm"]),
+                        densite=(float(row["densite"]) if pd.notna(row.get("densite")) else None),
+                    )
                 )
-            )
-        except Exception as e:
-            logger.error("Ligne ignorée (Population): %s", e)
-            continue
+            except Exception as e:
+                logger.error("Ligne ignorée (Population): %s", e)
+                continue
 
     return PopulationListResponse(population=population_points, total_count=len(population_points))
 
@@ -429,8 +917,14 @@ def get_population() -> PopulationListResponse:
 # POI (avec mapping robuste)
 # =====================================================================
 
-@lru_cache(maxsize=1)
+@single_flight(datasets=("poi",))
 def _load_poi_df() -> pd.DataFrame:
+    return _load_layer("poi", _parse_poi_csv)
+
+
+def _parse_poi_csv() -> pd.DataFrame:
+    import pandas as pd
+
     if not POI_FILE.exists():
         raise FileNotFoundError(f"Fichier introuvable: {POI_FILE}")
 
@@ -524,52 +1018,331 @@ def _load_poi_df() -> pd.DataFrame:
     return df
 
 def get_pois() -> POIListResponse:
-    df = _load_poi_df()
-    items = []
-    for i, r in df.iterrows():
-        tags = None
-        if "tags_json" in df.columns and pd.notna(r.get("tags_json")):
-            try:
-                tags = json.loads(r["tags_json"])
-            except Exception:
-                tags = None
-
-        items.append(POI(
-            id=f"POI-{i+1}",
-            latitude=float(r["latitude"]),
-            longitude=float(r["longitude"]),
-            type=(r.get("type") or None),
-            key=(r.get("key") or None),
-            value=(r.get("value") or None),
-            name=(r.get("name") or None),
-            brand=(r.get("brand") or None),
-            operator=(r.get("operator") or None),
-            address=(r.get("address") or None),
-            commune=(r.get("commune") or None),
-            province=(r.get("province") or None),
-            region=(r.get("region") or None),
-            code=(r.get("code") or None),
-            tags=tags,
-        ))
+    import pandas as pd
+
+    with stage("layer_load"):
+        df = _load_poi_df()
+
+    with stage("layer_build"):
+        def text(value):
+            # Cellules vides: NaN selon la version de pandas, même après astype(str)
+            return value if isinstance(value, str) and value and value != "nan" else None
+
+        items = []
+        for i, r in df.iterrows():
+            tags = None
+            if "tags_json" in df.columns and pd.notna(r.get("tags_json")):
+                try:
+                    tags = json.loads(r["tags_json"])
+                except Exception:
+                    tags = None
+
+            items.append(POI(
+                id=f"POI-{i+1}",
+                latitude=float(r["latitude"]),
+                longitude=float(r["longitude"]),
+                type=text(r.get("type")),
+                key=text(r.get("key")),
+                value=text(r.get("value")),
+                name=text(r.get("name")),
+                brand=text(r.get("brand")),
+                operator=text(r.get("operator")),
+                address=text(r.get("address")),
+                commune=text(r.get("commune")),
+                province=text(r.get("province")),
+                region=text(r.get("region")),
+                code=text(r.get("code")),
+                tags=tags,
+            ))
     return POIListResponse(pois=items, total_count=len(items))
 
 # =====================================================================
-# Utilitaire
+# Réponses encodées
+# =====================================================================
+
+_LAYER_BUILDERS = {
+    "competitors": get_competitors,
+    "population": get_population,
+    "poi": get_pois,
+}
+
+
+@single_flight(datasets=lambda name: (name,))
+def encoded_layer(name: str) -> bytes:
+    """
+    JSON body of a static layer endpoint, validated and encoded once per
+    dataset version (see `invalidate_datasets`) instead of on every request.
+    From the event loop, use `await encoded_layer.aget(name)`.
+    """
+    response = _LAYER_BUILDERS[name]()
+    with stage("serialize"):
+        return dumps(response)
+
+
+# =====================================================================
+# Modèle de Huff (parts de marché)
 # =====================================================================
 
-def clear_data_caches():
+HUFF_PARAMS = HuffParams()
+HUFF_DATASETS = ("competitors", "population")
+# Au-delà, un rechargement complet coûte moins que des ajouts un par un
+HUFF_INCREMENTAL_MAX = 32
+# Écart relatif toléré entre la médiane courante et la référence figée au build
+HUFF_REFERENCE_DRIFT = 0.05
+OWN_OPERATOR = "Saham Bank"
+
+
+class _HuffState(NamedTuple):
+    atms: Tuple[ATMData, ...]
+    datasets: Tuple[Tuple[str, int], ...]
+    reference: float  # volume mensuel d'un ATM "type": médiane du réseau, figée au build
+    model: HuffModel
+
+
+def _appended(old: Tuple[ATMData, ...], new: Tuple[ATMData, ...]) -> Optional[Tuple[ATMData, ...]]:
+    """ATMs appended to `old` to get `new`, or None if `new` is not an extension of it."""
+    if len(new) < len(old) or new[:len(old)] != old:
+        return None
+    return new[len(old):]
+
+
+def _own_attractiveness(atm: ATMData, reference: float) -> float:
+    return (atm.monthly_volume or reference) / reference
+
+
+def _reference_volume(atms: Tuple[ATMData, ...]) -> float:
+    """Median monthly volume of the active ATMs: the volume of one "typical ATM"."""
+    volumes = [atm.monthly_volume for atm in atms if atm.status == "active" and atm.monthly_volume]
+    return float(np.median(volumes)) if volumes else 1.0
+
+
+def _own_sites(atms: Tuple[ATMData, ...], reference: Optional[float] = None) -> Tuple[Sites, float]:
+    """
+    Active ATMs of the network, weighted by their volume relative to
+    `reference` (the median one by default).
+    """
+    active = [atm for atm in atms if atm.status == "active"]
+    if reference is None:
+        reference = _reference_volume(atms)
+    return Sites(
+        ids=tuple(atm.id for atm in active),
+        # Tout le réseau compte pour nous: bank_name des ATMs détaillés n'est pas l'opérateur du site
+        operators=(OWN_OPERATOR,) * len(active),
+        latitudes=np.array([atm.latitude for atm in active], dtype=float),
+        longitudes=np.array([atm.longitude for atm in active], dtype=float),
+        attractiveness=np.array([_own_attractiveness(atm, reference) for atm in active], dtype=float),
+        own=np.ones(len(active), dtype=bool),
+    ), reference
+
+
+@single_flight(datasets=("competitors",))
+def _huff_competitor_sites() -> Sites:
+    """Competitor rows, each weighing its number of ATMs."""
+    df = _load_competitors_df()
+    return Sites(
+        ids=tuple(f"CMP-{i+1}" for i in df.index),  # mêmes identifiants que /competitors
+        operators=tuple(df["societe"].fillna("Inconnue")),
+        latitudes=df["latitude"].to_numpy(dtype=float),
+        longitudes=df["longitude"].to_numpy(dtype=float),
+        attractiveness=df["nb_atm"].clip(lower=1).to_numpy(dtype=float),
+        own=np.zeros(len(df), dtype=bool),
+    )
+
+
+def _population_counts(df: "pd.DataFrame") -> np.ndarray:
+    """
+    Inhabitants of each commune, estimated from `densite_norm` where missing.
+
+    Despite its name, `densite` is a head count, not hab/km²: over the 1,523
+    communes of the master file it sums to 32.9M, the 2014 census population,
+    and `densite_norm` is that count over its maximum.
+    """
+    import pandas as pd
+
+    norm = df["densite_norm"].to_numpy(dtype=float)
+    if "densite" not in df.columns:
+        return np.clip(norm, 0, None)
+    population = pd.to_numeric(df["densite"], errors="coerce").to_numpy(dtype=float)
+    known = np.isfinite(population) & (norm > 0)
+    scale = float(np.median(population[known] / norm[known])) if known.any() else 1.0
+    return np.clip(np.where(np.isfinite(population), population, norm * scale), 0, None)
+
+
+@single_flight(datasets=("population",))
+def _huff_demand() -> Tuple[np.ndarray, SpatialIndex]:
+    """Demand of each commune centroid (its inhabitants) and a ball tree over the centroids."""
+    df = _load_population_df()
+    index = SpatialIndex(df["latitude"].to_numpy(dtype=float), df["longitude"].to_numpy(dtype=float), range(len(df)))
+    return _population_counts(df), index
+
+
+# =====================================================================
+# Rasters de densité
+# =====================================================================
+
+# Couche -> largeur de bande (km): les concurrents et la population sont des
+# centroïdes de communes, plus espacés que les POI
+DENSITY_BANDWIDTH_KM = {"poi": 2.0, "competitors": 8.0, "population": 12.0}
+
+
+def _density_points(layer: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(latitudes, longitudes, weights) of a density layer."""
+    if layer == "poi":
+        df = _load_poi_df()
+        weights = np.ones(len(df))
+    elif layer == "competitors":
+        df = _load_competitors_df()
+        weights = df["nb_atm"].clip(lower=1).to_numpy(dtype=float)
+    elif layer == "population":
+        df = _load_population_df()
+        weights = _population_counts(df)
+    else:
+        raise KeyError(f"Couche de densité inconnue: {layer!r} (disponibles: {sorted(DENSITY_BANDWIDTH_KM)})")
+    return df["latitude"].to_numpy(dtype=float), df["longitude"].to_numpy(dtype=float), weights
+
+
+@single_flight(datasets=lambda layer, resolution: (layer,))
+def density_raster(layer: str, resolution: str) -> DensityRaster:
+    """
+    Density raster of a layer at one of `RESOLUTIONS_KM`, computed once per
+    dataset version. From the event loop, use `await density_raster.aget(...)`.
+    """
+    if resolution not in RESOLUTIONS_KM:
+        raise KeyError(f"Résolution inconnue: {resolution!r} (disponibles: {list(RESOLUTIONS_KM)})")
+    latitudes, longitudes, weights = _density_points(layer)
+    with stage("density"):
+        raster = DensityRaster.compute(
+            layer, resolution, latitudes, longitudes, weights, DENSITY_BANDWIDTH_KM[layer]
+        )
+        raster.prepare()  # PNG et ETag encodés ici (thread de chargement), pas dans la boucle
+    return raster
+
+
+def density_features(latitudes, longitudes, resolution: str = "medium") -> dict:
+    """
+    Density (per km²) of each layer at each point, read from the cached
+    rasters; layers whose source file is missing are left out.
+    """
+    features = {}
+    for layer in DENSITY_BANDWIDTH_KM:
+        try:
+            raster = density_raster(layer, resolution)
+        except FileNotFoundError:
+            continue
+        features[f"{layer}_density"] = raster.sample(latitudes, longitudes)
+    return features
+
+
+def point_density(latitude: float, longitude: float, resolution: str = "medium") -> Optional[dict]:
+    """Density of each layer at one point, or None when no layer is available."""
+    features = density_features([latitude], [longitude], resolution)
+    return {name: float(values[0]) for name, values in features.items()} or None
+
+
+async def apoint_density(latitude: float, longitude: float, resolution: str = "medium") -> Optional[dict]:
+    """`point_density` from the event loop: cold rasters are computed in a worker thread."""
+    features = {}
+    for layer in DENSITY_BANDWIDTH_KM:
+        try:
+            raster = await density_raster.aget(layer, resolution)
+        except FileNotFoundError:
+            continue
+        features[f"{layer}_density"] = float(raster.sample([latitude], [longitude])[0])
+    return features or None
+
+
+# =====================================================================
+# Indicateurs par commune
+# =====================================================================
+
+@single_flight(datasets=("population",))
+def commune_features() -> CommuneFeatureStore:
+    """
+    Feature store of the commune indicators (see backend/feature_store.py),
+    rebuilt once per version of the population layer.
+    From the event loop, use `await commune_features.aget()`.
+    """
+    with stage("feature_store"):
+        return CommuneFeatureStore.from_frame(_load_population_df())
+
+
+def nearest_commune(latitude: float, longitude: float) -> Optional[dict]:
+    """Indicators of the commune nearest to a point, or None when the layer is unavailable."""
     try:
-        _load_population_df.cache_clear()
-    except Exception:
-        pass
+        store = commune_features()
+    except (FileNotFoundError, KeyError) as exc:
+        logger.warning("Indicateurs communaux indisponibles: %s", exc)
+        return None
+    return _nearest_record(store, latitude, longitude)
+
+
+async def anearest_commune(latitude: float, longitude: float) -> Optional[dict]:
+    """`nearest_commune` from the event loop: a cold store is built in a worker thread."""
     try:
-        _load_competitors_df.cache_clear()
-    except Exception:
-        pass
-<<<<<<< HEAD
-=======
+        store = await commune_features.aget()
+    except (FileNotFoundError, KeyError) as exc:
+        logger.warning("Indicateurs communaux indisponibles: %s", exc)
+        return None
+    return _nearest_record(store, latitude, longitude)
+
+
+def _nearest_record(store: CommuneFeatureStore, latitude: float, longitude: float) -> dict:
+    rows, distances = store.nearest([latitude], [longitude])
+    return store.record(int(rows[0]), distances[0])
+
+
+cache_collectors({
+    "competitors_df": _load_competitors_df,
+    "population_df": _load_population_df,
+    "poi_df": _load_poi_df,
+    "competitor_spatial_index": _competitor_spatial_index,
+    "encoded_layer": encoded_layer,
+    "huff_demand": _huff_demand,
+    "huff_competitor_sites": _huff_competitor_sites,
+    "density_raster": density_raster,
+    "commune_features": commune_features,
+})
+
+
+DATASETS = ("competitors", "population", "poi")
+
+
+def invalidate_datasets(*names: str) -> dict:
+    """
+    Bumps the version of the given datasets (all of them when none are
+    given): the frames, spatial index and encoded responses built from an
+    older version are reloaded on their next access. Publishes one
+    `dataset_version` event per bumped dataset and returns the new versions.
+    """
+    unknown = set(names) - set(DATASETS)
+    if unknown:
+        raise KeyError(f"Jeux de données inconnus: {sorted(unknown)}")
+    versions = VERSIONS.bump(*(names or DATASETS))
+    for name, version in versions.items():
+        atm_service.events.publish("dataset_version", {"dataset": name, "version": version})
+    return versions
+
+
+_DATASET_FILES = {"competitors": COMPETITORS_FILE, "population": POP_FILE, "poi": POI_FILE}
+# Signature (mtime, taille) des fichiers au moment où chaque couche en a été lue
+_source_signatures: dict = {}
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
     try:
-        _load_poi_df.cache_clear()
-    except Exception:
-        pass
->>>>>>> cc602676c326901616ad1a6a127f59c8016cd484
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def refresh_changed_datasets() -> List[str]:
+    """Invalidates the layers parsed from a CSV that changed on disk since."""
+    changed = [
+        name for name, signature in list(_source_signatures.items())
+        if _file_signature(_DATASET_FILES[name]) != signature
+    ]
+    if changed:
+        logger.info("Fichiers modifiés, couches invalidées: %s", changed)
+        invalidate_datasets(*changed)
+    return changed
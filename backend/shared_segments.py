@@ -0,0 +1,276 @@
+"""
+Read-only data segments shared between gunicorn workers.
+
+In preload mode the gunicorn master (see `gunicorn.conf.py`) parses the
+layer CSVs and trains the models once, then writes them under
+`settings.SHARED_SEGMENTS_DIR`:
+
+- each dataset as one `.npy` file per column, opened by the workers with
+  `np.load(..., mmap_mode="r")`; text columns are stored as categorical
+  codes, their categories in the manifest;
+- the model artifacts with `joblib.dump`, loaded with `mmap_mode="r"` so the
+  estimator arrays are mapped rather than copied.
+
+Pages are shared through the OS page cache, so memory no longer grows with
+the number of workers.
+
+Refreshing a segment: rebuild it, then ask gunicorn to re-fork its workers,
+which attach to the new files on startup:
+
+    python -m backend.shared_segments refresh [competitors|population|poi|models]
+    kill -HUP $(cat /tmp/saham-geomarketing.pid)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+DATASETS = ("competitors", "population", "poi")
+MODELS = "models"
+
+
+def segments_dir() -> Optional[Path]:
+    """Root directory of the shared segments, or None when preload mode is off."""
+    return Path(settings.SHARED_SEGMENTS_DIR) if settings.SHARED_SEGMENTS_DIR else None
+
+
+def _segment_path(name: str) -> Path:
+    root = segments_dir()
+    if root is None:
+        raise RuntimeError("SHARED_SEGMENTS_DIR is not configured")
+    return root / name
+
+
+def _publish(name: str, build) -> Path:
+    """Builds a segment in a temporary directory, then swaps it in atomically."""
+    final = _segment_path(name)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp = final.parent / f".{name}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    manifest = build(tmp)
+    manifest.update({"name": name, "version": int(time.time() * 1000)})
+    (tmp / MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+
+    old = final.parent / f".{name}.{os.getpid()}.old"
+    if final.exists():
+        final.rename(old)
+    tmp.rename(final)
+    # Workers still mapping the old files keep them alive until they re-fork.
+    shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+# ---------- Datasets ----------
+
+def frame_columns(df: pd.DataFrame) -> Iterator[Tuple[str, np.ndarray, Optional[List[str]]]]:
+    """
+    (name, array, categories) per column. Text columns are stored as
+    categorical codes plus their categories (missing values become ""), so
+    workers map the codes instead of rebuilding one Python str per cell.
+    """
+    import pandas as pd
+
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            text = pd.Categorical(df[col].where(df[col].notna(), "").astype(str))
+            yield str(col), text.codes, [str(c) for c in text.categories]
+        else:
+            yield str(col), values, None
+
+
+def frame_from_columns(
+    data: Dict[str, np.ndarray],
+    index: List[int],
+    version: int,
+    categories: Optional[Dict[str, List[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Wraps mapped column arrays into a DataFrame without copying them: text
+    columns (listed in `categories`) become categoricals over the mapped codes.
+    """
+    import pandas as pd
+
+    categories = categories or {}
+    columns = {}
+    for col, values in data.items():
+        if col in categories:
+            dtype = pd.CategoricalDtype(pd.Index(categories[col], dtype=object))
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[col] = values
+    df = pd.DataFrame(columns, index=index, copy=False)
+    df.attrs["segment_version"] = version
+    return df
+
+
+def write_frame(name: str, df: pd.DataFrame) -> Path:
+    """Stores a DataFrame as one memory-mappable `.npy` file per column."""
+    import numpy as np
+
+    def build(tmp: Path) -> dict:
+        columns, categories = [], {}
+        for i, (col, values, labels) in enumerate(frame_columns(df)):
+            np.save(tmp / f"{i}.npy", values, allow_pickle=False)
+            columns.append(col)
+            if labels is not None:
+                categories[col] = labels
+        return {
+            "kind": "frame",
+            "columns": columns,
+            "categories": categories,
+            "index": [int(i) for i in df.index],
+            "rows": len(df),
+        }
+
+    return _publish(name, build)
+
+
+def attach_frame(name: str) -> Optional[pd.DataFrame]:
+    """
+    Maps a dataset segment written by `write_frame`, or returns None when
+    preload mode is off or the segment does not exist.
+    """
+    root = segments_dir()
+    if root is None:
+        return None
+    path = root / name
+    manifest_file = path / MANIFEST
+    if not manifest_file.exists():
+        return None
+    import numpy as np
+
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    data = {
+        col: np.load(path / f"{i}.npy", mmap_mode="r", allow_pickle=False)
+        for i, col in enumerate(manifest["columns"])
+    }
+    return frame_from_columns(data, manifest["index"], manifest["version"], manifest.get("categories"))
+
+
+# ---------- Models ----------
+
+def write_models(predictor) -> Path:
+    import joblib
+
+    def build(tmp: Path) -> dict:
+        joblib.dump(predictor.volume_model, tmp / "volume.joblib")
+        joblib.dump(predictor.roi_model, tmp / "roi.joblib")
+        joblib.dump(predictor.scaler, tmp / "scaler.joblib")
+        return {"kind": "models"}
+
+    return _publish(MODELS, build)
+
+
+def models_available() -> bool:
+    """True when model artifacts were written to the shared segments."""
+    root = segments_dir()
+    return root is not None and (root / MODELS / MANIFEST).exists()
+
+
+def attach_models(predictor) -> bool:
+    """Loads memory-mapped model artifacts into `predictor`; False if unavailable."""
+    if not models_available():
+        return False
+    root = segments_dir()
+    import joblib
+
+    path = root / MODELS
+    predictor.volume_model = joblib.load(path / "volume.joblib", mmap_mode="r")
+    predictor.roi_model = joblib.load(path / "roi.joblib", mmap_mode="r")
+    predictor.scaler = joblib.load(path / "scaler.joblib", mmap_mode="r")
+    predictor.is_trained = True
+    return True
+
+
+# ---------- Build / report ----------
+
+def build_segments(names: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Parses and writes the requested segments (all by default). Missing
+    source files or models that fail to train are skipped with a warning so
+    one absent segment does not block the others.
+    """
+    from . import services
+    from .ml_models import ATMLocationPredictor
+
+    parsers = {
+        "competitors": services._parse_competitors_csv,
+        "population": services._parse_population_csv,
+        "poi": services._parse_poi_csv,
+    }
+    built: Dict[str, str] = {}
+    for name in names or [*DATASETS, MODELS]:
+        start = time.perf_counter()
+        try:
+            if name == MODELS:
+                predictor = ATMLocationPredictor()
+                predictor.train()
+                write_models(predictor)
+            elif name in parsers:
+                write_frame(name, parsers[name]())
+            else:
+                raise ValueError(f"Unknown segment: {name!r}")
+        except (FileNotFoundError, KeyError, ValueError) as exc:
+            logger.warning("Segment '%s' skipped: %s", name, exc)
+            continue
+        built[name] = f"{(time.perf_counter() - start) * 1000:.0f}ms"
+        logger.info("Segment '%s' written in %s", name, built[name])
+    return built
+
+
+def segment_versions() -> Dict[str, int]:
+    root = segments_dir()
+    if root is None or not root.exists():
+        return {}
+    versions = {}
+    for manifest_file in root.glob(f"*/{MANIFEST}"):
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        versions[manifest["name"]] = manifest["version"]
+    return versions
+
+
+def process_memory() -> Dict[str, Optional[float]]:
+    """Resident and shared memory of the current process, in MB (Linux /proc)."""
+    rss = shared = None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            _, resident, share = (int(v) for v in f.read().split()[:3])
+        page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        rss, shared = resident * page_mb, share * page_mb
+    except (OSError, ValueError):
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "shared_mb": round(shared, 1) if shared is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if not args or args[0] != "refresh":
+        print("usage: python -m backend.shared_segments refresh [segment ...]")
+        sys.exit(2)
+    if segments_dir() is None:
+        print("SHARED_SEGMENTS_DIR is not set")
+        sys.exit(1)
+    print(json.dumps(build_segments(args[1:] or None)))
@@ -0,0 +1,165 @@
+"""
+Single-flight loading caches with versioned invalidation.
+
+`SingleFlight` replaces `functools.lru_cache` on the dataset loaders. On a
+miss, the first caller starts the load and every concurrent caller for the
+same key waits for that one load instead of parsing again; async callers
+(`await cache.aget(...)`) run it in a worker thread so the event loop keeps
+serving, while sync callers (`cache(...)`: scripts, serverless handlers,
+loaders calling each other) run it inline. Failures are not cached: the
+waiters of a failed load get its exception and the next call retries.
+
+Invalidation is explicit and versioned: each cache declares the datasets it
+is built from, and `DatasetVersions.bump(name)` makes every entry built from
+an older version of `name` stale. Stale entries are reloaded on their next
+access; a load that was in flight during the bump still answers its waiters
+but is not stored.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from functools import update_wrapper
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple, Union
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "coalesced", "maxsize", "currsize"])
+
+Versions = Tuple[Tuple[str, int], ...]
+
+
+class DatasetVersions:
+    """Monotonic version number per dataset name."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def snapshot(self, names: Iterable[str]) -> Versions:
+        return tuple((name, self._versions.get(name, 0)) for name in names)
+
+    def bump(self, *names: str) -> Dict[str, int]:
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+            return {name: self._versions[name] for name in names}
+
+
+VERSIONS = DatasetVersions()
+
+
+class _Entry:
+    __slots__ = ("value", "versions")
+
+    def __init__(self, value: Any, versions: Versions):
+        self.value = value
+        self.versions = versions
+
+
+class SingleFlight:
+    """
+    Cache of `loader(*key)` results. `datasets` names the datasets the
+    values are built from, either as a tuple or as a function of the key.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[..., Any],
+        datasets: Union[Tuple[str, ...], Callable[..., Tuple[str, ...]]] = (),
+        versions: DatasetVersions = VERSIONS,
+    ):
+        self.loader = loader
+        self.datasets = datasets
+        self.versions = versions
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._hits = self._misses = self._coalesced = 0
+        update_wrapper(self, loader)
+
+    def _dependencies(self, key: tuple) -> Tuple[str, ...]:
+        return self.datasets(*key) if callable(self.datasets) else self.datasets
+
+    def _lookup(self, key: tuple) -> Tuple[str, Any]:
+        """("hit", value), ("wait", future of a load in flight) or ("load", future to fulfil)."""
+        versions = self.versions.snapshot(self._dependencies(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                self._hits += 1
+                return "hit", entry.value
+            future = self._inflight.get(key)
+            if future is not None and future.versions == versions:
+                self._coalesced += 1
+                return "wait", future
+            self._misses += 1
+            future = Future()
+            # En cours dès sa création: plus annulable, quel que soit l'appelant qui l'attend
+            future.set_running_or_notify_cancel()
+            future.versions = versions
+            self._inflight[key] = future
+            return "load", future
+
+    def _load(self, key: tuple, future: Future) -> Any:
+        try:
+            value = self.loader(*key)
+        except BaseException as exc:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            if not future.done():
+                future.set_exception(exc)
+            raise
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if self.versions.snapshot(self._dependencies(key)) == future.versions:
+                self._entries[key] = _Entry(value, future.versions)
+        if not future.done():
+            future.set_result(value)
+        return value
+
+    def __call__(self, *key: Hashable) -> Any:
+        """Blocking lookup; loads in the calling thread on a miss."""
+        state, found = self._lookup(key)
+        if state == "hit":
+            return found
+        if state == "wait":
+            return found.result()
+        return self._load(key, found)
+
+    async def aget(self, *key: Hashable) -> Any:
+        """Lookup from the event loop; a miss loads in a worker thread."""
+        state, found = self._lookup(key)
+        if state == "hit":
+            return found
+        # Shielded: a cancelled caller must not abandon (or cancel) a load others may be waiting on
+        if state == "wait":
+            return await asyncio.shield(asyncio.wrap_future(found))
+        return await asyncio.shield(asyncio.to_thread(self._load, key, found))
+
+    def peek(self, *key: Hashable) -> bool:
+        """Whether a current value is cached for `key`."""
+        versions = self.versions.snapshot(self._dependencies(key))
+        entry = self._entries.get(key)
+        return entry is not None and entry.versions == versions
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._coalesced, None, len(self._entries))
+
+    def cache_clear(self) -> None:
+        """Drops the stored values (in-flight loads still answer their waiters)."""
+        with self._lock:
+            self._entries.clear()
+
+
+def single_flight(datasets: Union[Tuple[str, ...], Callable[..., Tuple[str, ...]]] = (), versions: DatasetVersions = VERSIONS):
+    """Decorator form of `SingleFlight`."""
+    def wrap(loader: Callable[..., Any]) -> SingleFlight:
+        return SingleFlight(loader, datasets, versions)
+    return wrap
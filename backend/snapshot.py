@@ -0,0 +1,111 @@
+"""
+Immutable views of the ATM network.
+
+`ATMService` publishes a new `NetworkSnapshot` with a single reference swap
+on every write. Readers grab the current snapshot once and work on it
+without locks: the ATM list, indexes, analyzer and aggregates they see
+always belong to the same version.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .geo import SpatialIndex
+from .indexes import ATMIndex
+from .ml_models import CanibalizationAnalyzer
+from .schemas import ATMData
+
+
+def compute_aggregates(atms: Iterable[ATMData]) -> Dict[str, Any]:
+    """Network totals and per-region breakdown used by the dashboard."""
+    total_atms = 0
+    total_volume = 0.0
+    cities = set()
+    regional: Dict[str, Dict[str, Any]] = {}
+    for atm in atms:
+        total_atms += 1
+        volume = atm.monthly_volume or 0
+        total_volume += volume
+        if atm.city:
+            cities.add(atm.city)
+        group = regional.setdefault(atm.region or "Unknown", {"count": 0, "volume": 0, "cities": set()})
+        group["count"] += 1
+        group["volume"] += volume
+        group["cities"].add(atm.city or "Unknown")
+
+    return {
+        "total_atms": total_atms,
+        "total_monthly_volume": total_volume,
+        "average_volume_per_atm": round(total_volume / total_atms, 0) if total_atms else 0,
+        "cities_covered": len(cities),
+        "regions_covered": len(regional),
+        "regional_analysis": {
+            region: {
+                "count": stats["count"],
+                "volume": stats["volume"],
+                "cities": sorted(stats["cities"]),
+                "avg_volume": stats["volume"] / stats["count"],
+            }
+            for region, stats in regional.items()
+        },
+    }
+
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    """One consistent, read-only version of the ATM network."""
+
+    atms: Tuple[ATMData, ...]
+    index: ATMIndex
+    analyzer: CanibalizationAnalyzer
+    aggregates: Dict[str, Any]
+    version: int
+
+    @classmethod
+    def build(
+        cls, atms: Iterable[ATMData], version: int, aggregates: Optional[Dict[str, Any]] = None
+    ) -> "NetworkSnapshot":
+        """`aggregates` may be passed when already computed for exactly these ATMs."""
+        atms = tuple(atms)
+        analyzer = CanibalizationAnalyzer()
+        for atm in atms:
+            analyzer.add_existing_atm(atm)
+        return cls(
+            atms=atms,
+            index=ATMIndex(atms),
+            analyzer=analyzer,
+            aggregates=aggregates if aggregates is not None else compute_aggregates(atms),
+            version=version,
+        )
+
+    def with_atm(self, atm: ATMData, version: int) -> "NetworkSnapshot":
+        """Copy-on-write: a new snapshot with `atm` appended."""
+        atms = self.atms + (atm,)
+        index = self.index.copy()
+        index.add(atm)
+        analyzer = CanibalizationAnalyzer()
+        analyzer.existing_atms = list(atms)
+        return NetworkSnapshot(
+            atms=atms,
+            index=index,
+            analyzer=analyzer,
+            aggregates=compute_aggregates(atms),
+            version=version,
+        )
+
+    @cached_property
+    def records(self) -> Dict[str, Dict[str, Any]]:
+        """Plain-dict form of each ATM by id, built once per snapshot for encoding."""
+        return {atm.id: atm.dict() for atm in self.atms}
+
+    @cached_property
+    def spatial_index(self) -> SpatialIndex:
+        """Ball tree over this snapshot's ATMs, built on first use."""
+        return SpatialIndex(
+            [atm.latitude for atm in self.atms],
+            [atm.longitude for atm in self.atms],
+            self.atms,
+        )
@@ -0,0 +1,77 @@
+"""
+Startup orchestration.
+
+Runs every loading stage concurrently (synchronous loaders are offloaded to
+worker threads), records how long each one took and whether it failed, and
+exposes readiness once all of them have completed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SLOW_STAGE_MS = 1000.0
+
+
+class StartupOrchestrator:
+    """
+    Registry of named startup stages. A failing *optional* stage (a missing
+    layer file, say) is reported but does not prevent the app from serving;
+    a failing required stage leaves it not ready.
+    """
+
+    def __init__(self, slow_stage_ms: float = SLOW_STAGE_MS):
+        self.slow_stage_ms = slow_stage_ms
+        self._stages: List[Dict[str, Any]] = []
+        self.report: List[Dict[str, Any]] = []
+        self.ready = False
+        self.total_ms: Optional[float] = None
+
+    def stage(self, name: str, func: Callable[[], Any], required: bool = True) -> None:
+        self._stages.append({"name": name, "func": func, "required": required})
+
+    async def _run_stage(self, stage: Dict[str, Any]) -> Dict[str, Any]:
+        func = stage["func"]
+        start = time.perf_counter()
+        entry = {"stage": stage["name"], "required": stage["required"], "status": "ok"}
+        try:
+            if inspect.iscoroutinefunction(func):
+                await func()
+            else:
+                await asyncio.to_thread(func)
+        except Exception as exc:
+            entry["status"] = "failed"
+            entry["error"] = f"{exc.__class__.__name__}: {exc}"
+            log = logger.error if stage["required"] else logger.warning
+            log("Startup stage '%s' failed: %s", stage["name"], exc)
+        entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        entry["slow"] = entry["duration_ms"] >= self.slow_stage_ms
+        return entry
+
+    async def run(self) -> bool:
+        """Runs all stages concurrently and returns the resulting readiness."""
+        start = time.perf_counter()
+        self.report = list(await asyncio.gather(*(self._run_stage(s) for s in self._stages)))
+        self.total_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.ready = all(e["status"] == "ok" for e in self.report if e["required"])
+
+        for entry in sorted(self.report, key=lambda e: e["duration_ms"], reverse=True):
+            log = logger.warning if entry["slow"] or entry["status"] != "ok" else logger.info
+            log(
+                "Startup stage %-14s %-6s %8.1fms%s",
+                entry["stage"],
+                entry["status"],
+                entry["duration_ms"],
+                " (slow)" if entry["slow"] else "",
+            )
+        logger.info("Startup finished in %.1fms (ready=%s)", self.total_ms, self.ready)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "total_ms": self.total_ms, "stages": self.report}
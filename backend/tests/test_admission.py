@@ -0,0 +1,149 @@
+"""
+Tests of `backend.admission.AdmissionController`.
+
+    python -m pytest backend/tests
+"""
+
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionController, Rejected
+
+
+def make_controller(capacity=1, batch_share=1.0):
+    controller = AdmissionController(capacity=capacity)
+    controller.lane("interactive", weight=3)
+    controller.lane("batch", weight=1, max_share=batch_share)
+    controller.route("GET", "/map", "interactive", limit=8, max_queue=16, budget_ms=5000)
+    controller.route("POST", "/scan", "batch", limit=8, max_queue=16, budget_ms=5000)
+    return controller, controller.policy("GET", "/map"), controller.policy("POST", "/scan")
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_lanes_are_served_in_proportion_to_their_weight():
+    controller, interactive, batch = make_controller()
+    order = []
+
+    async def request(route, name):
+        await controller.admit(route, name)
+        with controller.run(route):
+            order.append(name)
+
+    async def scenario():
+        await controller.admit(interactive, "holder")
+        holder = controller.run(interactive)
+        holder.__enter__()
+        tasks = [asyncio.create_task(request(batch, "B")) for _ in range(8)]
+        tasks += [asyncio.create_task(request(interactive, "I")) for _ in range(8)]
+        await settle()
+        assert controller.status()["lanes"]["batch"]["queued"] == 8
+        holder.__exit__(None, None, None)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order[:8] == ["B", "I", "I", "I", "B", "I", "I", "I"]
+    assert sorted(order) == ["B"] * 8 + ["I"] * 8
+
+
+def test_batch_lane_never_exceeds_its_share():
+    controller, interactive, batch = make_controller(capacity=4, batch_share=0.5)
+
+    async def scenario():
+        for _ in range(2):
+            await controller.admit(batch, "/scan")
+        waiter = asyncio.create_task(controller.admit(batch, "/scan"))
+        await settle()
+        assert not waiter.done()
+        # Les places restantes vont à l'interactif sans attente
+        assert await controller.admit(interactive, "/map") == 0.0
+        waiter.cancel()
+        await settle()
+
+    asyncio.run(scenario())
+    assert controller.status()["lanes"]["batch"] == {"weight": 1, "active": 2, "queued": 0, "max_active": 2}
+
+
+def test_full_queue_is_rejected_with_429_and_retry_after():
+    controller, interactive, _ = make_controller()
+    controller.route("GET", "/small", "interactive", limit=1, max_queue=2, budget_ms=5000)
+    small = controller.policy("GET", "/small")
+    small.service_ewma = 2.0
+
+    async def scenario():
+        await controller.admit(small, "/small")
+        waiters = [asyncio.create_task(controller.admit(small, "/small")) for _ in range(2)]
+        await settle()
+        with pytest.raises(Rejected) as info:
+            await controller.admit(small, "/small")
+        for waiter in waiters:
+            waiter.cancel()
+        await settle()
+        return info.value
+
+    rejected = asyncio.run(scenario())
+    assert (rejected.status, rejected.reason) == (429, "queue_full")
+    # (2 en file + 1 actif) / limite 1, à 2 s par requête
+    assert rejected.retry_after == 6
+    assert small.queued == 0
+
+
+def test_queue_time_budget_is_rejected_with_503():
+    controller, interactive, _ = make_controller()
+    controller.route("GET", "/fast", "interactive", limit=8, max_queue=8, budget_ms=20)
+    fast = controller.policy("GET", "/fast")
+
+    async def scenario():
+        await controller.admit(interactive, "/map")
+        with pytest.raises(Rejected) as info:
+            await controller.admit(fast, "/fast")
+        return info.value
+
+    rejected = asyncio.run(scenario())
+    assert (rejected.status, rejected.reason) == (503, "timeout")
+    assert rejected.retry_after >= 1
+    assert fast.queued == 0 and not controller.lanes["interactive"].waiters
+
+
+def test_cancelled_waiter_frees_its_place():
+    controller, interactive, batch = make_controller()
+
+    async def scenario():
+        await controller.admit(interactive, "/map")
+        waiter = asyncio.create_task(controller.admit(batch, "/scan"))
+        await settle()
+        waiter.cancel()
+        await settle()
+        controller._release(interactive, 0.01)
+        return waiter
+
+    waiter = asyncio.run(scenario())
+    assert waiter.cancelled()
+    assert controller.active == 0 and batch.queued == 0
+
+
+def test_single_predictions_are_interactive():
+    from backend.api_server import admission
+
+    assert admission.policy("POST", "/predict").lane == "interactive"
+    assert admission.policy("POST", "/analytics/market-share/candidate").lane == "interactive"
+    assert admission.policy("POST", "/nearest/batch").lane == "batch"
+    assert admission.policy("POST", "/jobs").lane == "batch"
+
+
+def test_rejection_carries_retry_after_header(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from backend import api_server
+
+    async def reject(route, label):
+        raise Rejected(429, "queue_full", 7, "Trop de requêtes en attente pour cette route")
+
+    monkeypatch.setattr(api_server.admission, "admit", reject)
+    response = TestClient(api_server.app).post("/predict", json={"latitude": 33.5, "longitude": -7.6})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
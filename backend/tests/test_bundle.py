@@ -0,0 +1,82 @@
+"""
+Tests of the build-time bundle (`backend.bundle`) and its stale fallback.
+
+    python -m pytest backend/tests
+"""
+
+import os
+
+import pytest
+
+from backend import bundle
+from backend.config import settings
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    """A bundle built against copies of two sources, so tests can edit them."""
+    root = tmp_path_factory.mktemp("bundle")
+    sources = {"notes.txt": root / "notes.txt", "extra.csv": root / "extra.csv"}
+    sources["notes.txt"].write_text("v1")
+    sources["extra.csv"].write_text("a,b\n1,2\n")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(bundle, "_sources", lambda: sources)
+        path = bundle.build_bundle(root / "service.bundle")
+    return path, sources
+
+
+@pytest.fixture
+def sources(built, monkeypatch):
+    path, sources = built
+    originals = {name: p.read_bytes() for name, p in sources.items()}
+    monkeypatch.setattr(bundle, "_sources", lambda: sources)
+    monkeypatch.setattr(settings, "BUNDLE_FILE", str(path))
+    monkeypatch.setattr(bundle, "_loaded", None)
+    monkeypatch.setattr(bundle, "_load_attempted", False)
+    yield sources
+    for name, data in originals.items():
+        sources[name].write_bytes(data)
+
+
+def test_fresh_bundle_is_loaded(built, sources):
+    loaded = bundle.load_bundle()
+    assert loaded is not None and loaded.is_fresh()
+    assert loaded.atms() and "competitors" in loaded.header["layers"]
+    assert bundle.load_bundle() is loaded
+
+
+def test_touched_source_with_same_content_is_still_fresh(built, sources):
+    st = sources["notes.txt"].stat()
+    os.utime(sources["notes.txt"], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert bundle.Bundle(built[0]).is_fresh()
+
+
+def test_modified_source_falls_back_to_live_loading(built, sources, caplog):
+    sources["notes.txt"].write_text("v2")
+    assert not bundle.Bundle(built[0]).is_fresh()
+    with caplog.at_level("WARNING", logger="backend.bundle"):
+        assert bundle.load_bundle() is None
+    assert "stale bundle" in caplog.text
+
+
+def test_removed_source_is_stale(built, sources):
+    sources["extra.csv"].unlink()
+    assert not bundle.Bundle(built[0]).is_fresh()
+
+
+def test_other_format_version_is_stale(built, sources, monkeypatch):
+    monkeypatch.setattr(bundle, "FORMAT_VERSION", bundle.FORMAT_VERSION + 1)
+    assert not bundle.Bundle(built[0]).is_fresh()
+
+
+def test_missing_or_unreadable_bundle_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(bundle, "_loaded", None)
+    monkeypatch.setattr(bundle, "_load_attempted", False)
+    monkeypatch.setattr(settings, "BUNDLE_FILE", str(tmp_path / "missing.bundle"))
+    assert bundle.load_bundle() is None
+
+    garbage = tmp_path / "garbage.bundle"
+    garbage.write_bytes(b"not a bundle at all")
+    monkeypatch.setattr(bundle, "_load_attempted", False)
+    monkeypatch.setattr(settings, "BUNDLE_FILE", str(garbage))
+    assert bundle.load_bundle() is None
@@ -0,0 +1,122 @@
+"""
+Tests of `backend.change_feed.ChangeFeed`.
+
+    python -m pytest backend/tests
+"""
+
+import asyncio
+
+from backend.change_feed import ChangeFeed
+
+
+def reader(path, **kwargs):
+    feed = ChangeFeed(path, **kwargs)
+    feed.mark_position()
+    feed.pid = -1  # autre processus que l'écrivain de ces tests
+    return feed
+
+
+def ids(changes):
+    return [c["record"]["id"] for c in changes]
+
+
+def test_reader_sees_changes_written_after_its_mark(tmp_path):
+    path = tmp_path / "feed.log"
+    writer = ChangeFeed(path)
+    writer.append("upsert", {"id": "A"})
+    follower = reader(path)
+    writer.append("upsert", {"id": "B"})
+    writer.append("upsert", {"id": "C"})
+    assert ids(follower.read_new()) == ["B", "C"]
+    assert follower.read_new() == []
+
+
+def test_own_changes_are_skipped(tmp_path):
+    path = tmp_path / "feed.log"
+    feed = ChangeFeed(path)
+    feed.mark_position()
+    feed.append("upsert", {"id": "A"})
+    assert feed.read_new() == []
+
+
+def test_feed_created_after_the_mark_is_read_from_the_start(tmp_path):
+    path = tmp_path / "feed.log"
+    follower = reader(path)
+    ChangeFeed(path).append("upsert", {"id": "A"})
+    assert ids(follower.read_new()) == ["A"]
+
+
+def test_rotation_bounds_the_file_and_loses_nothing(tmp_path):
+    path = tmp_path / "feed.log"
+    writer = ChangeFeed(path, rotate_bytes=200)
+    follower = reader(path)
+    seen = []
+    for i in range(40):
+        writer.append("upsert", {"id": f"ATM{i:02d}"})
+        if i % 7 == 0:
+            seen += ids(follower.read_new())
+    seen += ids(follower.read_new())
+    assert seen == [f"ATM{i:02d}" for i in range(40)]
+    assert path.stat().st_size < 200 + 60
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["feed.log", "feed.log.readers"]
+
+
+def test_rotation_waits_for_lagging_readers(tmp_path):
+    path = tmp_path / "feed.log"
+    writer = ChangeFeed(path, rotate_bytes=100)
+    follower = reader(path)
+    for i in range(20):
+        writer.append("upsert", {"id": f"ATM{i:02d}"})
+    # Une seule rotation tant que le lecteur n'a pas rejoint le nouveau fichier
+    assert ids(follower.read_new()) == [f"ATM{i:02d}" for i in range(20)]
+    assert path.stat().st_size > 100
+    writer.append("upsert", {"id": "ATM20"})
+    assert path.stat().st_size == 0
+    assert ids(follower.read_new()) == ["ATM20"]
+
+
+def test_dead_readers_do_not_block_rotation(tmp_path):
+    path = tmp_path / "feed.log"
+    writer = ChangeFeed(path, rotate_bytes=100)
+    writer.append("upsert", {"id": "A"})
+    reader(path)
+    (tmp_path / "feed.log.readers").joinpath("999999999-0").write_text("0")
+    writer.append("upsert", {"id": "A" * 120})
+    assert path.stat().st_size == 0
+    assert not (tmp_path / "feed.log.readers" / "999999999-0").exists()
+
+
+def test_truncation_asks_for_a_reload(tmp_path):
+    path = tmp_path / "feed.log"
+    writer = ChangeFeed(path)
+    follower = reader(path)
+    writer.append("upsert", {"id": "A"})
+    assert ids(follower.read_new()) == ["A"]
+    path.write_bytes(b"")
+    assert follower.read_new() is None
+    writer.append("upsert", {"id": "B"})
+    assert ids(follower.read_new()) == ["B"]
+
+
+def test_follow_applies_changes(tmp_path):
+    path = tmp_path / "feed.log"
+    follower = reader(path, poll_interval=0.001)
+    applied = []
+
+    async def apply(change):
+        applied.append(change["record"]["id"])
+
+    async def reset():
+        raise AssertionError("unexpected reload")
+
+    async def scenario():
+        task = asyncio.create_task(follower.follow(apply, reset))
+        await asyncio.to_thread(ChangeFeed(path).append, "upsert", {"id": "A"})
+        for _ in range(500):
+            if applied:
+                break
+            await asyncio.sleep(0.002)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert applied == ["A"]
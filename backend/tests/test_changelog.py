@@ -0,0 +1,79 @@
+"""
+Tests of `backend.changelog.ChangeLog`.
+
+    python -m pytest backend/tests
+"""
+
+from backend.changelog import EPOCH_BITS, REMOVE, UPSERT, ChangeLog
+
+
+def make_log(maxlen=10, epoch=5):
+    return ChangeLog(maxlen=maxlen, start_version=100, epoch=epoch)
+
+
+def test_since_returns_latest_op_per_id():
+    log = make_log()
+    start = log.version
+    log.record(UPSERT, "A")
+    log.record(UPSERT, "B")
+    middle = log.version
+    log.record(REMOVE, "A")
+    log.record(UPSERT, "C")
+    assert log.since(start) == {"A": REMOVE, "B": UPSERT, "C": UPSERT}
+    assert log.since(middle) == {"A": REMOVE, "C": UPSERT}
+    assert log.since(log.version) == {}
+
+
+def test_since_stops_at_until():
+    log = make_log()
+    start = log.version
+    log.record(UPSERT, "A")
+    snapshot = log.version
+    log.record(REMOVE, "A")
+    log.record(UPSERT, "B")
+    assert log.since(start, until=snapshot) == {"A": UPSERT}
+
+
+def test_versions_from_another_epoch_are_not_served():
+    log, other = make_log(epoch=5), make_log(epoch=6)
+    log.record(UPSERT, "A")
+    other.record(UPSERT, "A")
+    assert log.owns(log.version) and not log.owns(other.version)
+    assert log.since(other.version - (1 << EPOCH_BITS)) is None
+    # Même compteur, autre époque : ne doit jamais tomber dans la fenêtre
+    assert other.version >> EPOCH_BITS == log.version >> EPOCH_BITS
+    assert log.since(other.version) is None
+
+
+def test_truncated_history_needs_a_full_snapshot():
+    log = make_log(maxlen=3)
+    start = log.version
+    versions = [log.record(UPSERT, f"ATM{i}") for i in range(5)]
+    assert log.since(start) is None
+    assert log.since(versions[0]) is None
+    assert log.since(versions[1]) == {"ATM2": UPSERT, "ATM3": UPSERT, "ATM4": UPSERT}
+
+
+def test_future_version_is_rejected():
+    log = make_log()
+    log.record(UPSERT, "A")
+    assert log.since(log.version + (1 << EPOCH_BITS)) is None
+    current = log.version
+    log.record(UPSERT, "B")
+    assert log.since(log.version, until=current) is None
+
+
+def test_reset_forgets_earlier_versions():
+    log = make_log()
+    start = log.version
+    log.record(UPSERT, "A")
+    log.reset()
+    assert log.since(start) is None
+    assert log.since(log.version) == {}
+
+
+def test_versions_increase_and_stay_json_safe():
+    log = ChangeLog(epoch=(1 << EPOCH_BITS) - 1)
+    first = log.version
+    assert log.record(UPSERT, "A") > first
+    assert log.version < 2 ** 53
@@ -0,0 +1,130 @@
+"""
+Tests of `backend.density.DensityRaster` and of the densities attached to predictions.
+
+    python -m pytest backend/tests
+"""
+
+import asyncio
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from scipy.signal import convolve2d
+
+from backend import services
+from backend.density import TILE_SIZE, DensityRaster, encode_png, fft_convolve, gaussian_kernel
+
+# Emprise réduite: grille de 200 x 250 cellules de 2 km
+BOUNDS = (-9.0, 31.0, -3.6, 34.6)
+
+
+def points(n=500, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(32.0, 33.6, n), rng.uniform(-8.0, -4.6, n), rng.uniform(1, 10, n)
+
+
+def test_mass_is_conserved():
+    lats, lons, weights = points()
+    raster = DensityRaster.compute("poi", "fine", lats, lons, weights, 4.0, bounds=BOUNDS)
+    # Points loin des bords: le noyau entier reste dans la grille
+    mass = raster.values.astype(float).sum() * raster.grid.cell_km ** 2
+    assert mass == pytest.approx(weights.sum(), rel=1e-4)
+
+
+def test_points_outside_the_bounds_are_not_counted():
+    lats, lons, weights = points(100)
+    lats = np.append(lats, [30.0, 35.0, 33.0])
+    lons = np.append(lons, [-5.0, -5.0, -2.0])
+    raster = DensityRaster.compute("poi", "fine", lats, lons, 1.0, 4.0, bounds=BOUNDS)
+    assert raster.points == 100
+    assert raster.values.astype(float).sum() * raster.grid.cell_km ** 2 == pytest.approx(100, rel=1e-4)
+    assert raster.sample([30.0, 33.0], [-5.0, -2.0]).tolist() == [0.0, 0.0]
+
+
+def test_bandwidth_is_at_least_one_cell():
+    lats, lons, weights = points(10)
+    assert DensityRaster.compute("poi", "coarse", lats, lons, weights, 1.0, bounds=BOUNDS).bandwidth_km == 10.0
+
+
+@pytest.mark.parametrize("shape", [(37, 53), (64, 64), (5, 90)])
+def test_fft_convolve_matches_a_direct_same_convolution(shape):
+    grid = np.random.default_rng(2).uniform(0, 1, shape)
+    kernel = gaussian_kernel(2.5)
+    np.testing.assert_allclose(fft_convolve(grid, kernel), convolve2d(grid, kernel, mode="same"), atol=1e-10)
+
+
+def test_fft_convolve_does_not_wrap_around():
+    grid = np.zeros((40, 60))
+    grid[0, 0] = grid[-1, -1] = 1.0
+    out = fft_convolve(grid, gaussian_kernel(3.0))
+    assert out.shape == grid.shape
+    # Le noyau (rayon 9) déborde de la grille et ne revient pas par le bord opposé
+    # (seul reste le bruit d'arrondi de la FFT)
+    assert out[-10:, :10].max() < 1e-12 and out[:10, -10:].max() < 1e-12
+    assert out[0, 0] == pytest.approx(out[-1, -1])
+
+
+def decode_png(data):
+    """Grayscale 8-bit, filter 0 only: the subset `encode_png` writes."""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, pos = {}, 8
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        kind, body = data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        (crc,) = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + body) & 0xFFFFFFFF
+        chunks[kind] = body
+        pos += 12 + length
+    width, height, depth, color, *_ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, color) == (8, 0) and b"IEND" in chunks
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, width + 1)
+    assert not rows[:, 0].any()
+    return rows[:, 1:]
+
+
+def test_encode_png_round_trips():
+    pixels = np.random.default_rng(3).integers(0, 256, (17, 31), dtype=np.uint8)
+    np.testing.assert_array_equal(decode_png(encode_png(pixels)), pixels)
+    lats, lons, weights = points()
+    raster = DensityRaster.compute("poi", "fine", lats, lons, weights, 4.0, bounds=BOUNDS)
+    decoded = decode_png(raster.png)
+    np.testing.assert_array_equal(decoded, raster.quantized)
+    assert decoded.max() == 255
+
+
+def test_tiles_cover_the_grid():
+    raster = DensityRaster.compute("poi", "fine", *points(), 4.0, bounds=(-9.0, 31.0, -3.0, 36.0))
+    height, width = raster.values.shape
+    assert height > TILE_SIZE  # au moins deux lignes de tuiles
+    rows, cols = raster.tiles_shape()
+    assert (rows, cols) == (-(-height // TILE_SIZE), -(-width // TILE_SIZE))
+    assert raster.tile(0, 0).shape == (TILE_SIZE, min(TILE_SIZE, width))
+    assert raster.tile(rows - 1, cols - 1).shape == (height - (rows - 1) * TILE_SIZE, width - (cols - 1) * TILE_SIZE)
+    stitched = np.vstack([np.hstack([raster.tile(r, c) for c in range(cols)]) for r in range(rows)])
+    np.testing.assert_array_equal(stitched, raster.quantized)
+    for row, col in ((rows, 0), (0, cols), (-1, 0)):
+        with pytest.raises(KeyError):
+            raster.tile(row, col)
+
+
+@pytest.fixture
+def layers(monkeypatch):
+    def density_points(layer):
+        if layer == "poi":
+            raise FileNotFoundError("poi_maroc.csv")
+        return points(seed=len(layer))
+
+    monkeypatch.setattr(services, "_density_points", density_points)
+    services.density_raster.cache_clear()
+    yield
+    services.density_raster.cache_clear()
+
+
+def test_point_density_is_attached_without_missing_layers(layers):
+    density = services.point_density(33.0, -6.0)
+    assert set(density) == {"competitors_density", "population_density"}
+    assert density["population_density"] > 0
+    assert asyncio.run(services.apoint_density(33.0, -6.0)) == density
+    expected = services.density_raster("population", "medium").sample([33.0], [-6.0])[0]
+    assert density["population_density"] == pytest.approx(float(expected))
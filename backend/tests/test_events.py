@@ -0,0 +1,58 @@
+"""
+Tests of `backend.events.EventBroadcaster` and the dataset invalidation events.
+
+    python -m pytest backend/tests
+"""
+
+import asyncio
+import json
+import threading
+
+from backend.events import EventBroadcaster
+
+
+def parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+async def collect(broadcaster, publish, count):
+    """Frames after the preamble once `publish()` has run with a client connected."""
+    stream = broadcaster.stream()
+    assert (await stream.__anext__()).startswith("retry:")
+    pending = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    publish()
+    frames = [await asyncio.wait_for(pending, 5)]
+    for _ in range(count - 1):
+        frames.append(await asyncio.wait_for(stream.__anext__(), 5))
+    await stream.aclose()
+    return [parse(f) for f in frames]
+
+
+def test_publish_from_another_thread_reaches_the_loop():
+    broadcaster = EventBroadcaster()
+
+    def publish():
+        thread = threading.Thread(target=broadcaster.publish, args=("ping", {"n": 1}))
+        thread.start()
+        thread.join(5)
+
+    assert asyncio.run(collect(broadcaster, publish, 1)) == [("ping", {"n": 1})]
+
+
+def test_invalidate_datasets_publishes_one_event_per_dataset(monkeypatch):
+    from backend import services
+
+    broadcaster = EventBroadcaster()
+    monkeypatch.setattr(services.atm_service, "events", broadcaster)
+    result = {}
+
+    def publish():
+        result.update(services.invalidate_datasets("population", "poi"))
+
+    events = asyncio.run(collect(broadcaster, publish, 2))
+    assert events == [
+        ("dataset_version", {"dataset": "population", "version": result["population"]}),
+        ("dataset_version", {"dataset": "poi", "version": result["poi"]}),
+    ]
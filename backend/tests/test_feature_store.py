@@ -0,0 +1,91 @@
+"""
+Tests of `backend.feature_store.CommuneFeatureStore`.
+
+    python -m pytest backend/tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.feature_store import FEATURES, CommuneFeatureStore, normalize_commune
+from backend.geo import haversine_km
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(1)
+    names = ["Aïn-Chock", "Anfa", "Hay Hassani", "Salé", "Fès-Médina", "Tanger", "Agadir", "Oujda"]
+    n = len(names)
+    df = pd.DataFrame({
+        "commune": names,
+        "commune_norm": [normalize_commune(c) for c in names],
+        "latitude": rng.uniform(30.0, 35.5, n),
+        "longitude": rng.uniform(-9.5, -2.0, n),
+    })
+    for name in FEATURES:
+        df[name] = rng.uniform(0, 100, n)
+    df.loc[[1, 4, 6], "taux_jeunesse"] = np.nan
+    df["IEDU"] = df["IEDU"].astype(object)
+    df.loc[2, "IEDU"] = "n/a"  # non numérique: imputé comme manquant
+    df.loc[[0, 3], "nb_atm"] = np.nan
+    return df.drop(columns=["Indice_POI"])
+
+
+@pytest.fixture
+def store(frame):
+    return CommuneFeatureStore.from_frame(frame)
+
+
+def test_row_of_accepts_the_key_or_the_display_name(store):
+    assert store.row_of("ainchock") == 0
+    assert store.row_of("Aïn-Chock") == 0
+    assert store.row_of("  FES medina") == store.row_of("fesmedina") == 4
+    assert store.get("Salé")["commune"] == "Salé"
+    with pytest.raises(KeyError):
+        store.row_of("Marrakech")
+
+
+def test_from_frame_imputes_medians_and_zeros(frame, store):
+    assert store.imputed == {"taux_jeunesse": 3, "IEDU": 1, "nb_atm": 2, "Indice_POI": len(frame)}
+    column = store.features.index
+    known = frame["taux_jeunesse"].dropna()
+    np.testing.assert_allclose(store.matrix[[1, 4, 6], column("taux_jeunesse")], np.median(known), rtol=1e-6)
+    np.testing.assert_allclose(store.matrix[5, column("taux_jeunesse")], frame.loc[5, "taux_jeunesse"], rtol=1e-6)
+    # nb_atm: absent du recensement = aucun ATM; colonne absente: zéro faute de médiane
+    assert store.matrix[[0, 3], column("nb_atm")].tolist() == [0.0, 0.0]
+    assert not store.matrix[:, column("Indice_POI")].any()
+    assert np.isfinite(store.matrix).all()
+    assert not store.matrix.flags.writeable
+
+
+def test_nearest_distance_matches_haversine(store):
+    rng = np.random.default_rng(2)
+    lats, lons = rng.uniform(29.0, 36.0, 200), rng.uniform(-10.0, -1.0, 200)
+    rows, distances = store.nearest(lats, lons)
+    all_distances = haversine_km(lats[:, None], lons[:, None], store.latitudes[None, :], store.longitudes[None, :])
+    np.testing.assert_array_equal(rows, all_distances.argmin(axis=1))
+    np.testing.assert_allclose(distances, all_distances.min(axis=1), rtol=1e-9, atol=1e-9)
+    row, distance = store.nearest(store.latitudes[3], store.longitudes[3])
+    assert row[0] == 3 and distance[0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_batch_and_lookup_select_columns(store):
+    values = store.batch(["Tanger", "ainchock"], ["densite", "nb_atm"])
+    assert values.shape == (2, 2)
+    assert values[1].tolist() == [store.matrix[0, 0], 0.0]
+    rows, _, matrix = store.lookup(store.latitudes[:2], store.longitudes[:2], ["INIV"])
+    assert rows.tolist() == [0, 1] and matrix.shape == (2, 1)
+
+
+def test_batch_raises_on_an_unknown_commune(store):
+    with pytest.raises(KeyError, match="Marrakech"):
+        store.batch(["Anfa", "Marrakech"])
+
+
+def test_unknown_features_are_rejected(store):
+    with pytest.raises(KeyError, match="revenu"):
+        store.batch(["Anfa"], ["densite", "revenu"])
+    with pytest.raises(KeyError):
+        store.lookup([33.5], [-7.6], ["revenu"])
+    assert store.batch(["Anfa"]).shape == (1, len(FEATURES))
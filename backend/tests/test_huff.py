@@ -0,0 +1,113 @@
+"""
+Tests of `backend.huff.HuffModel` and of how the service keeps it current.
+
+    python -m pytest backend/tests
+"""
+
+import numpy as np
+import pytest
+
+from backend import services
+from backend.geo import SpatialIndex
+from backend.huff import HuffModel, HuffParams, Sites
+from backend.schemas import ATMData
+from backend.snapshot import NetworkSnapshot
+
+PARAMS = HuffParams(max_distance_km=25.0)
+
+
+def demand_points(n=300, seed=1):
+    rng = np.random.default_rng(seed)
+    lats, lons = rng.normal(33.57, 0.15, n), rng.normal(-7.59, 0.15, n)
+    return rng.uniform(100, 5000, n), SpatialIndex(lats, lons, range(n))
+
+
+def random_sites(n, seed, own):
+    rng = np.random.default_rng(seed)
+    return Sites(
+        ids=tuple(f"S{seed}-{i}" for i in range(n)),
+        operators=tuple("Saham Bank" if own else f"Bank{i % 3}" for i in range(n)),
+        latitudes=rng.normal(33.57, 0.12, n),
+        longitudes=rng.normal(-7.59, 0.12, n),
+        attractiveness=rng.uniform(0.5, 2.0, n),
+        own=np.full(n, own),
+    )
+
+
+def test_with_site_matches_a_full_build():
+    demand, index = demand_points()
+    sites = random_sites(40, seed=2, own=True).extend(random_sites(30, seed=3, own=False))
+    model = HuffModel.build(demand, index, sites, PARAMS)
+
+    added = [("NEW-1", 33.60, -7.55, 1.4), ("NEW-2", 33.52, -7.65, 0.7), ("FAR", 35.0, -5.0, 1.0)]
+    extended = sites
+    for site_id, lat, lon, attractiveness in added:
+        model = model.with_site(site_id, "Saham Bank", lat, lon, attractiveness)
+        extended = extended.append(site_id, "Saham Bank", lat, lon, attractiveness, True)
+    rebuilt = HuffModel.build(demand, index, extended, PARAMS)
+
+    assert model.sites.ids == rebuilt.sites.ids
+    np.testing.assert_allclose(model.capture, rebuilt.capture, rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(model.totals, rebuilt.totals, rtol=1e-12)
+    assert model.own_share() == pytest.approx(rebuilt.own_share(), rel=1e-9)
+    # Conservation: la demande servie est entièrement répartie
+    assert model.capture.sum() == pytest.approx(model.served_demand, rel=1e-9)
+    assert model.capture[-1] == 0.0
+
+
+def test_evaluate_predicts_with_site():
+    demand, index = demand_points()
+    model = HuffModel.build(demand, index, random_sites(25, seed=4, own=True), PARAMS)
+    what_if = model.evaluate(33.58, -7.60, 1.2)
+    after = model.with_site("C", "Saham Bank", 33.58, -7.60, 1.2)
+    assert after.capture[-1] == pytest.approx(what_if["capture"], abs=0.01)
+    lost = model.capture.sum() - after.capture[:-1].sum()
+    assert lost == pytest.approx(what_if["own_cannibalization"], abs=0.05)
+
+
+def atm(i, volume, lat=33.57, lon=-7.59):
+    return ATMData(id=f"ATM{i}", latitude=lat + i * 0.003, longitude=lon - i * 0.002, monthly_volume=volume)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    demand, index = demand_points()
+    monkeypatch.setattr(services, "_huff_demand", lambda: (demand, index))
+    monkeypatch.setattr(services, "_huff_competitor_sites", lambda: random_sites(20, seed=5, own=False))
+    service = services.ATMService()
+    service._set_snapshot(NetworkSnapshot.build([atm(i, 1000 + 10 * i) for i in range(21)], 1))
+    return service
+
+
+def test_appended_atms_keep_the_pinned_reference(service):
+    state = service._huff_state()
+    # Médiane inchangée: ajout incrémental, référence figée
+    service._set_snapshot(service.snapshot.with_atm(atm(100, 1100), 2))
+    incremental = service._huff_state()
+    assert incremental.reference == state.reference
+
+    sites, _ = services._own_sites(service.snapshot.atms, reference=state.reference)
+    rebuilt = HuffModel.build(*services._huff_demand(), sites.extend(services._huff_competitor_sites()), services.HUFF_PARAMS)
+    # Le site ajouté est en fin de modèle incrémental: comparaison par identifiant
+    assert incremental.model.sites.ids[-1] == "ATM100"
+    assert set(incremental.model.sites.ids) == set(rebuilt.sites.ids)
+    capture = dict(zip(rebuilt.sites.ids, rebuilt.capture))
+    np.testing.assert_allclose(
+        incremental.model.capture, [capture[i] for i in incremental.model.sites.ids], rtol=1e-9, atol=1e-6
+    )
+
+
+def test_median_drift_forces_a_rebuild(service):
+    state = service._huff_state()
+    snapshot = service.snapshot
+    for i in range(30):
+        snapshot = snapshot.with_atm(atm(200 + i, 5000), 3 + i)
+    service._set_snapshot(snapshot)
+    rebuilt = service._huff_state()
+    assert rebuilt.reference == services._reference_volume(snapshot.atms)
+    assert abs(rebuilt.reference / state.reference - 1) > services.HUFF_REFERENCE_DRIFT
+    fresh = HuffModel.build(
+        *services._huff_demand(), services._own_sites(snapshot.atms)[0].extend(services._huff_competitor_sites()),
+        services.HUFF_PARAMS,
+    )
+    np.testing.assert_allclose(rebuilt.model.capture, fresh.capture, rtol=1e-9, atol=1e-6)
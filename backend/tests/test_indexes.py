@@ -0,0 +1,157 @@
+"""
+Tests of `backend.indexes.ATMIndex` and its keyset cursors.
+
+    python -m pytest backend/tests
+"""
+
+import pytest
+
+from backend.indexes import (
+    ATMIndex,
+    Cursor,
+    decode_cursor,
+    encode_cursor,
+    filters_digest,
+    parse_bbox,
+)
+from backend.schemas import ATMData
+
+
+def atm(i, **fields):
+    defaults = dict(
+        id=f"ATM{i:03d}",
+        latitude=33.0 + i * 0.01,
+        longitude=-7.0 - i * 0.01,
+        monthly_volume=1000 + (i * 37) % 500,
+        city=("Casablanca", "Rabat", "Fès")[i % 3],
+        region=("Casablanca-Settat", "Rabat-Salé-Kénitra", "Fès-Meknès")[i % 3],
+        bank_name=("Saham Bank", "Attijariwafa")[i % 2],
+        status="active" if i % 4 else "maintenance",
+    )
+    defaults.update(fields)
+    return ATMData(**defaults)
+
+
+@pytest.fixture
+def index():
+    return ATMIndex(atm(i) for i in range(60))
+
+
+def brute(atms, predicate=lambda a: True):
+    return [a.id for a in atms if predicate(a)]
+
+
+def pages(index, limit, sort=None, **filters):
+    """Every page of a query, following `position` like `_query_page` does."""
+    seen, after = [], None
+    while True:
+        page = index.query(sort=sort, after=after, limit=limit, **filters)
+        seen.extend(a.id for a in page.atms)
+        if not page.more:
+            return seen
+        after = index.position(page.atms[-1].id, sort)
+
+
+def test_categorical_filters_are_case_and_space_insensitive(index):
+    all_atms = index.query().atms
+    page = index.query(city="  rabat ", bank_name="SAHAM BANK")
+    expected = brute(all_atms, lambda a: a.city == "Rabat" and a.bank_name == "Saham Bank")
+    assert [a.id for a in page.atms] == expected
+    assert page.total == len(expected)
+    assert index.query(city="Tanger").total == 0
+
+
+def test_volume_range_bounds_are_inclusive(index):
+    all_atms = index.query().atms
+    low, high = all_atms[3].monthly_volume, all_atms[7].monthly_volume
+    low, high = min(low, high), max(low, high)
+    ids = {a.id for a in index.query(min_volume=low, max_volume=high).atms}
+    assert ids == set(brute(all_atms, lambda a: low <= a.monthly_volume <= high))
+    assert all_atms[3].id in ids and all_atms[7].id in ids
+    assert index.query(min_volume=high + 10_000).total == 0
+
+
+def test_bbox_filters_on_both_axes(index):
+    box = parse_bbox("-7.30,33.10,-7.15,33.50")
+    ids = [a.id for a in index.query(bbox=box).atms]
+    assert ids == brute(
+        index.query().atms,
+        lambda a: -7.30 <= a.longitude <= -7.15 and 33.10 <= a.latitude <= 33.50,
+    )
+    assert ids  # bornes choisies pour ne pas être vides
+    with pytest.raises(ValueError):
+        parse_bbox("1,2,3")
+    with pytest.raises(ValueError):
+        parse_bbox("2,0,1,0")
+
+
+@pytest.mark.parametrize("sort", [None, "id", "-monthly_volume", "city", "-bank_name"])
+@pytest.mark.parametrize("filters", [{}, {"status": "active"}, {"city": "Fès"}])
+def test_pages_concatenate_to_the_sorted_result(index, sort, filters):
+    unpaged = [a.id for a in index.query(sort=sort, **filters).atms]
+    assert pages(index, 7, sort=sort, **filters) == unpaged
+    assert len(unpaged) == index.query(sort=sort, **filters).total
+
+
+def test_sort_orders_by_key_then_id(index):
+    ids = [a.id for a in index.query(sort="-monthly_volume").atms]
+    keys = [(index.get(i).monthly_volume, i) for i in ids]
+    assert keys == sorted(keys, reverse=True)
+    with pytest.raises(ValueError):
+        index.query(sort="latitude")
+
+
+def test_page_after_updates_neither_skips_nor_repeats(index):
+    first = index.query(sort="monthly_volume", limit=10)
+    after = index.position(first.atms[-1].id, "monthly_volume")
+    # Ajout avant la position du curseur et mise à jour d'une ligne déjà servie
+    index.add(atm(500, monthly_volume=0))
+    index.add(atm(0, monthly_volume=first.atms[0].monthly_volume))
+    rest = [a.id for a in index.query(sort="monthly_volume", after=after).atms]
+    served = [a.id for a in first.atms]
+    assert not set(served) & set(rest)
+    assert set(served) | set(rest) == {a.id for a in index.query().atms} - {"ATM500"}
+
+
+def test_copy_is_independent(index):
+    clone = index.copy()
+    clone.add(atm(999))
+    clone.remove("ATM001")
+    assert "ATM999" not in index and "ATM001" in index
+    assert index.query(sort="id").total == 60
+    assert [a.id for a in clone.query(sort="id").atms][-1] == "ATM999"
+
+
+def test_cursor_round_trip_and_rejection():
+    cursor = Cursor(42, "-city", filters_digest(city="Rabat"), "rabat", "ATM004")
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+    assert decode_cursor(None) is None
+    for bad in ("not base64!", "bnVsbA==", encode_cursor(Cursor(1, "id", "x", ["k"], "a"))):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_filters_digest_normalises_values():
+    assert filters_digest(city=" Rabat", status=None) == filters_digest(city="rabat")
+    assert filters_digest(city="Rabat") != filters_digest(city="Fès")
+    with pytest.raises(ValueError):
+        filters_digest(colour="red")
+
+
+def test_position_of_the_wrong_type_is_a_value_error(index):
+    with pytest.raises(ValueError):
+        index.query(sort="monthly_volume", after=("rabat", "ATM001"), limit=5)
+
+
+def test_service_cursor_is_tied_to_sort_and_filters():
+    from backend.services import ATMService
+    from backend.snapshot import NetworkSnapshot
+
+    snapshot = NetworkSnapshot.build([atm(i) for i in range(30)], version=7)
+    first, total, cursor = ATMService._query_page(snapshot, city="Rabat", sort="id", limit=4)
+    assert total == 10 and decode_cursor(cursor).version == 7
+    second, _, _ = ATMService._query_page(snapshot, city="rabat", sort="id", limit=4, cursor=cursor)
+    assert [a.id for a in first + second] == [a.id for a in snapshot.index.query(city="Rabat", sort="id", limit=8).atms]
+    for changed in ({"city": "Fès", "sort": "id"}, {"city": "Rabat", "sort": "-id"}):
+        with pytest.raises(ValueError):
+            ATMService._query_page(snapshot, limit=4, cursor=cursor, **changed)
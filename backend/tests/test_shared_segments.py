@@ -0,0 +1,67 @@
+"""
+Tests of the dataset segments in `backend.shared_segments`.
+
+    python -m pytest backend/tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import shared_segments
+from backend.config import settings
+
+
+def mapped(array):
+    """True when `array` is a view over a memory-mapped file."""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+@pytest.fixture
+def segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_SEGMENTS_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {
+            "commune": ["Aïn-Chock", "Rabat", None, "Rabat"],
+            "societe": ["Saham Bank", "CIH", "CIH", "BMCE"],
+            "latitude": [33.55, 34.02, 31.63, 34.01],
+            "nb_atm": [3, 1, 2, 5],
+        },
+        index=[10, 11, 12, 13],
+    )
+
+
+def test_attached_columns_are_memory_mapped(segments, frame):
+    shared_segments.write_frame("competitors", frame)
+    df = shared_segments.attach_frame("competitors")
+
+    for col in ("commune", "societe"):
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+        assert mapped(df[col].array.codes)
+    for col in ("latitude", "nb_atm"):
+        assert mapped(df[col].to_numpy())
+
+
+def test_attached_frame_round_trips(segments, frame):
+    shared_segments.write_frame("competitors", frame)
+    df = shared_segments.attach_frame("competitors")
+
+    assert list(df.index) == [10, 11, 12, 13]
+    assert list(df["commune"]) == ["Aïn-Chock", "Rabat", "", "Rabat"]
+    assert list(df["societe"].fillna("Inconnue")) == list(frame["societe"])
+    assert (df["societe"] == "CIH").tolist() == [False, True, True, False]
+    assert df["latitude"].tolist() == frame["latitude"].tolist()
+    assert df.attrs["segment_version"] > 0
+
+
+def test_attach_without_segment(segments):
+    assert shared_segments.attach_frame("population") is None
@@ -0,0 +1,174 @@
+"""
+Tests of `backend.single_flight.SingleFlight`.
+
+    python -m pytest backend/tests
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.single_flight import DatasetVersions, SingleFlight
+
+
+class GatedLoader:
+    """Loader that blocks until `release()`, counting its calls."""
+
+    def __init__(self, fail_first: bool = False):
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.fail_first = fail_first
+
+    def release(self) -> None:
+        self.gate.set()
+
+    def __call__(self, key):
+        self.calls += 1
+        self.started.set()
+        assert self.gate.wait(5), "loader never released"
+        if self.fail_first and self.calls == 1:
+            raise RuntimeError("boom")
+        return f"{key}-v{self.calls}"
+
+
+def make_cache(loader, datasets=("ds",)):
+    versions = DatasetVersions()
+    return SingleFlight(loader, datasets, versions), versions
+
+
+def test_load_then_hit():
+    loader = GatedLoader()
+    loader.release()
+    cache, _ = make_cache(loader)
+    assert cache("a") == "a-v1"
+    assert cache("a") == "a-v1"
+    assert loader.calls == 1
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_concurrent_callers_share_one_load():
+    loader = GatedLoader()
+    cache, _ = make_cache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache("a"))) for _ in range(4)]
+    threads[0].start()
+    assert loader.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.cache_info().coalesced < 3:
+        time.sleep(0.001)
+    loader.release()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["a-v1"] * 4
+    assert loader.calls == 1
+
+
+def test_cancelled_waiter_does_not_fail_the_others():
+    loader = GatedLoader()
+    cache, _ = make_cache(loader)
+
+    async def scenario():
+        leader = asyncio.create_task(cache.aget("a"))
+        while not loader.started.is_set():
+            await asyncio.sleep(0.001)
+        joiners = [asyncio.create_task(cache.aget("a")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        joiners[0].cancel()
+        await asyncio.sleep(0.01)
+        loader.release()
+        return await leader, await joiners[1], joiners[0]
+
+    leader, joiner, cancelled = asyncio.run(scenario())
+    assert leader == joiner == "a-v1"
+    assert cancelled.cancelled()
+    assert cache("a") == "a-v1"
+    assert loader.calls == 1
+
+
+def test_cancelled_leader_still_completes_the_load():
+    loader = GatedLoader()
+    cache, _ = make_cache(loader)
+
+    async def scenario():
+        leader = asyncio.create_task(cache.aget("a"))
+        while not loader.started.is_set():
+            await asyncio.sleep(0.001)
+        joiner = asyncio.create_task(cache.aget("a"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        loader.release()
+        return await joiner
+
+    assert asyncio.run(scenario()) == "a-v1"
+    assert cache.peek("a")
+
+
+def test_failure_is_not_cached():
+    loader = GatedLoader(fail_first=True)
+    cache, _ = make_cache(loader)
+    errors = []
+
+    def wait():
+        try:
+            cache("a")
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    waiter = threading.Thread(target=wait)
+    leader = threading.Thread(target=wait)
+    leader.start()
+    assert loader.started.wait(5)
+    waiter.start()
+    while cache.cache_info().coalesced < 1:
+        time.sleep(0.001)
+    loader.release()
+    leader.join(5)
+    waiter.join(5)
+    assert [str(e) for e in errors] == ["boom", "boom"]
+    assert not cache.peek("a")
+    assert cache("a") == "a-v2"
+
+
+def test_version_bump_during_load_is_not_stored():
+    loader = GatedLoader()
+    cache, versions = make_cache(loader)
+    result = []
+    leader = threading.Thread(target=lambda: result.append(cache("a")))
+    leader.start()
+    assert loader.started.wait(5)
+    versions.bump("ds")
+    loader.release()
+    leader.join(5)
+    # Les attentes du chargement en vol sont servies, mais la valeur n'est pas gardée
+    assert result == ["a-v1"]
+    assert not cache.peek("a")
+    assert cache("a") == "a-v2"
+    assert cache("a") == "a-v2"
+
+
+def test_bump_only_invalidates_dependent_keys():
+    loader = GatedLoader()
+    loader.release()
+    cache, versions = make_cache(loader, datasets=lambda key: (key,))
+    cache("a"), cache("b")
+    versions.bump("a")
+    assert not cache.peek("a")
+    assert cache.peek("b")
+
+
+@pytest.mark.parametrize("bump", [False, True])
+def test_cache_clear(bump):
+    loader = GatedLoader()
+    loader.release()
+    cache, versions = make_cache(loader)
+    cache("a")
+    if bump:
+        versions.bump("ds")
+    cache.cache_clear()
+    assert cache.cache_info().currsize == 0
+    assert cache("a") == "a-v2"
@@ -0,0 +1,63 @@
+"""
+Per-request stage timers, reported in the `Server-Timing` response header.
+
+Code on the request path wraps its stages in `stage("name")`; when no
+collection is active (scripts, background tasks) that is a single
+context-variable lookup. The HTTP layers open a collection per request with
+`collect()` and render it with `ServerTiming.header()`, which browser
+devtools and the load tests read as a per-stage latency breakdown.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+_current: ContextVar[Optional["ServerTiming"]] = ContextVar("server_timing", default=None)
+
+
+class ServerTiming:
+    """Durations (ms) of the stages of one request; repeated stages add up."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def header(self) -> str:
+        total = (time.perf_counter() - self.start) * 1000
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        entries.append(f"total;dur={total:.2f}")
+        return ", ".join(entries)
+
+
+def current() -> Optional[ServerTiming]:
+    return _current.get()
+
+
+@contextmanager
+def collect() -> Iterator[ServerTiming]:
+    """Collects the stages timed in this context (and in tasks/threads spawned from it)."""
+    timing = ServerTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, (time.perf_counter() - start) * 1000)
@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect, useMemo, useCallback } from "react"
+import { useState, useMemo, useCallback } from "react"
 import { MapPin, Target, Users, Activity } from "lucide-react"
 
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
@@ -10,6 +10,7 @@ import { Switch } from "@/components/ui/switch"
 import EnhancedLayerControls from "@/components/enhanced-layer-controls"
 import { ATM } from "@/types"
 import MapboxMap from "@/components/mapbox-map"
+import { useAtmSync } from "@/hooks/use-atm-sync"
 
 type ActiveLayers = {
   population: boolean
@@ -30,32 +31,7 @@ export default function MapVisualization() {
   const [simulationMode, setSimulationMode] = useState(false)
   const [selectedATM, setSelectedATM] = useState<ATM | null>(null)
   const [selectedLocation, setSelectedLocation] = useState<{ lng: number; lat: number; address?: string } | null>(null)
-  const [atms, setAtms] = useState<ATM[]>([])
-  const [isLoading, setIsLoading] = useState(true)
-
-  useEffect(() => {
-    const abort = new AbortController()
-
-    const fetchATMs = async () => {
-      setIsLoading(true)
-      try {
-        const response = await fetch("/api/atms", { signal: abort.signal })
-        if (!response.ok) throw new Error(`Failed to fetch ATMs: ${response.status}`)
-        const data = await response.json()
-        setAtms(Array.isArray(data.atms) ? data.atms : [])
-      } catch (error) {
-        if ((error as DOMException).name !== "AbortError") {
-          console.error("[map-visualization] Unable to load ATMs:", error)
-        }
-      } finally {
-        setIsLoading(false)
-      }
-    }
-
-    fetchATMs()
-
-    return () => abort.abort()
-  }, [])
+  const { atms, isLoading } = useAtmSync()
 
   const handleLayerToggle = useCallback((layer: keyof ActiveLayers, enabled: boolean) => {
     setActiveLayers((prev) => ({ ...prev, [layer]: enabled }))
@@ -0,0 +1,67 @@
+"use client"
+import { useEffect, useRef, useState } from "react"
+import { applyAtmDelta } from "@/lib/atm-sync"
+import type { ATM, ATMDeltaResponse, ATMListResponse } from "@/types"
+
+const DEFAULT_INTERVAL_MS = 30_000
+
+/**
+ * Loads the ATM network once, then polls `/api/atms?since=<version>` and
+ * merges the returned delta. Changing `refreshKey` forces a full reload.
+ * Without a `version` (local dataset) the list is loaded once and not polled.
+ */
+export function useAtmSync(refreshKey: unknown = 0, intervalMs: number = DEFAULT_INTERVAL_MS) {
+  const [atms, setAtms] = useState<ATM[]>([])
+  const [isLoading, setIsLoading] = useState(true)
+  const [error, setError] = useState<string | null>(null)
+  const version = useRef<number | null>(null)
+
+  useEffect(() => {
+    const abort = new AbortController()
+    let timer: ReturnType<typeof setTimeout> | undefined
+    version.current = null
+
+    const load = async () => {
+      const since = version.current
+      try {
+        const response = await fetch(since === null ? "/api/atms" : `/api/atms?since=${since}`, {
+          signal: abort.signal,
+          cache: "no-store",
+        })
+        if (!response.ok) throw new Error(`HTTP ${response.status}`)
+        if (since === null) {
+          const data: ATMListResponse = await response.json()
+          setAtms(Array.isArray(data.atms) ? data.atms : [])
+          version.current = typeof data.version === "number" ? data.version : null
+        } else {
+          const delta: ATMDeltaResponse = await response.json()
+          setAtms((current) => applyAtmDelta(current, delta))
+          version.current = delta.version
+        }
+        setError(null)
+      } catch (e) {
+        if ((e as DOMException).name === "AbortError") return
+        console.error("[use-atm-sync] Unable to load ATMs:", e)
+        setError(String(e))
+        // Un delta refusé (ex. 400) repart d'un chargement complet
+        version.current = null
+        if (since === null) setAtms([])
+      } finally {
+        if (!abort.signal.aborted) {
+          if (since === null) setIsLoading(false)
+          if (version.current !== null || since !== null) timer = setTimeout(load, intervalMs)
+        }
+      }
+    }
+
+    setIsLoading(true)
+    load()
+
+    return () => {
+      abort.abort()
+      clearTimeout(timer)
+    }
+  }, [refreshKey, intervalMs])
+
+  return { atms, isLoading, error }
+}
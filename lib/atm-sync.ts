@@ -0,0 +1,23 @@
+import type { ATM, ATMDeltaResponse } from "@/types"
+
+/**
+ * Applies a `/api/atms?since=` delta to the ATMs already held by the client.
+ * A full snapshot replaces the list; otherwise upserts replace (or append)
+ * by id and removed ids are dropped, keeping the existing order.
+ */
+export function applyAtmDelta(atms: ATM[], delta: ATMDeltaResponse): ATM[] {
+  if (delta.full_snapshot) return delta.upserts
+  if (!delta.upserts.length && !delta.removed.length) return atms
+
+  const removed = new Set(delta.removed)
+  const upserts = new Map(delta.upserts.map((atm) => [atm.id, atm]))
+  const next: ATM[] = []
+  for (const atm of atms) {
+    if (removed.has(atm.id)) continue
+    const updated = upserts.get(atm.id)
+    if (updated) upserts.delete(atm.id)
+    next.push(updated ?? atm)
+  }
+  next.push(...upserts.values())
+  return next
+}
@@ -71,4 +71,17 @@ export type CompetitorListResponse = {
 export type PopulationListResponse = {
   population: PopulationPoint[];
   total_count: number;
-};
\ No newline at end of file
+};
+export type ATMListResponse = {
+  atms: ATM[];
+  total_count: number;
+  next_cursor?: string | null;
+  version?: number | null;
+};
+
+export type ATMDeltaResponse = {
+  version: number;
+  full_snapshot: boolean;
+  upserts: ATM[];
+  removed: string[];
+};